@@ -0,0 +1,401 @@
+"""Content-addressed cache of downloaded corpus tarballs.
+
+Downloads are stored once under ``objects/<sha256 of content>`` and
+recorded under ``refs/<sha256 of url>``, so every user and container
+pointing ``CLTK_CACHE_DIR`` at the same (possibly NFS) directory shares
+them. A cached file is hardlinked, reflinked or, failing both, copied
+into ``cltk_data``, which makes a second fetch of a corpus a metadata
+operation. Cached objects are read-only; the least recently used are
+evicted once the cache grows past ``CLTK_CACHE_MAX_BYTES`` (default 20
+GB, ``0`` for no limit). Writers take POSIX locks, which also work over
+NFS.
+
+Corpus URLs name branches, not releases, so a ref also records the
+``ETag`` and ``Last-Modified`` of its response. Each fetch of a URL not
+pinned by a checksum revalidates with a conditional GET: a ``304`` links
+the cached object, anything else is downloaded (and deduplicated by
+content). If the server cannot be reached, the cached object is used.
+
+The following environment variables configure the cache:
+
+- ``CLTK_CACHE_DIR``: cache root (default ``~/cltk_data/cache``)
+- ``CLTK_CACHE_MAX_BYTES``: size limit in bytes
+- ``CLTK_CACHE=0``: bypass the cache entirely
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from collections import defaultdict
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from cltk.instrument import instrument
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking
+    fcntl = None
+
+DEFAULT_CACHE_DIR = '~/cltk_data/cache'
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+# ioctl number of Linux's FICLONE (copy-on-write clone of a whole file)
+FICLONE = 0x40049409
+# Response headers saved with a ref -> request header to revalidate with
+VALIDATORS = (('ETag', 'If-None-Match'),
+              ('Last-Modified', 'If-Modified-Since'))
+
+# POSIX locks belong to the process, so threads also take a lock per name
+_THREAD_LOCKS = defaultdict(threading.Lock)
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+def url_key(url):
+    """Return the hex digest under which ``url`` is recorded."""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _reflink(src, dest):
+    if fcntl is None:
+        raise OSError('reflink unsupported')
+    with open(src, 'rb') as src_open, open(dest, 'wb') as dest_open:
+        fcntl.ioctl(dest_open.fileno(), FICLONE, src_open.fileno())
+
+
+def link_file(src, dest):
+    """Put ``src`` at ``dest`` by hardlink, reflink or copy, in that order
+    of preference. ``dest`` is replaced atomically. Returns the method
+    used.
+    """
+    dest_dir = os.path.dirname(dest) or '.'
+    os.makedirs(dest_dir, exist_ok=True)
+    temp = os.path.join(dest_dir, '.part-' + os.path.basename(dest))
+    if os.path.lexists(temp):
+        os.remove(temp)
+    for method, func in (('hardlink', os.link), ('reflink', _reflink),
+                         ('copy', shutil.copyfile)):
+        try:
+            func(src, temp)
+        except OSError:
+            if os.path.lexists(temp):
+                os.remove(temp)
+            continue
+        os.replace(temp, dest)
+        return method
+    raise OSError('Could not link or copy %s to %s' % (src, dest))
+
+
+class CorpusCache(object):
+    """A directory of downloaded files shared between users and machines."""
+
+    def __init__(self, root=None, max_bytes=None):
+        self._root = root
+        self._max_bytes = max_bytes
+
+    @property
+    def root(self):
+        root = self._root or os.environ.get('CLTK_CACHE_DIR',
+                                            DEFAULT_CACHE_DIR)
+        return os.path.expanduser(root)
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return int(os.environ.get('CLTK_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+    @property
+    def enabled(self):
+        return os.environ.get('CLTK_CACHE', '1') not in ('', '0')
+
+    def _dir(self, name):
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest)
+
+    @contextmanager
+    def lock(self, name, blocking=True):
+        """Hold an exclusive lock named ``name`` across threads and
+        processes. Non-blocking, yields ``False`` if it is taken.
+        """
+        with _THREAD_LOCKS_LOCK:
+            thread_lock = _THREAD_LOCKS[name]
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            path = os.path.join(self._dir('locks'), name)
+            with open(path, 'a') as lock_open:
+                flags = fcntl.LOCK_EX if blocking else \
+                    fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.lockf(lock_open, flags)
+                except OSError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.lockf(lock_open, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+    ## Lookup and storage -----------------------------------------------------
+
+    def read_ref(self, url):
+        """Return the ref of ``url``: a dict with its object ``digest`` and
+        the validators of the response, or ``None``.
+        """
+        try:
+            with open(os.path.join(self.root, 'refs', url_key(url))) as \
+                    ref_open:
+                data = ref_open.read().strip()
+        except IOError:
+            return None
+        if not data.startswith('{'):  # a bare digest, without validators
+            return {'digest': data}
+        return json.loads(data)
+
+    def write_ref(self, url, digest, validators=None):
+        """Record ``digest`` (and response ``validators``) for ``url``."""
+        ref = dict(validators or {}, digest=digest)
+        ref_path = os.path.join(self._dir('refs'), url_key(url))
+        with self.lock('ref-' + url_key(url)):
+            with open(ref_path + '.part', 'w') as ref_open:
+                json.dump(ref, ref_open, sort_keys=True)
+            os.replace(ref_path + '.part', ref_path)
+
+    def lookup(self, url, checksum=None):
+        """Return the cached file for ``url`` (or for content with SHA-256
+        ``checksum``), or ``None``. Marks the entry as recently used.
+        """
+        digest = checksum
+        if digest is None:
+            ref = self.read_ref(url)
+            if ref is None:
+                return None
+            digest = ref['digest']
+        path = self.object_path(digest)
+        if not os.path.isfile(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:  # owned by another user
+            pass
+        return path
+
+    def _link_object(self, digest, dest):
+        """Link object ``digest`` to ``dest`` under its lock, so that it
+        cannot be evicted meanwhile. Returns the method, or ``None`` if
+        the object is not cached.
+        """
+        with self.lock(digest):
+            path = self.object_path(digest)
+            if not os.path.isfile(path):
+                return None
+            try:
+                os.utime(path)
+            except OSError:  # owned by another user
+                pass
+            return link_file(path, dest)
+
+    def store(self, url, chunks, checksum=None, validators=None,
+              dest=None):
+        """Write ``chunks`` (an iterable of bytes) into the cache as the
+        content of ``url``, and link it to ``dest`` if given; return the
+        cached path. Raises ``IOError`` if ``checksum`` is given and does
+        not match.
+        """
+        temp_dir = self._dir('tmp')
+        digest = hashlib.sha256()
+        size = 0
+        handle, temp = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(handle, 'wb') as temp_open:
+                for chunk in chunks:
+                    if chunk:
+                        temp_open.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                temp_open.flush()
+                os.fsync(temp_open.fileno())
+            hexdigest = digest.hexdigest()
+            if checksum is not None and checksum != hexdigest:
+                raise IOError('Checksum mismatch for %s: expected %s, got %s'
+                              % (url, checksum, hexdigest))
+            os.chmod(temp, 0o444)
+            self._dir('objects')
+            with self.lock(hexdigest):
+                path = self.object_path(hexdigest)
+                if os.path.exists(path):
+                    os.remove(temp)
+                else:
+                    os.replace(temp, path)
+                if dest is not None:
+                    link_file(path, dest)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self.write_ref(url, hexdigest, validators)
+        instrument.count('cache_bytes_stored', size)
+        self.evict(keep=path)
+        return path
+
+    def fetch(self, url, dest, checksum=None, opener=None, refresh=False):
+        """Put the content of ``url`` at ``dest``, downloading it into the
+        cache only if it is not already there or, unless ``checksum`` pins
+        the content, has changed on the server. ``refresh`` downloads it
+        again regardless. ``opener(url, headers)`` must return a streaming
+        ``requests`` response; ``requests.get`` by default. Returns
+        ``dest``.
+        """
+        if not self.enabled:
+            _download(url, dest, opener)
+            return dest
+        with self.lock('fetch-' + url_key(url)):
+            response = None
+            digest = checksum
+            if not refresh and digest is None:
+                ref = self.read_ref(url)
+                if ref is not None:
+                    response = self._revalidate(url, ref, opener)
+                    if response is None:
+                        digest = ref['digest']
+            if digest is not None and not refresh:
+                method = self._link_object(digest, dest)
+                if method is not None:
+                    instrument.count('cache_hits')
+                    logging.info('Linked cached %s to %s (%s)', url, dest,
+                                 method)
+                    return dest
+            instrument.count('cache_misses')
+            logging.info('Downloading %s into cache %s', url, self.root)
+            if response is None:
+                response = _open(url, opener)
+            self.store(url, response.iter_content(1024 * 1024), checksum,
+                       _validators(response), dest)
+        return dest
+
+    def _revalidate(self, url, ref, opener=None):
+        """Ask the server whether ``url`` changed since ``ref`` was
+        stored. Returns ``None`` if the cached object is still current (or
+        the server cannot be reached), else the response with the new
+        content.
+        """
+        headers = {request: ref[response] for response, request in
+                   VALIDATORS if ref.get(response)}
+        try:
+            response = _open(url, opener, headers)
+        except IOError as exc:
+            logging.warning('Could not revalidate %s, using the cached '
+                            'copy: %s', url, exc)
+            return None
+        if getattr(response, 'status_code', 200) == 304:
+            instrument.count('cache_revalidated')
+            return None
+        return response
+
+    ## Eviction ---------------------------------------------------------------
+
+    def size(self):
+        """Total bytes of cached objects."""
+        objects = os.path.join(self.root, 'objects')
+        if not os.path.isdir(objects):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(objects))
+
+    def evict(self, max_bytes=None, keep=None):
+        """Remove least recently used objects, other than ``keep``, until
+        the cache fits in ``max_bytes``. Files already linked into
+        ``cltk_data`` survive, since only the cache's own link is removed.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        objects = os.path.join(self.root, 'objects')
+        if not max_bytes or not os.path.isdir(objects):
+            return []
+        removed = []
+        with self.lock('evict'):
+            entries = [(entry.stat().st_mtime, entry.stat().st_size,
+                        entry.path) for entry in os.scandir(objects)]
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= max_bytes:
+                    break
+                if path == keep:
+                    continue
+                # Skip objects being linked or stored
+                with self.lock(os.path.basename(path),
+                               blocking=False) as locked:
+                    if not locked:
+                        continue
+                    os.remove(path)
+                total -= size
+                removed.append(path)
+        if removed:
+            logging.info('Evicted %d objects from cache %s', len(removed),
+                         self.root)
+        return removed
+
+
+def _open(url, opener=None, headers=None):
+    if opener is None:
+        import requests
+        response = requests.get(url, stream=True, headers=headers)
+    else:
+        response = opener(url, headers)
+    response.raise_for_status()
+    return response
+
+
+def _validators(response):
+    """Return the validator headers of ``response`` worth saving."""
+    headers = getattr(response, 'headers', None) or {}
+    return {name: headers[name] for name, _ in VALIDATORS
+            if headers.get(name)}
+
+
+def _download(url, dest, opener=None):
+    response = _open(url, opener)
+    write_stream(response.iter_content(1024 * 1024), dest)
+    return dest
+
+
+def write_stream(chunks, dest):
+    """Write ``chunks`` to a new file renamed over ``dest``, so a file
+    ``dest`` shares with the cache (a hardlink) is replaced rather than
+    overwritten.
+    """
+    dest_dir = os.path.dirname(dest) or '.'
+    os.makedirs(dest_dir, exist_ok=True)
+    handle, temp = tempfile.mkstemp(dir=dest_dir,
+                                    prefix='.part-' + os.path.basename(dest))
+    try:
+        with os.fdopen(handle, 'wb') as dest_open:
+            for chunk in chunks:
+                if chunk:
+                    dest_open.write(chunk)
+        os.chmod(temp, 0o644)
+        os.replace(temp, dest)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return dest
+
+
+# Alias
+corpus_cache = CorpusCache()
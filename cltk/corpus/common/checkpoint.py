@@ -0,0 +1,129 @@
+"""Atomic file writes and a journal of finished units, so that an
+interrupted corpus compilation can resume where it stopped.
+
+Every output file is written to a hidden temporary file in its target
+directory and renamed into place, so a file either has its old contents
+or its complete new ones. After each file is written its name is
+appended to the directory's journal. On restart the compilers skip the
+units listed in the journal and redo everything else. A final
+``COMPLETE`` entry marks the whole directory as built.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import os
+import threading
+
+JOURNAL_NAME = '.cltk_journal'
+COMPLETE = 'COMPLETE'
+
+
+def partial_path(path):
+    """Return the hidden path ``path`` is written to before renaming. The
+    file extension is kept, since some converters look at it.
+    """
+    head, tail = os.path.split(path)
+    return os.path.join(head, '.part-' + tail)
+
+
+def commit_file(partial, path):
+    """Flush ``partial`` to disk and rename it to ``path``."""
+    with open(partial, 'rb') as file_open:
+        os.fsync(file_open.fileno())
+    os.replace(partial, path)
+
+
+def atomic_write(path, data):
+    """Write ``data`` (bytes or str) to ``path`` via a temporary file and
+    an atomic rename.
+    """
+    partial = partial_path(path)
+    mode = 'wb' if isinstance(data, (bytes, bytearray)) else 'w'
+    try:
+        with open(partial, mode) as file_open:
+            file_open.write(data)
+            file_open.flush()
+            os.fsync(file_open.fileno())
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+class CompileJournal(object):
+    """Append-only list of the units (usually file names) finished in
+    ``directory``.
+    """
+
+    def __init__(self, directory, name=JOURNAL_NAME):
+        self.directory = directory
+        self.path = os.path.join(directory, name)
+        self._lock = threading.Lock()
+        self.done = set()
+        self.load()
+
+    def load(self):
+        """Read the journal. A line cut short by a crash is ignored."""
+        self.done = set()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file_open:
+                for line in file_open:
+                    if line.endswith('\n'):
+                        self.done.add(line[:-1])
+        except FileNotFoundError:
+            pass
+        return self.done
+
+    def __contains__(self, unit):
+        return unit in self.done
+
+    @property
+    def complete(self):
+        """True once ``finish()`` has been called."""
+        return COMPLETE in self.done
+
+    def mark(self, unit):
+        """Durably record ``unit`` as finished."""
+        with self._lock:
+            if unit in self.done:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file_open:
+                file_open.write(unit + '\n')
+                file_open.flush()
+                os.fsync(file_open.fileno())
+            self.done.add(unit)
+
+    def finish(self):
+        """Mark the whole directory as built."""
+        self.mark(COMPLETE)
+
+    def clear(self):
+        """Forget all finished units, e.g. before a fresh rebuild."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.done = set()
+
+    def begin(self):
+        """Start a run: resume an interrupted build, or start over if the
+        last one finished. Returns the units to skip.
+        """
+        if self.complete:
+            self.clear()
+        # The journal exists from the start of every build, so a filled
+        # directory without one was built before journals were kept
+        os.makedirs(self.directory, exist_ok=True)
+        open(self.path, 'a').close()
+        return set(self.done)
+
+    def adopt_legacy(self):
+        """Mark a non-empty directory that has no journal, i.e. one built
+        before journals were kept, as complete. Returns ``complete``.
+        """
+        if not os.path.exists(self.path) and os.path.isdir(self.directory) \
+                and os.listdir(self.directory):
+            self.finish()
+        return self.complete
@@ -5,15 +5,20 @@ __license__ = 'MIT License. See LICENSE.'
 import ast
 import logging
 import os
-from pprint import pprint
 import re
-import requests
-from requests_toolbelt import SSLAdapter
 import shutil
-import ssl
 from urllib.parse import urlsplit
 
-from cltk.corpus.greek.beta_to_unicode import Replacer
+from cltk.corpus.common.checkpoint import CompileJournal, atomic_write
+from cltk.corpus.common.session import CompileSession
+from cltk.instrument import instrument
+
+# Work titles are marked `{1...}1` in TLG and PHI texts
+WORK_TITLE_REGEX = re.compile(r'\{1.{1,50}?\}1')
+# The same on UTF-8 bytes: a character is an ASCII byte other than a
+# newline, or a lead byte and its continuation bytes
+WORK_TITLE_BYTES_REGEX = re.compile(
+    rb'\{1(?:[^\n\x80-\xff]|[\xc0-\xff][\x80-\xbf]+){1,50}?\}1')
 
 # these can be deleted, I think
 INDEX_DICT_PHI5 = {}
@@ -23,31 +28,22 @@ INDEX_DICT_TLG = {}
 
 class Compile(object):  # pylint: disable=R0904
     """Copy or download files out of TLG & PHI disks"""
-    def __init__(self):
-        """Initializer, makes ~/cltk_data dirs"""
-        # make local CLTK dirs
-        default_cltk_data = '~/cltk_data'
-        self.cltk_data = os.path.expanduser(default_cltk_data)
-        if os.path.isdir(self.cltk_data) is True:
-            pass
-        else:
-            os.mkdir(self.cltk_data)
-        self.orig_files_dir = os.path.join(self.cltk_data, 'originals')
-        if os.path.isdir(self.orig_files_dir) is True:
-            pass
-        else:
-            os.mkdir(self.orig_files_dir)
-        self.compiled_files_dir = os.path.join(self.cltk_data, 'compiled')
-        if os.path.isdir(self.compiled_files_dir) is True:
-            pass
-        else:
-            os.mkdir(self.compiled_files_dir)
-        log_path = os.path.join(self.cltk_data, 'cltk.log')
-        logging.basicConfig(filename=log_path,
-                            level=logging.INFO,
-                            format='%(asctime)s %(message)s',
-                            datefmt='%m/%d/%Y %I:%M:%S %p')
+    def __init__(self, session=None):
+        """Initializer, makes ~/cltk_data dirs. Pass a ``CompileSession``
+        to share data directories and indexes with other ``Compile``
+        objects, threads or processes.
+        """
+        if session is None:
+            session = CompileSession()
+        session.prepare()
+        self.session = session
+        self.cltk_data = session.cltk_data
+        self.orig_files_dir = session.orig_files_dir
+        self.compiled_files_dir = session.compiled_files_dir
+        self.works = session.works
+        self.work_offsets = session.work_offsets
 
+    @instrument.timed('Compile.import_corpus')
     def import_corpus(self, corpus_name, corpus_location=None):
         """Main method. Copies or downloads corpora, moves to originals,
         then compiled
@@ -196,22 +192,23 @@ class Compile(object):  # pylint: disable=R0904
         else:
             logging.error('Unrecognized corpus name.')
 
+    @instrument.timed('Compile.read_tlg_index_file_author')
     def read_tlg_index_file_author(self):
         """Reads CLTK's index_file_author.txt for TLG."""
-        global tlg_index
         logging.info('Starting TLG index_file_author.txt read.')
         compiled_files_dir_tlg_index = \
             os.path.join(self.compiled_files_dir, 'tlg',
                          'index_file_author.txt')
         try:
             with open(compiled_files_dir_tlg_index, 'r') as index_opened:
-                tlg_index = index_opened.read()
-                tlg_index = ast.literal_eval(tlg_index)
-                return tlg_index
+                index = ast.literal_eval(index_opened.read())
+                self.session.set_index('tlg', index)
+                return index
         except IOError:
             logging.error('Failed to open TLG index file '
                           'index_file_author.txt.')
 
+    @instrument.timed('Compile.make_tlg_index_file_author')
     def make_tlg_index_file_author(self):
         """Reads TLG's AUTHTAB.DIR and writes a dict (index_file_author.txt)
         to the CLTK's corpus directory.
@@ -242,15 +239,15 @@ class Compile(object):  # pylint: disable=R0904
                 authtab_path = \
                     compiled_files_dir_tlg + '/' + 'index_file_author.txt'
                 try:
-                    with open(authtab_path, 'w') as authtab_opened:
-                        authtab_opened.write(str(INDEX_DICT_TLG))
-                        logging.info('Finished writing TLG '
-                                     'index_file_author.txt.')
+                    atomic_write(authtab_path, str(INDEX_DICT_TLG))
+                    logging.info('Finished writing TLG '
+                                 'index_file_author.txt.')
                 except IOError:
                     logging.error('Failed to write TLG index_file_author.txt.')
         except IOError:
             logging.error('Failed to open TLG index file AUTHTAB.DIR')
 
+    @instrument.timed('Compile.compile_tlg_txt')
     def compile_tlg_txt(self):
         """Reads original Beta Code files and converts to Unicode files"""
         logging.info('Starting TLG corpus compilation into files.')
@@ -259,50 +256,106 @@ class Compile(object):  # pylint: disable=R0904
             pass
         else:
             os.mkdir(compiled_files_dir_tlg)
+        self.session.reset('tlg')
         self.make_tlg_index_file_author()
-        self.read_tlg_index_file_author()
+        tlg_index = self.read_tlg_index_file_author() or {}
+        journal = CompileJournal(compiled_files_dir_tlg)
+        journal.begin()
         for file_name in tlg_index:
-            abbrev = tlg_index[file_name]
-            orig_files_dir_tlg = os.path.join(self.orig_files_dir, 'tlg')
-            file_name_txt = file_name + '.TXT'
-            files_path = os.path.join(orig_files_dir_tlg, file_name_txt)
-            try:
-                with open(files_path, 'rb') as index_opened:
-                    txt_read = index_opened.read().decode('latin-1')
-                    txt_ascii = remove_non_ascii(txt_read)
-                    local_replacer = Replacer()
-                    new_uni = local_replacer.beta_code(txt_ascii)
-                    file_name_txt_uni = file_name + '.txt'
-                    file_path = os.path.join(compiled_files_dir_tlg,
-                                             file_name_txt_uni)
-                    try:
-                        with open(file_path, 'w') as new_file:
-                            new_file.write(new_uni)
-                    except IOError:
-                        logging.error('Failed to write to new file %s of '
-                                      'author %s', file_name, abbrev)
-                logging.info('Finished TLG corpus compilation to %s',
-                             file_path)
-            except IOError:
-                logging.error('Failed to open TLG file %s of author %s',
-                              file_name, abbrev)
+            self._compile_author_file('tlg', file_name, tlg_index[file_name],
+                                      beta_code=True, journal=journal)
         self.make_tlg_meta_index()
         self.make_tlg_index_auth_works()
+        journal.finish()
+
+    @instrument.timed('Compile.author_file')
+    def _compile_author_file(self, corpus, file_name, abbrev, beta_code=False,
+                             journal=None):
+        """Read one original TLG/PHI author file, strip non-ASCII bytes,
+        optionally convert Beta Code to Unicode, and write it to
+        ``compiled/<corpus>/``. Files already listed in ``journal`` are
+        only re-read for their work titles.
+        """
+        label = corpus.upper()
+        files_path = os.path.join(self.orig_files_dir, corpus,
+                                  file_name + '.TXT')
+        file_path = os.path.join(self.compiled_files_dir, corpus,
+                                 file_name + '.txt')
+        if journal is not None and file_name in journal and \
+                os.path.isfile(file_path):
+            with open(file_path, 'rb') as file_opened:
+                self._record_work_titles(corpus, file_name,
+                                         file_opened.read())
+            logging.info('Skipping %s file %s, compiled by an earlier run',
+                         label, file_name)
+            return
+        try:
+            txt_ascii = read_ascii(files_path)
+        except IOError:
+            logging.error('Failed to open %s file %s of author %s', label,
+                          file_name, abbrev)
+            return
+        instrument.count('files_read')
+        instrument.count('bytes_read', os.path.getsize(files_path))
+        if beta_code:
+            from cltk.corpus.greek.beta_to_unicode import Replacer
+            local_replacer = Replacer()
+            txt_ascii = local_replacer.beta_code(txt_ascii.decode('ascii'))
+            txt_ascii = txt_ascii.encode('utf-8')
+        if instrument.enabled:
+            instrument.count('tokens_written', len(txt_ascii.split()))
+        self._record_work_titles(corpus, file_name, txt_ascii)
+        try:
+            atomic_write(file_path, txt_ascii)
+        except IOError:
+            logging.error('Failed to write to new file %s of author %s',
+                          file_name, abbrev)
+            return
+        if journal is not None:
+            journal.mark(file_name)
+        logging.info('Finished %s corpus compilation to %s', label,
+                     file_path)
+
+    def _record_work_titles(self, corpus, file_name, compiled):
+        """Collect work titles, and the byte offset at which each begins,
+        from the UTF-8 bytes of a freshly compiled author file.
+        """
+        titles = []
+        offsets = []
+        for match in WORK_TITLE_BYTES_REGEX.finditer(compiled):
+            title = match.group().decode('utf-8')
+            titles.append(title)
+            offsets.append((match.start(), title))
+        self.session.record_works(corpus, file_name, titles, offsets)
+
+    def _write_work_offsets(self, corpus):
+        """Write ``index_work_offsets.txt``, mapping each author file to
+        the byte offsets of its works, if titles were collected while
+        compiling.
+        """
+        offsets = self.work_offsets.get(corpus)
+        if not offsets:
+            return
+        file_path = os.path.join(self.compiled_files_dir, corpus,
+                                 'index_work_offsets.txt')
+        try:
+            atomic_write(file_path, str(dict(sorted(offsets.items()))))
+        except IOError:
+            logging.error('Failed to write to index_work_offsets.txt')
 
+    @instrument.timed('Compile.read_tlg_author_work_titles')
     def read_tlg_author_work_titles(self, auth_abbrev):
         """Reads a converted TLG file and returns a list of header titles
         within it
         """
-        global WORKS
         logging.info('Starting to find works within a TLG author file.')
         compiled_files_dir_tlg = os.path.join(self.compiled_files_dir, 'tlg')
         auth_file = compiled_files_dir_tlg + '/' + auth_abbrev + '.txt'
         with open(auth_file) as file_opened:
             string = file_opened.read()
-            title_reg = re.compile('\{1.{1,50}?\}1')
-            WORKS = title_reg.findall(string)
-            return WORKS
+            return WORK_TITLE_REGEX.findall(string)
 
+    @instrument.timed('Compile.make_tlg_index_auth_works')
     def make_tlg_index_auth_works(self):
         """read index_file_author.txt, read author file, and expand dict to
         include author works, index_author_works.txt
@@ -310,24 +363,29 @@ class Compile(object):  # pylint: disable=R0904
         logging.info('Starting to compile TLG auth_works.txt.')
         orig_files_dir_tlg_index = os.path.join(self.orig_files_dir, 'tlg')
         compiled_files_dir_tlg = os.path.join(self.compiled_files_dir, 'tlg')
-        self.read_tlg_index_file_author()
+        tlg_index = self.session.index('tlg') or \
+            self.read_tlg_index_file_author() or {}
         auth_work_dict = {}
         for file_name in tlg_index:
             auth_node = {}
-            self.read_tlg_author_work_titles(file_name)
+            works = self.works.get('tlg', {}).get(file_name)
+            if works is None:
+                works = self.read_tlg_author_work_titles(file_name)
             auth_name = tlg_index[file_name]
             auth_node['tlg_file'] = file_name
             auth_node['tlg_name'] = auth_name
-            auth_node['works'] = WORKS
+            auth_node['works'] = works
             auth_work_dict[auth_name] = auth_node
         file_path = compiled_files_dir_tlg + '/' + 'index_author_works.txt'
         try:
-            with open(file_path, 'w') as new_file:
-                pprint(auth_work_dict, stream=new_file)
+            from pprint import pformat
+            atomic_write(file_path, pformat(auth_work_dict) + '\n')
         except IOError:
             logging.error('Failed to write to index_auth_work.txt')
+        self._write_work_offsets('tlg')
         logging.info('Finished compiling TLG index_auth_works.txt.')
 
+    @instrument.timed('Compile.make_tlg_meta_index')
     def make_tlg_meta_index(self):
         """Reads and writes the LSTSCDCN.DIR file"""
         logging.info('Starting to read the TLG file LSTSCDCN.DIR.')
@@ -354,30 +412,30 @@ class Compile(object):  # pylint: disable=R0904
                             meta_list_dict[m_key[0]] = m_value[1]
                 file_path = compiled_files_dir_tlg_meta
                 try:
-                    with open(file_path, 'w') as new_file:
-                        new_file.write(str(meta_list_dict))
+                    atomic_write(file_path, str(meta_list_dict))
                 except IOError:
                     logging.error('Failed to write to meta_list.txt file \
                     of TLG')
         except IOError:
             logging.error('Failed to open TLG index file LSTSCDCN.DIR')
 
+    @instrument.timed('Compile.read_phi7_index_file_author')
     def read_phi7_index_file_author(self):
         """Reads CLTK's index_file_author.txt for phi7."""
-        global phi7_index
         logging.info('Starting PHI7 index_file_author.txt read.')
         compiled_files_dir_phi7_index = \
             os.path.join(self.compiled_files_dir, 'phi7',
                          'index_file_author.txt')
         try:
             with open(compiled_files_dir_phi7_index, 'r') as index_opened:
-                phi7_index = index_opened.read()
-                phi7_index = ast.literal_eval(phi7_index)
-                return phi7_index
+                index = ast.literal_eval(index_opened.read())
+                self.session.set_index('phi7', index)
+                return index
         except IOError:
             logging.error('Failed to open PHI7 index file '
                           'index_file_author.txt.')
 
+    @instrument.timed('Compile.make_phi7_index_file_author')
     def make_phi7_index_file_author(self):
         """Reads phi7's AUTHTAB.DIR and writes a dict (index_file_author.txt)
         to the CLTK's corpus directory.
@@ -410,47 +468,45 @@ class Compile(object):  # pylint: disable=R0904
                     os.path.join(compiled_files_dir_phi7,
                                  'index_file_author.txt')
                 try:
-                    with open(compiled_files_dir_phi7_authtab, 'w') as \
-                            authtab_opened:
-                        authtab_opened.write(str(INDEX_DICT_PHI7))
-                        logging.info('Finished writing PHI7 '
-                                     'index_file_author.txt.')
+                    atomic_write(compiled_files_dir_phi7_authtab,
+                                 str(INDEX_DICT_PHI7))
+                    logging.info('Finished writing PHI7 '
+                                 'index_file_author.txt.')
                 except IOError:
                     logging.error('Failed to write PHI7 '
                                   'index_file_author.txt.')
         except IOError:
             logging.error('Failed to open PHI7 index file AUTHTAB.DIR')
 
+    @instrument.timed('Compile.read_phi7_index_file_author')
     def read_phi7_index_file_author(self):
         """Reads CLTK's index_file_author.txt for PHI7."""
-        global phi7_index
         logging.info('Starting phi7 index_file_author.txt read.')
         compiled_files_dir_phi7_index = \
             os.path.join(self.compiled_files_dir, 'phi7',
                          'index_file_author.txt')
         try:
             with open(compiled_files_dir_phi7_index, 'r') as index_opened:
-                phi7_index = index_opened.read()
-                phi7_index = ast.literal_eval(phi7_index)
-                return phi7_index
+                index = ast.literal_eval(index_opened.read())
+                self.session.set_index('phi7', index)
+                return index
         except IOError:
             logging.error('Failed to open PHI7 index file '
                           'index_file_author.txt.')
 
+    @instrument.timed('Compile.read_phi7_author_work_titles')
     def read_phi7_author_work_titles(self, auth_abbrev):
         """Reads a converted phi7 file and returns a list of header titles
         within it
         """
-        global WORKS
         logging.info('Starting to find works within a PHI7 author file.')
         compiled_files_dir_phi7 = os.path.join(self.compiled_files_dir, 'phi7')
         auth_file = compiled_files_dir_phi7 + '/' + auth_abbrev + '.txt'
         with open(auth_file) as file_opened:
             string = file_opened.read()
-            title_reg = re.compile('\{1.{1,50}?\}1')
-            WORKS = title_reg.findall(string)
-            return WORKS
+            return WORK_TITLE_REGEX.findall(string)
 
+    @instrument.timed('Compile.make_phi7_index_auth_works')
     def make_phi7_index_auth_works(self):
         """read index_file_author.txt, read author file, and expand dict to
         include author works, index_author_works.txt
@@ -458,25 +514,30 @@ class Compile(object):  # pylint: disable=R0904
         logging.info('Starting to compile PHI7 auth_works.txt.')
         orig_files_dir_phi7_index = os.path.join(self.orig_files_dir, 'phi7')
         compiled_files_dir_phi7 = os.path.join(self.compiled_files_dir, 'phi7')
-        self.read_phi7_index_file_author()
+        phi7_index = self.session.index('phi7') or \
+            self.read_phi7_index_file_author() or {}
         auth_work_dict = {}
         for file_name in phi7_index:
             auth_node = {}
-            self.read_phi7_author_work_titles(file_name)
+            works = self.works.get('phi7', {}).get(file_name)
+            if works is None:
+                works = self.read_phi7_author_work_titles(file_name)
             auth_name = phi7_index[file_name]
             auth_node['phi7_file'] = file_name
             auth_node['phi7_name'] = auth_name
-            auth_node['works'] = WORKS
+            auth_node['works'] = works
             auth_work_dict[auth_name] = auth_node
         file_path = compiled_files_dir_phi7 + '/' + 'index_author_works.txt'
         try:
-            with open(file_path, 'w') as new_file:
-                pprint(auth_work_dict, stream=new_file)
+            from pprint import pformat
+            atomic_write(file_path, pformat(auth_work_dict) + '\n')
         except IOError:
             logging.error('Failed to write to index_auth_work.txt')
+        self._write_work_offsets('phi7')
         logging.info('Finished compiling PHI7 index_auth_works.txt.')
 
     # add smart parsing of beta code tags
+    @instrument.timed('Compile.compile_phi7_txt')
     def compile_phi7_txt(self):
         """Reads original Beta Code files and converts to Unicode files"""
         logging.info('Starting PHI7 corpus compilation into files.')
@@ -485,51 +546,34 @@ class Compile(object):  # pylint: disable=R0904
             pass
         else:
             os.mkdir(compiled_files_dir_phi7)
+        self.session.reset('phi7')
         self.make_phi7_index_file_author()
-        self.read_phi7_index_file_author()
+        phi7_index = self.read_phi7_index_file_author() or {}
+        journal = CompileJournal(compiled_files_dir_phi7)
+        journal.begin()
         for file_name in phi7_index:
-            abbrev = phi7_index[file_name]
-            orig_files_dir_phi7 = os.path.join(self.orig_files_dir, 'phi7')
-            file_name_txt = file_name + '.TXT'
-            files_path = os.path.join(orig_files_dir_phi7, file_name_txt)
-            try:
-                with open(files_path, 'rb') as index_opened:
-                    txt_read = index_opened.read().decode('latin-1')
-                    txt_ascii = remove_non_ascii(txt_read)
-                    # local_replacer = Replacer()
-                    # new_uni = local_replacer.beta_code(txt_ascii)
-                    file_name_txt_uni = file_name + '.txt'
-                    file_path = os.path.join(compiled_files_dir_phi7,
-                                             file_name_txt_uni)
-                    try:
-                        with open(file_path, 'w') as new_file:
-                            new_file.write(txt_ascii)
-                    except IOError:
-                        logging.error('Failed to write to new file %s of '
-                                      'author %s', file_name, abbrev)
-                logging.info('Finished PHI7 corpus compilation to %s',
-                             file_path)
-            except IOError:
-                logging.error('Failed to open PHI7 file %s of author %s',
-                              file_name, abbrev)
+            self._compile_author_file('phi7', file_name, phi7_index[file_name],
+                                      journal=journal)
         self.make_phi7_index_auth_works()
+        journal.finish()
 
+    @instrument.timed('Compile.read_phi5_index_file_author')
     def read_phi5_index_file_author(self):
         """Reads CLTK's index_file_author.txt for phi5."""
-        global phi5_index
         logging.info('Starting PHI5 index_file_author.txt read.')
         compiled_files_dir_phi5_index = \
             os.path.join(self.compiled_files_dir, 'phi5',
                          'index_file_author.txt')
         try:
             with open(compiled_files_dir_phi5_index, 'r') as index_opened:
-                phi5_index = index_opened.read()
-                phi5_index = ast.literal_eval(phi5_index)
-                return phi5_index
+                index = ast.literal_eval(index_opened.read())
+                self.session.set_index('phi5', index)
+                return index
         except IOError:
             logging.error('Failed to open PHI5 index file '
                           'index_file_author.txt.')
 
+    @instrument.timed('Compile.make_phi5_index_file_author')
     def make_phi5_index_file_author(self):
         """Reads phi5's AUTHTAB.DIR and writes a dict (index_file_author.txt)
         to the CLTK's corpus directory.
@@ -558,55 +602,58 @@ class Compile(object):  # pylint: disable=R0904
                     os.path.join(compiled_files_dir_phi5,
                                  'index_file_author.txt')
                 try:
-                    with open(compiled_files_dir_phi5_authtab, 'w') as \
-                            authtab_opened:
-                        authtab_opened.write(str(INDEX_DICT_PHI5))
-                        logging.info('Finished writing PHI5 '
-                                     'index_file_author.txt.')
+                    atomic_write(compiled_files_dir_phi5_authtab,
+                                 str(INDEX_DICT_PHI5))
+                    logging.info('Finished writing PHI5 '
+                                 'index_file_author.txt.')
                 except IOError:
                     logging.error('Failed to write PHI5 '
                                   'index_file_author.txt.')
         except IOError:
             logging.error('Failed to open PHI5 index file AUTHTAB.DIR')
 
+    @instrument.timed('Compile.read_phi5_author_work_titles')
     def read_phi5_author_work_titles(self, auth_abbrev):
         """Reads a converted phi5 file and returns a list of header titles
         within it
         """
-        global WORKS
         logging.info('Starting to find works within a PHI5 author file.')
         compiled_files_dir_phi5 = os.path.join(self.compiled_files_dir, 'phi5')
         auth_file = compiled_files_dir_phi5 + '/' + auth_abbrev + '.txt'
         with open(auth_file) as file_opened:
             string = file_opened.read()
-            title_reg = re.compile('\{1.{1,50}?\}1')
-            WORKS = title_reg.findall(string)
-            return WORKS
+            return WORK_TITLE_REGEX.findall(string)
 
+    @instrument.timed('Compile.make_phi5_index_auth_works')
     def make_phi5_index_auth_works(self):
         """read index_file_author.txt, read author file, and expand dict to
         include author works, index_author_works.txt
         """
         logging.info('Starting to compile PHI5 auth_works.txt.')
         compiled_files_dir_phi5 = os.path.join(self.compiled_files_dir, 'phi5')
-        self.read_phi5_index_file_author()
+        phi5_index = self.session.index('phi5') or \
+            self.read_phi5_index_file_author() or {}
         auth_work_dict = {}
         for file_name in phi5_index:
             auth_node = {}
-            self.read_phi5_author_work_titles(file_name)
+            works = self.works.get('phi5', {}).get(file_name)
+            if works is None:
+                works = self.read_phi5_author_work_titles(file_name)
             auth_name = phi5_index[file_name]
             auth_node['phi5_file'] = file_name
             auth_node['phi5_name'] = auth_name
-            auth_node['works'] = WORKS
+            auth_node['works'] = works
             auth_work_dict[auth_name] = auth_node
         file_path = compiled_files_dir_phi5 + '/' + 'index_author_works.txt'
         try:
-            with open(file_path, 'w') as new_file:
-                pprint(auth_work_dict, stream=new_file)
+            from pprint import pformat
+            atomic_write(file_path, pformat(auth_work_dict) + '\n')
         except IOError:
             logging.error('Failed to write to index_auth_work.txt')
+        self._write_work_offsets('phi5')
         logging.info('Finished compiling PHI5 index_auth_works.txt.')
 
+    @instrument.timed('Compile.compile_phi5_txt')
     def compile_phi5_txt(self):
         """Reads original Beta Code files and converts to Unicode files
         todo: #add smart parsing of beta code tags
@@ -617,51 +664,30 @@ class Compile(object):  # pylint: disable=R0904
             pass
         else:
             os.mkdir(compiled_files_dir_phi5)
+        self.session.reset('phi5')
         self.make_phi5_index_file_author()
-        self.read_phi5_index_file_author()
+        phi5_index = self.read_phi5_index_file_author() or {}
+        journal = CompileJournal(compiled_files_dir_phi5)
+        journal.begin()
         for file_name in phi5_index:
-            abbrev = phi5_index[file_name]
-            orig_files_dir_phi5 = os.path.join(self.orig_files_dir, 'phi5')
-            file_name_txt = file_name + '.TXT'
-            files_path = os.path.join(orig_files_dir_phi5, file_name_txt)
-            try:
-                with open(files_path, 'rb') as index_opened:
-                    txt_read = index_opened.read().decode('latin-1')
-                    txt_ascii = remove_non_ascii(txt_read)
-                    # local_replacer = Replacer()
-                    # new_uni = local_replacer.beta_code(txt_ascii)
-                    file_name_txt_uni = file_name + '.txt'
-                    file_path = os.path.join(compiled_files_dir_phi5,
-                                             file_name_txt_uni)
-                    try:
-                        with open(file_path, 'w') as new_file:
-                            new_file.write(txt_ascii)
-                    except IOError:
-                        logging.error('Failed to write to new file %s of '
-                                      'author %s', file_name, abbrev)
-                logging.info('Finished PHI5 corpus compilation to %s',
-                             file_path)
-            except IOError:
-                logging.error('Failed to open PHI5 file %s of author %s',
-                              file_name, abbrev)
+            self._compile_author_file('phi5', file_name, phi5_index[file_name],
+                                      journal=journal)
         self.make_phi5_index_auth_works()
+        journal.finish()
 
+    @instrument.timed('Compile.get_latin_library_tar')
     def get_latin_library_tar(self):
         """Fetch Latin Library corpus"""
         orig_files_dir_latin_library = \
             os.path.join(self.orig_files_dir, 'latin_library')
         ll_url = 'https://raw.githubusercontent.com/cltk/' \
                  'latin_corpus_latin_library/master/latin_library.tar.gz'
-        session = requests.Session()
-        session.mount(ll_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        ll_tar = session.get(ll_url, stream=True)
         latin_library_file_name = urlsplit(ll_url).path.split('/')[-1]
         latin_library_file_path = \
             os.path.join(orig_files_dir_latin_library, latin_library_file_name)
         try:
-            with open(latin_library_file_path, 'wb') as new_file:
-                new_file.write(ll_tar.content)
-                logging.info('Finished writing %s.', latin_library_file_name)
+            download(ll_url, latin_library_file_path)
+            logging.info('Finished writing %s.', latin_library_file_name)
         except IOError:
             logging.error('Failed to write file %s', latin_library_file_name)
         try:
@@ -671,21 +697,18 @@ class Compile(object):  # pylint: disable=R0904
         except IOError:
             logging.info('Failed to unpack %s.', latin_library_file_name)
 
+    @instrument.timed('Compile.get_perseus_latin_tar')
     def get_perseus_latin_tar(self):
         """Fetch Perseus Latin corpus"""
         orig_files_dir_perseus_latin = os.path.join(self.orig_files_dir,
                                                     'perseus_latin')
         pl_url = 'https://raw.githubusercontent.com/cltk/latin_corpus_perseus/master/latin_corpus_perseus.tar.gz'
-        session = requests.Session()
-        session.mount(pl_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        ll_tar = session.get(pl_url, stream=True)
         perseus_latin_file_name = urlsplit(pl_url).path.split('/')[-1]
         perseus_latin_file_path = \
             os.path.join(orig_files_dir_perseus_latin, perseus_latin_file_name)
         try:
-            with open(perseus_latin_file_path, 'wb') as new_file:
-                new_file.write(ll_tar.content)
-                logging.info('Finished writing %s.', perseus_latin_file_name)
+            download(pl_url, perseus_latin_file_path)
+            logging.info('Finished writing %s.', perseus_latin_file_name)
         except IOError:
             logging.error('Failed to write file %s', perseus_latin_file_name)
         try:
@@ -695,24 +718,21 @@ class Compile(object):  # pylint: disable=R0904
         except IOError:
             logging.info('Failed to unpack %s.', perseus_latin_file_name)
 
+    @instrument.timed('Compile.get_lacus_curtius_latin_tar')
     def get_lacus_curtius_latin_tar(self):
         """Fetch lacus_curtius_latin_tar"""
         orig_files_dir_lacus_curtius_latin = \
             os.path.join(self.orig_files_dir, 'lacus_curtius_latin')
         lc_url = 'https://raw.githubusercontent.com/cltk/' \
                  'latin_corpus_lacus_curtius/master/lacus_curtius.tar.gz'
-        session = requests.Session()
-        session.mount(lc_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        ll_tar = session.get(lc_url, stream=True)
         lacus_curtius_latin_file_name = urlsplit(lc_url).path.split('/')[-1]
         lacus_curtius_latin_file_path = \
             os.path.join(orig_files_dir_lacus_curtius_latin,
                          lacus_curtius_latin_file_name)
         try:
-            with open(lacus_curtius_latin_file_path, 'wb') as new_file:
-                new_file.write(ll_tar.content)
-                logging.info('Finished writing %s.',
-                             lacus_curtius_latin_file_name)
+            download(lc_url, lacus_curtius_latin_file_path)
+            logging.info('Finished writing %s.',
+                         lacus_curtius_latin_file_name)
         except IOError:
             logging.error('Failed to write file %s',
                           lacus_curtius_latin_file_name)
@@ -724,21 +744,18 @@ class Compile(object):  # pylint: disable=R0904
         except IOError:
             logging.info('Failed to unpack %s.', lacus_curtius_latin_file_name)
 
+    @instrument.timed('Compile.get_perseus_greek_tar')
     def get_perseus_greek_tar(self):
         """Fetch Perseus Greek corpus"""
         orig_files_dir_perseus_greek = os.path.join(self.orig_files_dir,
                                                     'perseus_greek')
         pg_url = 'https://raw.githubusercontent.com/cltk/greek_corpus_perseus/master/greek_corpus_perseus.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         perseus_greek_file_name = urlsplit(pg_url).path.split('/')[-1]
         perseus_greek_file_path = os.path.join(orig_files_dir_perseus_greek,
                                                perseus_greek_file_name)
         try:
-            with open(perseus_greek_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.', perseus_greek_file_name)
+            download(pg_url, perseus_greek_file_path)
+            logging.info('Finished writing %s.', perseus_greek_file_name)
         except IOError:
             logging.error('Failed to write file %s', perseus_greek_file_name)
         try:
@@ -748,6 +765,7 @@ class Compile(object):  # pylint: disable=R0904
         except IOError:
             logging.info('Failed to unpack %s.', perseus_greek_file_name)
 
+    @instrument.timed('Compile.get_treebank_perseus_greek_tar')
     def get_treebank_perseus_greek_tar(self):
         """Fetch Perseus's Greek part-of-speech treebank"""
         compiled_files_dir_treebank_perseus_greek = os.path.join(self.compiled_files_dir, 'treebank_perseus_greek')
@@ -759,18 +777,14 @@ class Compile(object):  # pylint: disable=R0904
         orig_files_dir_treebank_perseus_greek = \
             os.path.join(self.orig_files_dir, 'treebank_perseus_greek')
         pg_url = 'https://raw.githubusercontent.com/cltk/greek_treebank_perseus/master/greek_treebank_perseus.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         treebank_perseus_greek_file_name = urlsplit(pg_url).path.split('/')[-1]
         treebank_perseus_greek_file_path = \
             os.path.join(orig_files_dir_treebank_perseus_greek,
                          treebank_perseus_greek_file_name)
         try:
-            with open(treebank_perseus_greek_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.',
-                             treebank_perseus_greek_file_name)
+            download(pg_url, treebank_perseus_greek_file_path)
+            logging.info('Finished writing %s.',
+                         treebank_perseus_greek_file_name)
         except IOError:
             logging.error('Failed to write file %s',
                           treebank_perseus_greek_file_name)
@@ -783,6 +797,7 @@ class Compile(object):  # pylint: disable=R0904
             logging.info('Failed to unpack %s.',
                          treebank_perseus_greek_file_name)
 
+    @instrument.timed('Compile.get_treebank_perseus_latin_tar')
     def get_treebank_perseus_latin_tar(self):
         """Fetch Perseus's Latin treebank files"""
         compiled_files_dir_treebank_perseus_latin = os.path.join(self.compiled_files_dir, 'treebank_perseus_latin')
@@ -794,18 +809,14 @@ class Compile(object):  # pylint: disable=R0904
         orig_files_dir_treebank_perseus_latin = \
             os.path.join(self.orig_files_dir, 'treebank_perseus_latin')
         pg_url = 'https://raw.githubusercontent.com/cltk/latin_treebank_perseus/master/latin_treebank_perseus.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         treebank_perseus_latin_file_name = urlsplit(pg_url).path.split('/')[-1]
         treebank_perseus_latin_file_path = \
             os.path.join(orig_files_dir_treebank_perseus_latin,
                          treebank_perseus_latin_file_name)
         try:
-            with open(treebank_perseus_latin_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.',
-                             treebank_perseus_latin_file_name)
+            download(pg_url, treebank_perseus_latin_file_path)
+            logging.info('Finished writing %s.',
+                         treebank_perseus_latin_file_name)
         except IOError:
             logging.error('Failed to write file %s',
                           treebank_perseus_latin_file_name)
@@ -818,22 +829,19 @@ class Compile(object):  # pylint: disable=R0904
             logging.info('Failed to unpack %s.',
                          treebank_perseus_latin_file_name)
 
+    @instrument.timed('Compile.get_pos_latin_tar')
     def get_pos_latin_tar(self):
         """Fetch Latin part-of-speech files"""
         orig_files_dir_pos_latin = os.path.join(self.orig_files_dir,
                                                 'pos_latin')
         pg_url = 'https://raw.githubusercontent.com/cltk/pos_latin/' \
                  'master/pos_latin.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         pos_latin_file_name = urlsplit(pg_url).path.split('/')[-1]
         pos_latin_file_path = os.path.join(orig_files_dir_pos_latin,
                                            pos_latin_file_name)
         try:
-            with open(pos_latin_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.', pos_latin_file_name)
+            download(pg_url, pos_latin_file_path)
+            logging.info('Finished writing %s.', pos_latin_file_name)
         except IOError:
             logging.error('Failed to write file %s', pos_latin_file_name)
         compiled_files_dir_pos_latin = os.path.join(self.compiled_files_dir,
@@ -850,6 +858,7 @@ class Compile(object):  # pylint: disable=R0904
         except IOError:
             logging.info('Failed to unpack %s.', pos_latin_file_name)
 
+    @instrument.timed('Compile.get_sentence_tokens_latin_tar')
     def get_sentence_tokens_latin_tar(self):
         """Fetch algorithm for Latin sentence tokenization"""
         orig_files_dir_tokens_latin = \
@@ -863,28 +872,25 @@ class Compile(object):  # pylint: disable=R0904
             os.mkdir(compiled_files_dir_tokens_latin)
         pg_url = 'https://raw.githubusercontent.com/cltk/' \
                  'cltk_latin_sentence_tokenizer/master/latin.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         tokens_latin_file_name = urlsplit(pg_url).path.split('/')[-1]
         tokens_latin_file_path = os.path.join(orig_files_dir_tokens_latin,
                                               tokens_latin_file_name)
         try:
-            with open(tokens_latin_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.', tokens_latin_file_name)
-                try:
-                    shutil.unpack_archive(tokens_latin_file_path,
-                                          compiled_files_dir_tokens_latin)
-                    logging.info('Finished unpacking %s.',
-                                 tokens_latin_file_name)
-                except IOError:
-                    logging.info('Failed to unpack %s.',
-                                 tokens_latin_file_name)
+            download(pg_url, tokens_latin_file_path)
+            logging.info('Finished writing %s.', tokens_latin_file_name)
+            try:
+                shutil.unpack_archive(tokens_latin_file_path,
+                                      compiled_files_dir_tokens_latin)
+                logging.info('Finished unpacking %s.',
+                             tokens_latin_file_name)
+            except IOError:
+                logging.info('Failed to unpack %s.',
+                             tokens_latin_file_name)
         except IOError:
             logging.error('Failed to write file %s', tokens_latin_file_name)
 
 
+    @instrument.timed('Compile.get_sentence_tokens_greek_tar')
     def get_sentence_tokens_greek_tar(self):
         """Fetch algorithm for Greek sentence tokenization"""
         orig_files_dir_tokens_greek = \
@@ -898,28 +904,25 @@ class Compile(object):  # pylint: disable=R0904
             os.mkdir(compiled_files_dir_tokens_greek)
         pg_url = 'https://raw.githubusercontent.com/cltk/' \
                  'cltk_greek_sentence_tokenizer/master/greek.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         tokens_greek_file_name = urlsplit(pg_url).path.split('/')[-1]
         tokens_greek_file_path = os.path.join(orig_files_dir_tokens_greek,
                                               tokens_greek_file_name)
         try:
-            with open(tokens_greek_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.', tokens_greek_file_name)
-                try:
-                    shutil.unpack_archive(tokens_greek_file_path,
-                                          compiled_files_dir_tokens_greek)
-                    logging.info('Finished unpacking %s.',
-                                 tokens_greek_file_name)
-                except IOError:
-                    logging.info('Failed to unpack %s.',
-                                 tokens_greek_file_name)
+            download(pg_url, tokens_greek_file_path)
+            logging.info('Finished writing %s.', tokens_greek_file_name)
+            try:
+                shutil.unpack_archive(tokens_greek_file_path,
+                                      compiled_files_dir_tokens_greek)
+                logging.info('Finished unpacking %s.',
+                             tokens_greek_file_name)
+            except IOError:
+                logging.info('Failed to unpack %s.',
+                             tokens_greek_file_name)
         except IOError:
             logging.error('Failed to write file %s', tokens_greek_file_name)
 
 
+    @instrument.timed('Compile.get_cltk_greek_linguistic_data_tar')
     def get_cltk_greek_linguistic_data_tar(self):
         """Get CLTK's ML taggers, tokenizers, etc."""
         orig_files_dir_ling_greek = \
@@ -935,28 +938,25 @@ class Compile(object):  # pylint: disable=R0904
         else:
             os.mkdir(greek_dir_ling)
         pg_url = 'https://raw.githubusercontent.com/cltk/cltk_greek_linguistic_data/master/greek.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         ling_greek_file_name = urlsplit(pg_url).path.split('/')[-1]
         tar_greek_file_path = os.path.join(orig_files_dir_ling_greek,
                                            ling_greek_file_name)
         try:
-            with open(tar_greek_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.', ling_greek_file_name)
-                try:
-                    shutil.unpack_archive(tar_greek_file_path,
-                                          greek_dir_ling)
-                    logging.info('Finished unpacking %s.',
-                                 ling_greek_file_name)
-                except IOError:
-                    logging.info('Failed to unpack %s.',
-                                 ling_greek_file_name)
+            download(pg_url, tar_greek_file_path)
+            logging.info('Finished writing %s.', ling_greek_file_name)
+            try:
+                shutil.unpack_archive(tar_greek_file_path,
+                                      greek_dir_ling)
+                logging.info('Finished unpacking %s.',
+                             ling_greek_file_name)
+            except IOError:
+                logging.info('Failed to unpack %s.',
+                             ling_greek_file_name)
         except IOError:
             logging.error('Failed to write file %s', ling_greek_file_name)
 
 
+    @instrument.timed('Compile.get_cltk_latin_linguistic_data_tar')
     def get_cltk_latin_linguistic_data_tar(self):
         """Get CLTK's ML taggers, tokenizers, etc."""
         orig_files_dir_ling_latin = \
@@ -972,31 +972,87 @@ class Compile(object):  # pylint: disable=R0904
         else:
             os.mkdir(latin_dir_ling)
         pg_url = 'https://raw.githubusercontent.com/cltk/cltk_latin_linguistic_data/master/latin.tar.gz'
-        session = requests.Session()
-        session.mount(pg_url, SSLAdapter(ssl.PROTOCOL_TLSv1))
-        pg_tar = session.get(pg_url, stream=True)
         ling_latin_file_name = urlsplit(pg_url).path.split('/')[-1]
         tar_latin_file_path = os.path.join(orig_files_dir_ling_latin,
                                            ling_latin_file_name)
         try:
-            with open(tar_latin_file_path, 'wb') as new_file:
-                new_file.write(pg_tar.content)
-                logging.info('Finished writing %s.', ling_latin_file_name)
-                try:
-                    shutil.unpack_archive(tar_latin_file_path,
-                                          latin_dir_ling)
-                    logging.info('Finished unpacking %s.',
-                                 ling_latin_file_name)
-                except IOError:
-                    logging.info('Failed to unpack %s.',
-                                 ling_latin_file_name)
+            download(pg_url, tar_latin_file_path)
+            logging.info('Finished writing %s.', ling_latin_file_name)
+            try:
+                shutil.unpack_archive(tar_latin_file_path,
+                                      latin_dir_ling)
+                logging.info('Finished unpacking %s.',
+                             ling_latin_file_name)
+            except IOError:
+                logging.info('Failed to unpack %s.',
+                             ling_latin_file_name)
         except IOError:
             logging.error('Failed to write file %s', ling_latin_file_name)
 
 
+def download(url, path, checksum=None, refresh=False):
+    """Fetch ``url`` to ``path`` through the shared corpus cache, so that a
+    tarball already downloaded by anyone using the cache is only linked.
+    ``refresh`` downloads it again even if the cache has it.
+    """
+    from cltk.corpus.common.cache import corpus_cache
+    return corpus_cache.fetch(url, path, checksum=checksum, opener=fetch_url,
+                              refresh=refresh)
+
+
+def fetch_url(url, headers=None):
+    """Open a streaming GET of ``url``, with extra request ``headers``,
+    over a TLS session. ``requests`` and the TLS stack are imported here,
+    on first download, rather than when this module is imported.
+    """
+    import ssl
+    import requests
+    from requests_toolbelt import SSLAdapter
+    session = requests.Session()
+    session.mount(url, SSLAdapter(ssl.PROTOCOL_TLSv1))
+    return session.get(url, stream=True, headers=headers)
+
+
 def remove_non_ascii(input_string):
     """remove non-ascii: http://stackoverflow.com/a/1342373"""
-    return "".join(i for i in input_string if ord(i) < 128)
+    return input_string.encode('ascii', 'ignore').decode('ascii')
+
+
+NON_ASCII_BYTES = bytes(range(128, 256))
+
+# Buffers larger than this are filtered in slices of this size
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def remove_non_ascii_bytes(data):
+    """Delete every byte >= 0x80 from ``data`` with ``bytes.translate``.
+    ``data`` may be ``bytes`` or any buffer (``bytearray``, ``memoryview``,
+    ``mmap``); buffers are filtered a slice at a time so that only the
+    output, returned as a ``bytearray``, is ever held in full.
+    """
+    if isinstance(data, bytes):
+        return data.translate(None, NON_ASCII_BYTES)
+    view = memoryview(data)
+    filtered = bytearray()
+    for start in range(0, len(view), CHUNK_SIZE):
+        filtered += view[start:start + CHUNK_SIZE].tobytes().translate(
+            None, NON_ASCII_BYTES)
+    view.release()
+    return filtered
+
+
+def read_ascii(path):
+    """Return the ASCII bytes of the file at ``path`` as a bytes-like
+    object, memory-mapping it so that the unfiltered input never sits on
+    the Python heap.
+    """
+    import mmap
+    with open(path, 'rb') as file_open:
+        if os.fstat(file_open.fileno()).st_size == 0:
+            return b''
+        with mmap.mmap(file_open.fileno(), 0,
+                       access=mmap.ACCESS_READ) as mapped:
+            return remove_non_ascii_bytes(mapped)
 
 
 def clear_log():
@@ -1009,9 +1065,8 @@ def clear_log():
 
 
 def copy_dir_contents(src, dest):
-    """Copy contents of one directory to another"""
-    src_files = os.listdir(src)
-    for file_name in src_files:
-        full_file_name = os.path.join(src, file_name)
-        if os.path.isfile(full_file_name):
-            shutil.copy(full_file_name, dest)
+    """Copy contents of one directory to another, hardlinking where
+    possible and skipping files that are already up to date.
+    """
+    from cltk.corpus.common.local_import import import_tree
+    return import_tree(src, dest, recursive=False)
@@ -0,0 +1,380 @@
+"""Keyword-in-context concordances of compiled corpora from a positional
+index.
+
+``build_index()`` tokenizes each compiled author file once and writes,
+as ``.npy`` arrays, the byte span of every word and, for each kind of
+term (``surface`` form, ``lemma``, ``stem``), an inverted index: the
+sorted terms, and for each term the positions of its occurrences. A
+query is one binary search and a slice of the postings; author and work
+filters are range tests on those positions; and only the hits on the
+requested page are read back, as byte ranges of the text files::
+
+    index_corpus('tlg')
+    concordance = Concordance('~/cltk_data/compiled/tlg/concordance')
+    page = concordance.search('λόγος', authors=['Plato'], context=8)
+    page.total, page.hits[0].keyword
+    # (2372, 'λόγος')
+
+Lemmata and stems come from ``LemmaReplacer`` and ``Stemmer`` and are
+computed once per distinct word.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from array import array
+import ast
+from collections import namedtuple
+import json
+import logging
+import os
+import re
+import shutil
+import unicodedata
+
+import numpy
+
+from cltk.instrument import instrument
+from cltk.tokenize.word import ELISION, WORD
+from cltk.vocab import Vocabulary
+
+FORMAT_VERSION = 1
+META_NAME = 'concordance.json'
+KINDS = ('surface', 'lemma', 'stem')
+# Terms indexed unless told otherwise
+DEFAULT_KINDS = {'latin': ('surface', 'lemma', 'stem'),
+                 'greek': ('surface',)}
+CORPUS_LANGUAGES = {'tlg': 'greek', 'phi5': 'latin'}
+WORD_SCANNERS = {'latin': re.compile(WORD),
+                 'greek': re.compile('%s%s?' % (WORD, ELISION))}
+SPACES = re.compile(r'\s+')
+
+Hit = namedtuple('Hit', ['file', 'author', 'work', 'position', 'left',
+                         'keyword', 'right'])
+Page = namedtuple('Page', ['total', 'page', 'page_size', 'hits'])
+
+
+class TermNormalizer(object):
+    """Turn words into the terms of each kind, caching them per word."""
+
+    def __init__(self, kinds, lemmatizer=None, stemmer=None):
+        for kind in kinds:
+            if kind not in KINDS:
+                raise ValueError('Unknown term kind %r' % kind)
+        self.kinds = tuple(kinds)
+        self._lemmatizer = lemmatizer
+        self._stemmer = stemmer
+        self._cache = {}
+
+    @property
+    def lemmatizer(self):
+        if self._lemmatizer is None:
+            from cltk.stem.latin.lemmatizer import LemmaReplacer
+            self._lemmatizer = LemmaReplacer()
+        return self._lemmatizer
+
+    @property
+    def stemmer(self):
+        if self._stemmer is None:
+            from cltk.stem.latin.stemmer import Stemmer
+            self._stemmer = Stemmer()
+        return self._stemmer
+
+    def term(self, kind, word):
+        """Return the ``kind`` term of ``word``."""
+        surface = unicodedata.normalize('NFC', word).lower()
+        if kind == 'surface':
+            return surface
+        if kind == 'lemma':
+            return self.lemmatizer.lemmatize(surface)
+        if kind == 'stem':
+            return self.stemmer.stem(surface).strip()
+        raise ValueError('Unknown term kind %r' % kind)
+
+    def terms(self, word):
+        """Return the terms of ``word``, one per kind."""
+        terms = self._cache.get(word)
+        if terms is None:
+            terms = self._cache[word] = tuple(self.term(kind, word)
+                                              for kind in self.kinds)
+        return terms
+
+
+def byte_offsets(text):
+    """Return the UTF-8 byte offset of each character of ``text``, plus
+    the total length. Characters decoded with ``surrogateescape`` count
+    as the one byte they stand for.
+    """
+    points = numpy.frombuffer(text.encode('utf-32-le', 'surrogatepass'),
+                              dtype=numpy.uint32)
+    sizes = 1 + (points >= 0x80).astype(numpy.int64) + \
+        (points >= 0x800) + (points >= 0x10000)
+    sizes[(points >= 0xDC80) & (points <= 0xDCFF)] = 1
+    offsets = numpy.zeros(len(points) + 1, dtype=numpy.int64)
+    numpy.cumsum(sizes, out=offsets[1:])
+    return offsets
+
+
+def _read_dict(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as file_open:
+        return ast.literal_eval(file_open.read())
+
+
+def _concatenate(parts, dtype):
+    if not parts:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.concatenate(parts).astype(dtype)
+
+
+def _sorted_terms(vocab):
+    """Return ``vocab``'s terms sorted, and an array mapping each id to
+    its position in that order.
+    """
+    terms = vocab.to_array()
+    order = numpy.argsort(terms, kind='stable')
+    rank = numpy.empty(len(order), dtype=numpy.int32)
+    rank[order] = numpy.arange(len(order))
+    return terms[order], rank
+
+
+@instrument.timed('concordance.build_index')
+def build_index(files, out_dir, language, kinds=None, authors=None,
+                work_offsets=None, lemmatizer=None, stemmer=None):
+    """Index the compiled text files ``files``, a list of ``(file_name,
+    path)``, into the directory ``out_dir``. ``authors`` maps file names
+    to author names, and ``work_offsets`` file names to the ``(byte
+    offset, title)`` of each of their works, as in the compiled corpus
+    indexes.
+    """
+    if kinds is None:
+        kinds = DEFAULT_KINDS[language]
+    authors = authors or {}
+    work_offsets = work_offsets or {}
+    scanner = WORD_SCANNERS[language]
+    normalizer = TermNormalizer(kinds, lemmatizer, stemmer)
+    vocabs = [Vocabulary() for _ in kinds]
+    starts, ends, term_ids = [], [], [[] for _ in kinds]
+    file_starts = [0]
+    work_starts, work_files, work_titles = [], [], []
+    # raw word -> its term id of each kind
+    word_ids = {}
+    for file_id, (file_name, path) in enumerate(files):
+        with open(path, 'rb') as file_open:
+            text = file_open.read().decode('utf-8', 'surrogateescape')
+        spans = array('q')
+        ids = array('i')
+        add_span, add_ids = spans.extend, ids.extend
+        for match in scanner.finditer(text):
+            word = match.group()
+            word_id = word_ids.get(word)
+            if word_id is None:
+                word_id = word_ids[word] = tuple(
+                    vocab.add(term) for vocab, term in
+                    zip(vocabs, normalizer.terms(word)))
+            add_span(match.span())
+            add_ids(word_id)
+        spans = numpy.frombuffer(spans, dtype=numpy.int64).reshape(-1, 2)
+        ids = numpy.frombuffer(ids, dtype=numpy.int32).reshape(-1, len(kinds))
+        offsets = byte_offsets(text)
+        file_word_starts = offsets[spans[:, 0]]
+        starts.append(file_word_starts.astype(numpy.uint32))
+        ends.append(offsets[spans[:, 1]].astype(numpy.uint32))
+        for kind_ids, column in zip(term_ids, ids.T):
+            kind_ids.append(column.copy())
+        first = file_starts[-1]
+        works = sorted(work_offsets.get(file_name, []))
+        if not works or numpy.searchsorted(file_word_starts,
+                                           works[0][0]) > 0:
+            works.insert(0, (0, ''))
+        for byte_offset, title in works:
+            position = first + int(numpy.searchsorted(file_word_starts,
+                                                      byte_offset))
+            if work_starts and work_starts[-1] == position and \
+                    work_files[-1] == file_id:
+                # A work without words; the next one starts here too
+                work_titles[-1] = title
+                continue
+            work_starts.append(position)
+            work_files.append(file_id)
+            work_titles.append(title)
+        file_starts.append(first + len(spans))
+    arrays = {
+        # Byte offsets within each file
+        'starts': _concatenate(starts, numpy.uint32),
+        'ends': _concatenate(ends, numpy.uint32),
+        'file_starts': numpy.array(file_starts, dtype=numpy.int64),
+        'file_names': numpy.array([name for name, _ in files], dtype=str),
+        'file_paths': numpy.array([os.path.abspath(path)
+                                   for _, path in files], dtype=str),
+        'file_authors': numpy.array([authors.get(name, '')
+                                     for name, _ in files], dtype=str),
+        'work_starts': numpy.array(work_starts, dtype=numpy.int64),
+        'work_files': numpy.array(work_files, dtype=numpy.int64),
+        'work_titles': numpy.array(work_titles, dtype=str)}
+    for kind, vocab, kind_ids in zip(kinds, vocabs, term_ids):
+        terms, rank = _sorted_terms(vocab)
+        ids = rank[_concatenate(kind_ids, numpy.int32)]
+        arrays[kind + '_terms'] = terms
+        arrays[kind + '_postings'] = numpy.argsort(
+            ids, kind='stable').astype(numpy.int32)
+        arrays[kind + '_offsets'] = numpy.concatenate(
+            ([0], numpy.cumsum(numpy.bincount(ids, minlength=len(terms)))))
+    partial = out_dir.rstrip(os.sep) + '.part'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for name, values in arrays.items():
+        numpy.save(os.path.join(partial, name + '.npy'), values,
+                   allow_pickle=False)
+    with open(os.path.join(partial, META_NAME), 'w') as file_open:
+        json.dump({'format': FORMAT_VERSION, 'language': language,
+                   'kinds': list(kinds), 'arrays': sorted(arrays)},
+                  file_open, indent=1)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(partial, out_dir)
+    logging.info('Indexed %d words of %d files in %s', file_starts[-1],
+                 len(files), out_dir)
+    return out_dir
+
+
+def index_corpus(corpus, session=None, out_dir=None, language=None,
+                 **kwargs):
+    """Index the compiled files of ``corpus`` (``'tlg'``, ``'phi5'``
+    ...) with their authors and works; by default into
+    ``compiled/<corpus>/concordance``.
+    """
+    from cltk.corpus.common.session import CompileSession
+    if session is None:
+        session = CompileSession()
+    if language is None:
+        language = CORPUS_LANGUAGES[corpus]
+    compiled_dir = session.corpus_dir(corpus)
+    files = [(file_name[:-4], os.path.join(compiled_dir, file_name))
+             for file_name in sorted(os.listdir(compiled_dir))
+             if file_name.endswith('.txt') and
+             not file_name.startswith('index_')]
+    authors = _read_dict(os.path.join(compiled_dir, 'index_file_author.txt'))
+    work_offsets = _read_dict(os.path.join(compiled_dir,
+                                           'index_work_offsets.txt'))
+    if out_dir is None:
+        out_dir = os.path.join(compiled_dir, 'concordance')
+    return build_index(files, out_dir, language, authors=authors,
+                       work_offsets=work_offsets, **kwargs)
+
+
+class Concordance(object):
+    """Search an index written by ``build_index()``."""
+
+    def __init__(self, path, lemmatizer=None, stemmer=None):
+        path = os.path.expanduser(path)
+        with open(os.path.join(path, META_NAME)) as file_open:
+            meta = json.load(file_open)
+        if meta.get('format') != FORMAT_VERSION:
+            raise ValueError('Unsupported concordance format in %s' % path)
+        self.language = meta['language']
+        self.kinds = tuple(meta['kinds'])
+        self.normalizer = TermNormalizer(self.kinds, lemmatizer, stemmer)
+        # Plain ndarray views of the maps index faster than numpy.memmap
+        self.arrays = {name: numpy.asarray(numpy.load(
+            os.path.join(path, name + '.npy'), mmap_mode='r'))
+            for name in meta['arrays']}
+        self.file_names = self.arrays['file_names'].tolist()
+        self.file_authors = self.arrays['file_authors'].tolist()
+        self.work_titles = self.arrays['work_titles'].tolist()
+
+    def __len__(self):
+        """Number of indexed words."""
+        return len(self.arrays['starts'])
+
+    def _read(self, file_id, start, stop):
+        """Return bytes ``start:stop`` of a file. Files are opened per
+        read, so a long-lived concordance over thousands of files holds
+        no descriptors.
+        """
+        with open(self.arrays['file_paths'][file_id], 'rb') as file_open:
+            file_open.seek(start)
+            return file_open.read(stop - start)
+
+    def _file_ids(self, authors):
+        wanted = set(authors)
+        return [file_id for file_id, (name, author) in enumerate(
+            zip(self.file_names, self.file_authors))
+            if name in wanted or author in wanted]
+
+    def _work_ids(self, works):
+        return [work_id for work_id, title in enumerate(self.work_titles)
+                if any(work in title for work in works)]
+
+    def positions(self, query, by='surface', authors=None, works=None):
+        """Return the sorted word positions matching ``query`` (a word,
+        or a list of words), as ``by`` terms, in files whose name or
+        author is in ``authors`` and works whose title contains one of
+        ``works``.
+        """
+        if by not in self.kinds:
+            raise ValueError('%r terms are not indexed' % by)
+        words = [query] if isinstance(query, str) else list(query)
+        terms = self.arrays[by + '_terms']
+        offsets = self.arrays[by + '_offsets']
+        postings = self.arrays[by + '_postings']
+        parts = []
+        for word in words:
+            term = self.normalizer.term(by, word)
+            index = int(numpy.searchsorted(terms, term))
+            if index < len(terms) and terms[index] == term:
+                parts.append(postings[offsets[index]:offsets[index + 1]])
+        if not parts:
+            return numpy.zeros(0, dtype=numpy.int64)
+        found = parts[0] if len(parts) == 1 else \
+            numpy.unique(numpy.concatenate(parts))
+        if authors is not None:
+            file_ids = self._file_ids(authors)
+            files = numpy.searchsorted(self.arrays['file_starts'], found,
+                                       side='right') - 1
+            found = found[numpy.isin(files, file_ids)]
+        if works is not None:
+            work_ids = self._work_ids(works)
+            work = numpy.searchsorted(self.arrays['work_starts'], found,
+                                      side='right') - 1
+            found = found[numpy.isin(work, work_ids)]
+        return found
+
+    def count(self, query, by='surface', authors=None, works=None):
+        """Number of matches of ``query``."""
+        return len(self.positions(query, by, authors, works))
+
+    @instrument.timed('Concordance.search')
+    def search(self, query, by='surface', authors=None, works=None,
+               context=8, page=0, page_size=20):
+        """Return one ``Page`` of ``Hit``s for ``query`` (see
+        ``positions()``), with ``context`` words either side.
+        """
+        found = self.positions(query, by, authors, works)
+        start = page * page_size
+        hits = [self.hit(int(position), context)
+                for position in found[start:start + page_size]]
+        return Page(len(found), page, page_size, hits)
+
+    def hit(self, position, context=8):
+        """Return the ``Hit`` at word ``position``."""
+        arrays = self.arrays
+        file_id = int(numpy.searchsorted(arrays['file_starts'], position,
+                                         side='right')) - 1
+        first = int(arrays['file_starts'][file_id])
+        last = int(arrays['file_starts'][file_id + 1]) - 1
+        work_id = int(numpy.searchsorted(arrays['work_starts'], position,
+                                         side='right')) - 1
+        starts, ends = arrays['starts'], arrays['ends']
+        left = int(starts[max(position - context, first)])
+        begin, end = int(starts[position]), int(ends[position])
+        right = int(ends[min(position + context, last)])
+        text = self._read(file_id, left, right)
+        begin, end = begin - left, end - left
+
+        def clean(data):
+            return SPACES.sub(' ', data.decode('utf-8', 'replace')).strip()
+        return Hit(self.file_names[file_id], self.file_authors[file_id],
+                   self.work_titles[work_id], position,
+                   clean(text[:begin]), clean(text[begin:end]),
+                   clean(text[end:]))
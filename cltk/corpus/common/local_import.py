@@ -0,0 +1,89 @@
+"""Import a corpus that is already on local disk (a mounted TLG or PHI
+disk, an unpacked checkout) into ``cltk_data`` without copying it file by
+file or re-tarring it.
+
+Files are hardlinked where source and destination share a filesystem,
+reflinked where the filesystem supports it, and copied otherwise, by a
+pool of threads. A file whose destination already has the same size and
+modification time is skipped, so re-importing an unchanged corpus only
+costs a ``stat`` per file.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import shutil
+
+from cltk.corpus.common.cache import link_file
+from cltk.instrument import instrument
+
+
+def iter_files(src, recursive=True):
+    """Yield the paths, relative to ``src``, of the regular files in it."""
+    if not recursive:
+        for entry in sorted(os.scandir(src), key=lambda entry: entry.name):
+            if entry.is_file():
+                yield entry.name
+        return
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for file_name in sorted(files):
+            yield os.path.relpath(os.path.join(root, file_name), src)
+
+
+def unchanged(src, dest):
+    """True if ``dest`` exists with the size and mtime of ``src``."""
+    try:
+        src_stat = os.stat(src)
+        dest_stat = os.stat(dest)
+    except OSError:
+        return False
+    if src_stat.st_ino == dest_stat.st_ino and \
+            src_stat.st_dev == dest_stat.st_dev:
+        return True
+    return src_stat.st_size == dest_stat.st_size and \
+        src_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+
+def import_file(src, dest, link=True):
+    """Link or copy one file unless it is unchanged. Returns the method
+    used, or ``'skipped'``.
+    """
+    if unchanged(src, dest):
+        return 'skipped'
+    if link:
+        method = link_file(src, dest)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(src, dest)
+        method = 'copy'
+    if method != 'hardlink':
+        shutil.copystat(src, dest)
+    instrument.count('files_imported')
+    return method
+
+
+@instrument.timed('local_import.import_tree')
+def import_tree(src, dest, recursive=True, workers=None, link=True):
+    """Import every file under ``src`` into ``dest`` in parallel. Set
+    ``link=False`` to always copy (e.g. if the source will be modified in
+    place). Returns a ``{method: count}`` summary.
+    """
+    if not os.path.isdir(src):
+        raise IOError('Local corpus directory %s does not exist' % src)
+    os.makedirs(dest, exist_ok=True)
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    names = list(iter_files(src, recursive))
+    summary = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        methods = executor.map(
+            lambda name: import_file(os.path.join(src, name),
+                                     os.path.join(dest, name), link), names)
+        for method in methods:
+            summary[method] = summary.get(method, 0) + 1
+    logging.info('Imported %s into %s: %s', src, dest, summary)
+    return summary
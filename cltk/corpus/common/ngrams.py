@@ -0,0 +1,497 @@
+"""Count word or character n-grams over whole corpora in bounded memory.
+
+Tokens are integer ids (see ``cltk.vocab``). The ``n`` ids of an n-gram
+are packed into one ``uint64`` key of ``bits`` bits per id, so counting
+is sorting: ``NgramCounter`` buffers keys, and when the buffer is full
+it sorts and collapses them into a *run* of unique keys and counts,
+spilled to disk. Runs are merged block by block, never loaded whole, so
+memory is bounded by the buffer and the merge blocks.
+
+``count_files()`` splits a corpus into fixed chunks of files counted by
+worker processes, each with its own vocabulary. The parent renumbers
+each chunk's run into one shared vocabulary, in chunk order, and merges
+the runs. The result is the same for any number of workers::
+
+    counts = count_files(paths, 2, workers=8, out_path='bigrams')
+    counts.most_common(3)
+    # [(('et', '-que'), 1032), ...]
+
+Passing a ``CountMinSketch`` gives approximate counts in a fixed-size
+table instead of an exact list.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from cltk.vocab import Vocabulary
+
+# Ids per key are packed with this many bits unless told otherwise: up
+# to 2,097,151 types, trigrams in one uint64
+BITS = 21
+BUFFER_SIZE = 1 << 22
+BLOCK_SIZE = 1 << 20
+MAX_RUNS = 16
+FILES_PER_CHUNK = 8
+META_NAME = 'ngrams.json'
+
+
+def pack(ids, n, bits=BITS):
+    """Return the keys of the n-grams of the id sequence ``ids``. Raises
+    ``ValueError`` if an id does not fit in ``bits`` bits.
+    """
+    if n * bits > 64:
+        raise ValueError('%d-grams do not fit in 64 bits at %d bits per id'
+                         % (n, bits))
+    ids = numpy.asarray(ids)
+    if len(ids) and (int(ids.min()) < 0 or int(ids.max()) >= 1 << bits):
+        raise ValueError('ids must be in [0, %d) at %d bits per id'
+                         % (1 << bits, bits))
+    ids = ids.astype(numpy.uint64)
+    count = len(ids) - n + 1
+    if count <= 0:
+        return numpy.zeros(0, dtype=numpy.uint64)
+    keys = ids[:count].copy()
+    for offset in range(1, n):
+        keys <<= numpy.uint64(bits)
+        keys |= ids[offset:offset + count]
+    return keys
+
+
+def unpack(keys, n, bits=BITS):
+    """Return the ids of packed ``keys`` as an ``(len(keys), n)`` array."""
+    keys = numpy.asarray(keys, dtype=numpy.uint64)
+    mask = numpy.uint64((1 << bits) - 1)
+    columns = [(keys >> numpy.uint64(bits * (n - 1 - position))) & mask
+               for position in range(n)]
+    return numpy.stack(columns, axis=1).astype(numpy.int64)
+
+
+def collapse(keys, counts=None):
+    """Sort ``keys`` and sum the ``counts`` (default 1) of equal keys;
+    returns ``(unique keys, counts)``.
+    """
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    if not len(keys):
+        return keys, numpy.zeros(0, dtype=numpy.int64)
+    starts = numpy.flatnonzero(numpy.concatenate(
+        ([True], keys[1:] != keys[:-1])))
+    if counts is None:
+        totals = numpy.diff(numpy.append(starts, len(keys)))
+    else:
+        totals = numpy.add.reduceat(counts[order], starts)
+    return keys[starts], totals.astype(numpy.int64)
+
+
+def merge_runs(runs, block_size=BLOCK_SIZE):
+    """Merge sorted runs of ``(keys, counts)`` arrays (usually memory
+    maps); yields merged ``(keys, counts)`` blocks in key order.
+    """
+    positions = [0] * len(runs)
+    active = [index for index, (keys, _) in enumerate(runs) if len(keys)]
+    while active:
+        # Every key up to the smallest last key of the next blocks can be
+        # emitted: no later block holds it
+        bound = min(runs[index][0][min(positions[index] + block_size,
+                                       len(runs[index][0])) - 1]
+                    for index in active)
+        key_parts, count_parts = [], []
+        for index in active:
+            keys, counts = runs[index]
+            start = positions[index]
+            end = start + int(numpy.searchsorted(
+                keys[start:start + block_size], bound, side='right'))
+            key_parts.append(keys[start:end])
+            count_parts.append(counts[start:end])
+            positions[index] = end
+        yield collapse(numpy.concatenate(key_parts),
+                       numpy.concatenate(count_parts))
+        active = [index for index in active
+                  if positions[index] < len(runs[index][0])]
+
+
+def _save_run(path, keys, counts):
+    numpy.save(path + '.keys.npy', keys, allow_pickle=False)
+    numpy.save(path + '.counts.npy', counts, allow_pickle=False)
+    return path
+
+
+def _load_run(path, mmap=True):
+    mode = 'r' if mmap else None
+    return (numpy.load(path + '.keys.npy', mmap_mode=mode),
+            numpy.load(path + '.counts.npy', mmap_mode=mode))
+
+
+def _write_merged(path, runs, block_size=BLOCK_SIZE):
+    """Merge ``runs`` into one run file at ``path``, block by block."""
+    from numpy.lib.format import open_memmap
+    total = sum(len(keys) for keys, _ in runs)
+    if not total:
+        return _save_run(path, numpy.zeros(0, dtype=numpy.uint64),
+                         numpy.zeros(0, dtype=numpy.int64))
+    # Merging only shrinks; write to maps of the upper bound, then trim
+    keys_out = open_memmap(path + '.tmp.keys.npy', mode='w+',
+                           dtype=numpy.uint64, shape=(total,))
+    counts_out = open_memmap(path + '.tmp.counts.npy', mode='w+',
+                             dtype=numpy.int64, shape=(total,))
+    size = 0
+    for keys, counts in merge_runs(runs, block_size):
+        keys_out[size:size + len(keys)] = keys
+        counts_out[size:size + len(keys)] = counts
+        size += len(keys)
+    _save_run(path, keys_out[:size], counts_out[:size])
+    del keys_out, counts_out
+    os.remove(path + '.tmp.keys.npy')
+    os.remove(path + '.tmp.counts.npy')
+    return path
+
+
+class CountMinSketch(object):
+    """Approximate counts of ``uint64`` keys in a ``depth`` by ``width``
+    table. Estimates never undercount; sketches with the same shape and
+    seed merge by adding their tables.
+    """
+
+    def __init__(self, width=1 << 20, depth=4, seed=0):
+        # Multiply-shift hashing needs a power of two
+        self.log_width = max(1, int(width - 1).bit_length())
+        self.width = 1 << self.log_width
+        self.depth = depth
+        self.seed = seed
+        rand = numpy.random.RandomState(seed)
+        self.multipliers = rand.randint(
+            0, 1 << 62, size=depth, dtype=numpy.int64).astype(
+                numpy.uint64) * numpy.uint64(2) + numpy.uint64(1)
+        self.table = numpy.zeros((depth, self.width), dtype=numpy.int64)
+
+    def _columns(self, row, keys):
+        shift = numpy.uint64(64 - self.log_width)
+        return ((keys * self.multipliers[row]) >> shift).astype(numpy.intp)
+
+    def add(self, keys, counts=None):
+        """Count ``keys`` (``counts`` times each, default once)."""
+        keys = numpy.asarray(keys, dtype=numpy.uint64)
+        for row in range(self.depth):
+            self.table[row] += numpy.bincount(
+                self._columns(row, keys), weights=counts,
+                minlength=self.width).astype(numpy.int64)
+
+    def query(self, keys):
+        """Return the estimated counts of ``keys``."""
+        keys = numpy.asarray(keys, dtype=numpy.uint64)
+        return numpy.min([self.table[row][self._columns(row, keys)]
+                          for row in range(self.depth)], axis=0)
+
+    def update(self, other):
+        """Add the counts of the sketch ``other``."""
+        if (other.width, other.depth, other.seed) != \
+                (self.width, self.depth, self.seed):
+            raise ValueError('Sketches differ in shape or seed')
+        self.table += other.table
+        return self
+
+
+def _save_meta(path, n, bits, vocab):
+    if vocab is not None:
+        numpy.save(os.path.join(path, 'vocab.npy'), vocab.to_array(),
+                   allow_pickle=False)
+    with open(os.path.join(path, META_NAME), 'w') as file_open:
+        json.dump({'n': n, 'bits': bits}, file_open)
+
+
+class NgramCounts(object):
+    """Counted n-grams: sorted packed keys and their counts, with the
+    vocabulary the ids come from, if known.
+    """
+
+    def __init__(self, n, keys, counts, vocab=None, bits=BITS):
+        self.n = n
+        self.bits = bits
+        self.keys = keys
+        self.counts = counts
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def _key(self, ngram):
+        if self.vocab is not None and ngram and isinstance(ngram[0], str):
+            ngram = [self.vocab.get(token) for token in ngram]
+            if min(ngram) < 0:
+                return None
+        return pack(ngram, self.n, self.bits)[0]
+
+    def __getitem__(self, ngram):
+        """Count of ``ngram``, a tuple of ids or of tokens."""
+        key = self._key(ngram)
+        if key is None:
+            return 0
+        index = int(numpy.searchsorted(self.keys, key))
+        if index < len(self.keys) and self.keys[index] == key:
+            return int(self.counts[index])
+        return 0
+
+    def _decode(self, keys):
+        ids = unpack(keys, self.n, self.bits).tolist()
+        if self.vocab is None:
+            return [tuple(row) for row in ids]
+        tokens = self.vocab.tokens
+        return [tuple(tokens[token_id] for token_id in row) for row in ids]
+
+    def most_common(self, k=10):
+        """The ``k`` most frequent n-grams with their counts; ties in
+        key order.
+        """
+        k = min(k, len(self.counts))
+        if not k:
+            return []
+        counts = numpy.asarray(self.counts)
+        top = numpy.argpartition(-counts, k - 1)[:k]
+        top = top[numpy.lexsort((top, -counts[top]))]
+        return list(zip(self._decode(self.keys[top]),
+                        counts[top].tolist()))
+
+    def items(self, block_size=BLOCK_SIZE):
+        """Yield ``(ngram, count)`` in key order."""
+        for start in range(0, len(self.keys), block_size):
+            keys = self.keys[start:start + block_size]
+            counts = self.counts[start:start + block_size].tolist()
+            for ngram, count in zip(self._decode(keys), counts):
+                yield ngram, count
+
+    def save(self, path):
+        """Write the counts as a directory of ``.npy`` files."""
+        os.makedirs(path, exist_ok=True)
+        _save_run(os.path.join(path, 'ngrams'), self.keys, self.counts)
+        _save_meta(path, self.n, self.bits, self.vocab)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Read counts written by ``save()``, memory-mapped by default."""
+        with open(os.path.join(path, META_NAME)) as file_open:
+            meta = json.load(file_open)
+        keys, counts = _load_run(os.path.join(path, 'ngrams'), mmap)
+        vocab = None
+        vocab_path = os.path.join(path, 'vocab.npy')
+        if os.path.isfile(vocab_path):
+            vocab = Vocabulary.from_array(numpy.load(vocab_path))
+        return cls(meta['n'], numpy.asarray(keys), numpy.asarray(counts),
+                   vocab, meta['bits'])
+
+
+class NgramCounter(object):
+    """Count the n-grams of id sequences in bounded memory.
+
+    Keys are buffered ``buffer_size`` at a time, then collapsed into a
+    sorted run in ``spill_dir`` (a temporary directory by default).
+    Whenever there are ``max_runs`` runs they are merged into one. With a
+    ``sketch``, collapsed keys go to it instead of to runs.
+    """
+
+    def __init__(self, n, bits=BITS, buffer_size=BUFFER_SIZE,
+                 spill_dir=None, max_runs=MAX_RUNS, sketch=None):
+        if n * bits > 64:
+            raise ValueError('%d-grams do not fit in 64 bits at %d bits '
+                             'per id' % (n, bits))
+        self.n = n
+        self.bits = bits
+        self.buffer_size = buffer_size
+        self.max_runs = max_runs
+        self.sketch = sketch
+        self._spill_dir = spill_dir
+        self._own_dir = None
+        self._buffer = []
+        self._buffered = 0
+        self.runs = []
+
+    @property
+    def spill_dir(self):
+        if self._spill_dir is None:
+            self._spill_dir = self._own_dir = tempfile.mkdtemp(
+                prefix='cltk_ngrams_')
+        return self._spill_dir
+
+    def add(self, ids):
+        """Count the n-grams of one sequence of ids; n-grams do not span
+        sequences.
+        """
+        keys = pack(ids, self.n, self.bits)
+        if len(keys):
+            self.add_keys(keys)
+
+    def add_keys(self, keys, counts=None):
+        """Count packed ``keys`` (``counts`` times each, default once)."""
+        if counts is None:
+            counts = numpy.ones(len(keys), dtype=numpy.int64)
+        self._buffer.append((keys, counts))
+        self._buffered += len(keys)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Collapse the buffered keys into a run."""
+        if not self._buffer:
+            return
+        keys, counts = collapse(
+            numpy.concatenate([keys for keys, _ in self._buffer]),
+            numpy.concatenate([counts for _, counts in self._buffer]))
+        self._buffer, self._buffered = [], 0
+        if self.sketch is not None:
+            self.sketch.add(keys, counts)
+            return
+        self.add_run(_save_run(self._run_path(), keys, counts))
+
+    def add_run(self, path):
+        """Take over the run file ``path`` (merging runs if there are
+        ``max_runs`` of them).
+        """
+        self.runs.append(path)
+        if len(self.runs) >= self.max_runs:
+            merged = _write_merged(self._run_path(),
+                                   [_load_run(run) for run in self.runs])
+            for run in self.runs:
+                _remove_run(run)
+            self.runs = [merged]
+
+    def _run_path(self):
+        handle, path = tempfile.mkstemp(prefix='run-', dir=self.spill_dir)
+        os.close(handle)
+        os.remove(path)
+        return path
+
+    def finish(self, vocab=None, out_path=None):
+        """Merge everything counted into ``NgramCounts``, saved to (and
+        memory-mapped from) ``out_path`` if given. With a sketch, returns
+        the sketch.
+        """
+        self.flush()
+        if self.sketch is not None:
+            self.close()
+            return self.sketch
+        runs = [_load_run(run) for run in self.runs]
+        if out_path is not None:
+            os.makedirs(out_path, exist_ok=True)
+            _write_merged(os.path.join(out_path, 'ngrams'), runs)
+            _save_meta(out_path, self.n, self.bits, vocab)
+            self.close()
+            return NgramCounts.load(out_path)
+        key_parts, count_parts = [], []
+        for keys, counts in merge_runs(runs):
+            key_parts.append(keys)
+            count_parts.append(counts)
+        self.close()
+        if not key_parts:
+            return NgramCounts(self.n, numpy.zeros(0, dtype=numpy.uint64),
+                               numpy.zeros(0, dtype=numpy.int64), vocab,
+                               self.bits)
+        return NgramCounts(self.n, numpy.concatenate(key_parts),
+                           numpy.concatenate(count_parts), vocab, self.bits)
+
+    def close(self):
+        """Delete the spilled runs."""
+        for run in self.runs:
+            _remove_run(run)
+        self.runs = []
+        if self._own_dir is not None:
+            shutil.rmtree(self._own_dir, ignore_errors=True)
+            self._spill_dir = self._own_dir = None
+
+
+def _remove_run(path):
+    for suffix in ('.keys.npy', '.counts.npy'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _count_chunk(args):
+    """Count the n-grams of a chunk of files with a vocabulary of its
+    own; returns the vocabulary's tokens and the path of the run.
+    """
+    paths, n, tokenize, bits, spill_dir, buffer_size = args
+    vocab = Vocabulary()
+    counter = NgramCounter(n, bits, buffer_size, spill_dir)
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as file_open:
+            counter.add(vocab.encode(tokenize(file_open.read())))
+    counter.flush()
+    runs = [_load_run(run) for run in counter.runs]
+    handle, path = tempfile.mkstemp(prefix='chunk-', dir=spill_dir)
+    os.close(handle)
+    os.remove(path)
+    _write_merged(path, runs)
+    for run in counter.runs:
+        _remove_run(run)
+    return vocab.tokens, path
+
+
+def count_files(paths, n, tokenize=None, workers=None, out_path=None,
+                sketch=None, files_per_chunk=FILES_PER_CHUNK, bits=BITS,
+                buffer_size=BUFFER_SIZE, spill_dir=None):
+    """Count the ``n``-grams of the UTF-8 files ``paths`` on ``workers``
+    processes. ``tokenize`` turns a file's text into tokens (by default
+    Latin words, with enclitics split; ``list`` gives characters);
+    n-grams do not span files. Returns ``NgramCounts`` over one
+    vocabulary, or ``sketch`` filled with the counts if one is given.
+    """
+    if tokenize is None:
+        from cltk.tokenize.word import tokenize_words
+        tokenize = tokenize_words
+    paths = list(paths)
+    own_dir = spill_dir is None
+    if own_dir:
+        spill_dir = tempfile.mkdtemp(prefix='cltk_ngrams_')
+    jobs = [(paths[start:start + files_per_chunk], n, tokenize, bits,
+             spill_dir, buffer_size)
+            for start in range(0, len(paths), files_per_chunk)]
+    vocab = Vocabulary()
+    counter = NgramCounter(n, bits, buffer_size, spill_dir, sketch=sketch)
+    try:
+        if workers == 1 or len(jobs) < 2:
+            results = map(_count_chunk, jobs)
+            _renumber_chunks(results, vocab, counter)
+        else:
+            import multiprocessing
+            with multiprocessing.Pool(workers) as pool:
+                # In order, so ids are numbered as in a serial count
+                _renumber_chunks(pool.imap(_count_chunk, jobs), vocab,
+                                 counter)
+        return counter.finish(vocab, out_path)
+    finally:
+        counter.close()
+        if own_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def _renumber_chunks(results, vocab, counter):
+    """Rewrite each chunk's run with ids from the shared ``vocab`` and
+    hand it to ``counter``.
+    """
+    n, bits = counter.n, counter.bits
+    for tokens, path in results:
+        remap = numpy.array(vocab.encode(tokens), dtype=numpy.int64)
+        if len(vocab) >= 1 << bits:
+            raise ValueError('More than %d types; use more bits per id'
+                             % ((1 << bits) - 1))
+        keys, counts = _load_run(path, mmap=False)
+        _remove_run(path)
+        ids = remap[unpack(keys, n, bits)]
+        keys = numpy.zeros(len(ids), dtype=numpy.uint64)
+        for position in range(n):
+            keys <<= numpy.uint64(bits)
+            keys |= ids[:, position].astype(numpy.uint64)
+        if counter.sketch is not None:
+            counter.sketch.add(keys, counts)
+            continue
+        order = numpy.argsort(keys)
+        counter.add_run(_save_run(path, keys[order], counts[order]))
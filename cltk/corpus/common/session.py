@@ -0,0 +1,92 @@
+"""State shared by the ``Compile`` steps of one or more corpus builds.
+
+A ``CompileSession`` holds the data directories, the author indexes read
+from ``index_file_author.txt`` and the work titles found while compiling.
+Several ``Compile`` objects, in different threads, may share one session
+to build different corpora at once; a session also pickles, so it can be
+handed to worker processes.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import os
+import threading
+
+DEFAULT_CLTK_DATA = '~/cltk_data'
+
+
+class CompileSession(object):
+    """Directories, indexes and work titles for corpus compilation."""
+
+    def __init__(self, cltk_data=None, log=True):
+        if cltk_data is None:
+            cltk_data = os.environ.get('CLTK_DATA', DEFAULT_CLTK_DATA)
+        self.cltk_data = os.path.expanduser(cltk_data)
+        self.orig_files_dir = os.path.join(self.cltk_data, 'originals')
+        self.compiled_files_dir = os.path.join(self.cltk_data, 'compiled')
+        self.log = log
+        # {corpus: {file_name: author}}
+        self.indexes = {}
+        # {corpus: {file_name: [title, ...]}}
+        self.works = {}
+        # {corpus: {file_name: [(byte_offset, title), ...]}}
+        self.work_offsets = {}
+        self._lock = threading.RLock()
+        self._prepared = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_prepared'] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def prepare(self):
+        """Make the data directories and start file logging, once."""
+        with self._lock:
+            if self._prepared:
+                return
+            for path in (self.cltk_data, self.orig_files_dir,
+                         self.compiled_files_dir):
+                os.makedirs(path, exist_ok=True)
+            if self.log:
+                from cltk.corpus.wrappers.logger import configure_root_logging
+                configure_root_logging(os.path.join(self.cltk_data,
+                                                    'cltk.log'))
+            self._prepared = True
+
+    def corpus_dir(self, corpus, compiled=True):
+        """Return, creating it if needed, the originals or compiled
+        directory of ``corpus``.
+        """
+        root = self.compiled_files_dir if compiled else self.orig_files_dir
+        path = os.path.join(root, corpus)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def set_index(self, corpus, index):
+        """Store the ``{file_name: author}`` index of ``corpus``."""
+        with self._lock:
+            self.indexes[corpus] = index
+
+    def index(self, corpus):
+        """Return the stored index of ``corpus``, or an empty dict."""
+        with self._lock:
+            return self.indexes.get(corpus, {})
+
+    def record_works(self, corpus, file_name, titles, offsets):
+        """Store the work titles and their byte offsets for one file."""
+        with self._lock:
+            self.works.setdefault(corpus, {})[file_name] = titles
+            self.work_offsets.setdefault(corpus, {})[file_name] = offsets
+
+    def reset(self, corpus):
+        """Forget the index and titles of ``corpus`` before rebuilding it."""
+        with self._lock:
+            self.indexes.pop(corpus, None)
+            self.works.pop(corpus, None)
+            self.work_offsets.pop(corpus, None)
@@ -0,0 +1,188 @@
+"""Split the author files of a TLG or PHI corpus into shards of similar
+total size, so they can be compiled on several cores or machines.
+
+Author files range from a few hundred bytes to tens of megabytes, so
+shards are balanced by bytes, not by file count. Files are assigned
+largest first, each to the currently lightest shard (LPT scheduling).
+The plan is written to a JSON manifest. Every node with access to the
+shared ``cltk_data`` directory runs ``run_shard()`` for its shard id, and
+``merge_shards()`` then writes the corpus-wide indexes::
+
+    plan = plan_shards('tlg', 8)
+    write_manifest(plan, 'tlg_manifest.json')
+    run_shard('tlg_manifest.json', 3)       # on each node
+    merge_shards('tlg_manifest.json')       # once, when all are done
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import ast
+import heapq
+import json
+import logging
+import os
+
+from cltk.corpus.common.checkpoint import CompileJournal, JOURNAL_NAME, \
+    atomic_write
+from cltk.corpus.common.compiler import Compile
+from cltk.corpus.common.session import CompileSession
+
+CORPORA = ('tlg', 'phi5', 'phi7')
+
+
+def shard_index_path(compiled_dir, shard_id):
+    """Path of the works index written by one shard."""
+    return os.path.join(compiled_dir, 'index_works.shard-%d.txt' % shard_id)
+
+
+def lpt_schedule(sizes, n_shards):
+    """Assign ``{name: size}`` to ``n_shards`` bins, largest first, each
+    to the lightest bin. Returns a list of ``(total, [names])``.
+    """
+    heap = [(0, shard_id) for shard_id in range(n_shards)]
+    shards = [[0, []] for _ in range(n_shards)]
+    for name in sorted(sizes, key=lambda name: (-sizes[name], name)):
+        load, shard_id = heapq.heappop(heap)
+        shards[shard_id][0] += sizes[name]
+        shards[shard_id][1].append(name)
+        heapq.heappush(heap, (load + sizes[name], shard_id))
+    return [(total, names) for total, names in shards]
+
+
+def plan_shards(corpus, n_shards, session=None):
+    """Read ``index_file_author.txt`` (making it from ``AUTHTAB.DIR`` if
+    needed) and the original file sizes of ``corpus``; return a plan
+    dict with ``n_shards`` balanced shards.
+    """
+    if corpus not in CORPORA:
+        raise ValueError('Unrecognized corpus name %r' % corpus)
+    if session is None:
+        session = CompileSession()
+    compiler = Compile(session)
+    session.corpus_dir(corpus)
+    index = getattr(compiler, 'read_%s_index_file_author' % corpus)()
+    if not index:
+        getattr(compiler, 'make_%s_index_file_author' % corpus)()
+        index = getattr(compiler, 'read_%s_index_file_author' % corpus)()
+    orig_dir = os.path.join(session.orig_files_dir, corpus)
+    sizes = {}
+    for file_name in index or {}:
+        path = os.path.join(orig_dir, file_name + '.TXT')
+        sizes[file_name] = os.path.getsize(path) if os.path.isfile(path) \
+            else 0
+    shards = []
+    for shard_id, (total, names) in enumerate(lpt_schedule(sizes,
+                                                           n_shards)):
+        shards.append({'id': shard_id, 'bytes': total, 'files': names})
+    return {'corpus': corpus,
+            'cltk_data': session.cltk_data,
+            'total_bytes': sum(sizes.values()),
+            'shards': shards}
+
+
+def write_manifest(plan, path):
+    """Write a shard plan as JSON."""
+    atomic_write(path, json.dumps(plan, indent=1, sort_keys=True) + '\n')
+
+
+def read_manifest(path):
+    """Load a shard plan written by ``write_manifest()``."""
+    with open(path) as file_open:
+        return json.load(file_open)
+
+
+def _load(manifest):
+    if isinstance(manifest, dict):
+        return manifest
+    return read_manifest(manifest)
+
+
+def run_shard(manifest, shard_id, session=None):
+    """Compile the author files of one shard into the shared
+    ``compiled/<corpus>/`` directory and write that shard's works index.
+    Interrupted shards resume from their own journal.
+    """
+    plan = _load(manifest)
+    corpus = plan['corpus']
+    if session is None:
+        session = CompileSession(plan['cltk_data'])
+    compiler = Compile(session)
+    compiled_dir = session.corpus_dir(corpus)
+    index = session.index(corpus) or \
+        getattr(compiler, 'read_%s_index_file_author' % corpus)() or {}
+    journal = CompileJournal(compiled_dir,
+                             name='%s.shard-%d' % (JOURNAL_NAME, shard_id))
+    journal.begin()
+    files = plan['shards'][shard_id]['files']
+    for file_name in files:
+        compiler._compile_author_file(  # pylint: disable=W0212
+            corpus, file_name, index.get(file_name),
+            beta_code=corpus == 'tlg', journal=journal)
+    works = session.works.get(corpus, {})
+    offsets = session.work_offsets.get(corpus, {})
+    shard_works = {file_name: (works.get(file_name, []),
+                               offsets.get(file_name, []))
+                   for file_name in files}
+    atomic_write(shard_index_path(compiled_dir, shard_id), str(shard_works))
+    journal.finish()
+    logging.info('Finished %s shard %d (%d files)', corpus.upper(),
+                 shard_id, len(files))
+    return shard_id
+
+
+def _run_shard_star(args):
+    return run_shard(*args)
+
+
+def run_local(manifest, processes=None, session=None):
+    """Run every shard of ``manifest`` in a local process pool, then
+    merge them.
+    """
+    import multiprocessing
+    from cltk.corpus.wrappers.logger import _ROOT_QUEUE, queue_initializer
+    plan = _load(manifest)
+    if session is None:
+        session = CompileSession(plan['cltk_data'])
+    session.prepare()
+    queue = _ROOT_QUEUE.get('queue')
+    kwargs = {}
+    if queue is not None:
+        kwargs = {'initializer': queue_initializer, 'initargs': (queue,)}
+    jobs = [(plan, shard['id'], session) for shard in plan['shards']]
+    with multiprocessing.Pool(processes, **kwargs) as pool:
+        pool.map(_run_shard_star, jobs, chunksize=1)
+    return merge_shards(plan, session)
+
+
+def merge_shards(manifest, session=None):
+    """Combine the per-shard works indexes and write the corpus-wide
+    ``index_author_works.txt`` and ``index_work_offsets.txt`` (and, for
+    the TLG, ``index_meta.txt``). Raises ``IOError`` if a shard has not
+    finished.
+    """
+    plan = _load(manifest)
+    corpus = plan['corpus']
+    if session is None:
+        session = CompileSession(plan['cltk_data'])
+    compiler = Compile(session)
+    compiled_dir = session.corpus_dir(corpus)
+    for shard in plan['shards']:
+        journal = CompileJournal(compiled_dir, name='%s.shard-%d' % (
+            JOURNAL_NAME, shard['id']))
+        if not journal.complete:
+            raise IOError('Shard %d of %s has not finished' % (shard['id'],
+                                                              corpus))
+        with open(shard_index_path(compiled_dir, shard['id'])) as file_open:
+            shard_works = ast.literal_eval(file_open.read())
+        for file_name, (titles, offsets) in shard_works.items():
+            session.record_works(corpus, file_name, titles, offsets)
+    if corpus == 'tlg':
+        compiler.make_tlg_meta_index()
+    getattr(compiler, 'make_%s_index_auth_works' % corpus)()
+    for shard in plan['shards']:
+        os.remove(shard_index_path(compiled_dir, shard['id']))
+        CompileJournal(compiled_dir, name='%s.shard-%d' % (
+            JOURNAL_NAME, shard['id'])).clear()
+    logging.info('Merged %d %s shards', len(plan['shards']), corpus.upper())
+    return True
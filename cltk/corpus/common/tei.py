@@ -0,0 +1,225 @@
+"""Stream plain text and citations out of TEI XML files such as those of
+the Perseus corpora.
+
+Files are read with ``iterparse`` and each passage is cleared and
+detached from the tree once it has been yielded, so memory use does not
+grow with file size. A passage is a verse line (``<l>``) or a paragraph
+(``<p>``), cited by the ``n`` attributes of the enclosing ``<div>``s
+(e.g. book), of the last ``<milestone>`` of each unit (e.g. card) and of
+the line itself::
+
+    >>> for passage in iter_tei('hom.il_gk.xml'):
+    ...     print(passage.ref, passage.text)
+    (('book', '1'), ('card', '1'), ('line', '1')) μῆνιν ἄειδε θεὰ ...
+
+Entities declared in the document are expanded by the parser; those of
+the external TEI DTDs, which are never fetched, are resolved from the
+HTML entity table.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from collections import namedtuple
+import html.entities
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+from cltk.corpus.common.checkpoint import commit_file, partial_path
+from cltk.instrument import instrument
+
+Passage = namedtuple('Passage', ['ref', 'text'])
+
+DIVS = {'div', 'div1', 'div2', 'div3', 'div4', 'div5', 'div6', 'div7'}
+PASSAGES = {'l', 'p'}
+# Elements whose text is not part of the edition
+SKIP = {'teiHeader', 'note', 'bibl', 'figDesc', 'del'}
+MILESTONES = {'milestone'}
+ENTITIES = {name: chr(code)
+            for name, code in html.entities.name2codepoint.items()}
+DOCTYPE = b'<!DOCTYPE TEI.2 SYSTEM "tei2.dtd">'
+HEAD_SIZE = 4096
+
+
+class _Prefixed(object):
+    """File-like object that replays ``head`` before reading ``stream``."""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        head, self.head = self.head, b''
+        if size is None or size < 0:
+            return head + self.stream.read()
+        return head + self.stream.read(max(size - len(head), 0))
+
+
+def _open_source(stream):
+    """Ensure the document has a DOCTYPE, without which expat rejects
+    entities it does not know before the parser's entity table is used.
+    """
+    head = stream.read(HEAD_SIZE)
+    if b'<!DOCTYPE' not in head:
+        start = head.find(b'?>') + 2 if head.lstrip(b'\xef\xbb\xbf') \
+            .startswith(b'<?xml') else 0
+        head = head[:start] + DOCTYPE + head[start:]
+    return _Prefixed(head, stream)
+
+
+def _local(tag):
+    """Strip any ``{namespace}`` from ``tag``."""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def normalize(text):
+    """Collapse runs of whitespace."""
+    return ' '.join(text.split())
+
+
+def iter_tei(path, entities=None):
+    """Yield a ``Passage(ref, text)`` for every verse line and paragraph
+    of the TEI file at ``path`` (or an open binary file). ``entities``
+    adds to the table used for undeclared entity references.
+    """
+    parser = ET.XMLParser()
+    parser.entity.update(ENTITIES)
+    if entities:
+        parser.entity.update(entities)
+    close = False
+    if isinstance(path, (str, bytes, os.PathLike)):
+        stream = open(path, 'rb')
+        close = True
+    else:
+        stream = path
+    try:
+        yield from _iter_events(ET.iterparse(_open_source(stream),
+                                             events=('start', 'end'),
+                                             parser=parser))
+    finally:
+        if close:
+            stream.close()
+
+
+def _iter_events(events):
+    stack = []          # open elements
+    divs = []           # (unit, n) of open citable divs
+    div_depths = []     # len(stack) at which each of them was opened
+    milestones = {}     # unit -> n, ordered by first appearance
+    in_passage = 0
+    skipping = 0
+    for event, elem in events:
+        tag = _local(elem.tag)
+        if event == 'start':
+            stack.append(elem)
+            if tag in SKIP:
+                skipping += 1
+            elif tag in PASSAGES:
+                in_passage += 1
+            elif tag in DIVS and elem.get('n') is not None:
+                unit = (elem.get('type') or elem.get('subtype') or
+                        tag).lower()
+                divs.append((unit, elem.get('n')))
+                div_depths.append(len(stack))
+            elif tag in MILESTONES and not skipping:
+                unit = (elem.get('unit') or 'milestone').lower()
+                milestones.pop(unit, None)
+                milestones[unit] = elem.get('n')
+            continue
+        stack.pop()
+        detach = False
+        if tag in SKIP:
+            skipping -= 1
+            if in_passage:
+                # Keep the tail, which is the passage's own text
+                elem.text = None
+                del elem[:]
+            else:
+                detach = True
+        elif tag in PASSAGES:
+            in_passage -= 1
+            if not in_passage and not skipping:
+                text = normalize(''.join(elem.itertext()))
+                if text:
+                    ref = list(divs) + list(milestones.items())
+                    if tag == 'l' and elem.get('n') is not None:
+                        ref.append(('line', elem.get('n')))
+                    instrument.count('tei_passages')
+                    yield Passage(tuple(ref), text)
+                detach = True
+        elif div_depths and div_depths[-1] == len(stack) + 1:
+            divs.pop()
+            div_depths.pop()
+            # Milestones do not carry over into the next book
+            milestones.clear()
+            detach = True
+        elif not in_passage:
+            detach = True
+        if detach:
+            elem.clear()
+            if stack and len(stack[-1]) and stack[-1][-1] is elem:
+                del stack[-1][-1]
+
+
+def format_ref(ref):
+    """Render a citation as dotted ``n`` values, e.g. ``1.1.1``."""
+    return '.'.join(n for _, n in ref)
+
+
+@instrument.timed('tei.extract_file')
+def extract_file(path, out_path):
+    """Write the passages of one TEI file to ``out_path`` as
+    ``<citation>\\t<text>`` lines. Returns ``(path, passages)``.
+    """
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    partial = partial_path(out_path)
+    count = 0
+    try:
+        with open(partial, 'w', encoding='utf-8') as out_open:
+            for passage in iter_tei(path):
+                out_open.write('%s\t%s\n' % (format_ref(passage.ref),
+                                             passage.text))
+                count += 1
+        commit_file(partial, out_path)
+    except ET.ParseError as err:
+        os.remove(partial)
+        logging.error('Failed to parse TEI file %s: %s', path, err)
+        return path, None
+    except BaseException:
+        # I/O and decoding errors, interrupts: leave no partial file behind
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return path, count
+
+
+def _extract_star(args):
+    return extract_file(*args)
+
+
+def extract_corpus(src_dir, out_dir, processes=None):
+    """Extract every ``.xml`` file under ``src_dir`` to a ``.txt`` file at
+    the same relative path under ``out_dir``, using a process pool.
+    Returns ``{path: passages}``; files that failed to parse map to
+    ``None``.
+    """
+    jobs = []
+    for root, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            if not file_name.lower().endswith('.xml'):
+                continue
+            rel = os.path.relpath(os.path.join(root, file_name), src_dir)
+            jobs.append((os.path.join(src_dir, rel),
+                         os.path.join(out_dir,
+                                      os.path.splitext(rel)[0] + '.txt')))
+    # Large files first, so one big file does not finish the run alone
+    jobs.sort(key=lambda job: -os.path.getsize(job[0]))
+    if processes == 1 or len(jobs) < 2:
+        return dict(map(_extract_star, jobs))
+    import multiprocessing
+    with multiprocessing.Pool(processes) as pool:
+        return dict(pool.imap_unordered(_extract_star, jobs))
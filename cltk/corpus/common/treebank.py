@@ -0,0 +1,220 @@
+"""Load the Perseus (AGDT/ALDT) Greek and Latin dependency treebanks into
+columnar arrays.
+
+Each word of the treebank becomes one row of parallel ``numpy`` arrays:
+form, lemma, part-of-speech tag and relation ids (into interned
+``Vocabulary`` objects) and head. ``sent_offsets[i]:sent_offsets[i + 1]``
+is the slice of sentence ``i``. The XML is streamed with ``iterparse``,
+and the arrays are cached next to it in an ``.npz`` file, so later loads
+skip XML parsing entirely::
+
+    >>> treebank = load_treebank('~/cltk_data/greek/treebank/perseus')
+    >>> treebank.tagged_sents()[0][:2]
+    [('μῆνιν', 'n-s---fa-'), ('ἄειδε', 'v2spma---')]
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from array import array
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+import numpy
+
+from cltk.instrument import instrument
+from cltk.vocab import Vocabulary
+
+CACHE_NAME = '.treebank.npz'
+# Bump when the cached layout changes
+CACHE_VERSION = 1
+COLUMNS = ('form', 'lemma', 'postag', 'head', 'relation')
+VOCABULARIES = ('forms', 'lemmas', 'postags', 'relations', 'sentence_ids')
+
+
+class Treebank(object):
+    """Words of a dependency treebank as parallel arrays."""
+
+    def __init__(self):
+        self.forms = Vocabulary()
+        self.lemmas = Vocabulary()
+        self.postags = Vocabulary()
+        self.relations = Vocabulary()
+        self.sentence_ids = Vocabulary()
+        self.form = numpy.zeros(0, dtype=numpy.int32)
+        self.lemma = numpy.zeros(0, dtype=numpy.int32)
+        self.postag = numpy.zeros(0, dtype=numpy.int32)
+        self.head = numpy.zeros(0, dtype=numpy.int32)
+        self.relation = numpy.zeros(0, dtype=numpy.int32)
+        self.sent_offsets = numpy.zeros(1, dtype=numpy.int64)
+
+    def __len__(self):
+        """Number of sentences."""
+        return len(self.sent_offsets) - 1
+
+    @property
+    def n_words(self):
+        return len(self.form)
+
+    ## Building ---------------------------------------------------------------
+
+    @classmethod
+    @instrument.timed('Treebank.from_xml')
+    def from_xml(cls, paths):
+        """Parse one or more treebank XML files."""
+        if isinstance(paths, str):
+            paths = [paths]
+        treebank = cls()
+        columns = {name: array('i') for name in COLUMNS}
+        offsets = array('q', [0])
+        for path in paths:
+            treebank._parse(path, columns, offsets)
+        for name in COLUMNS:
+            setattr(treebank, name,
+                    numpy.frombuffer(columns[name], dtype=numpy.int32).copy())
+        treebank.sent_offsets = numpy.frombuffer(offsets,
+                                                 dtype=numpy.int64).copy()
+        instrument.count('treebank_words', treebank.n_words)
+        return treebank
+
+    def _parse(self, path, columns, offsets):
+        form_add = self.forms.add
+        lemma_add = self.lemmas.add
+        postag_add = self.postags.add
+        relation_add = self.relations.add
+        form, lemma, postag = (columns['form'], columns['lemma'],
+                               columns['postag'])
+        head, relation = columns['head'], columns['relation']
+        root = None
+        for event, elem in ET.iterparse(path, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            tag = elem.tag
+            if tag == 'word':
+                form.append(form_add(elem.get('form', '')))
+                lemma.append(lemma_add(elem.get('lemma', '')))
+                postag.append(postag_add(elem.get('postag', '')))
+                try:
+                    head.append(int(elem.get('head', -1)))
+                except ValueError:
+                    head.append(-1)
+                relation.append(relation_add(elem.get('relation', '')))
+            elif tag == 'sentence':
+                self.sentence_ids.add('%s#%s' % (os.path.basename(path),
+                                                 elem.get('id', len(offsets))))
+                offsets.append(len(form))
+                elem.clear()
+                root.clear()
+
+    ## Access -----------------------------------------------------------------
+
+    def sentence(self, index):
+        """Return the ``(start, stop)`` word slice of sentence ``index``."""
+        return int(self.sent_offsets[index]), int(self.sent_offsets[index + 1])
+
+    def words(self, index):
+        """Return the forms of sentence ``index``."""
+        start, stop = self.sentence(index)
+        return self.forms.decode(self.form[start:stop].tolist())
+
+    def tagged_sents(self, start=0, stop=None):
+        """Return sentences as lists of ``(form, postag)`` pairs, as the
+        ``nltk`` taggers expect.
+        """
+        stop = len(self) if stop is None else stop
+        forms = self.forms.decode(self.form.tolist())
+        tags = self.postags.decode(self.postag.tolist())
+        pairs = list(zip(forms, tags))
+        offsets = self.sent_offsets.tolist()
+        return [pairs[offsets[index]:offsets[index + 1]]
+                for index in range(start, stop)]
+
+    ## Binary cache -----------------------------------------------------------
+
+    def save(self, path, stamp=''):
+        """Write the arrays and vocabularies to ``path`` (``.npz``)."""
+        arrays = {name: getattr(self, name) for name in COLUMNS}
+        arrays['sent_offsets'] = self.sent_offsets
+        for name in VOCABULARIES:
+            arrays['vocab_' + name] = getattr(self, name).to_array()
+        arrays['stamp'] = numpy.array(stamp)
+        arrays['version'] = numpy.array(CACHE_VERSION)
+        partial = os.path.join(os.path.dirname(path) or '.',
+                               '.part-' + os.path.basename(path))
+        with open(partial, 'wb') as file_open:
+            numpy.savez(file_open, **arrays)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a treebank written by ``save()``."""
+        treebank = cls()
+        with numpy.load(path) as data:
+            for name in COLUMNS:
+                setattr(treebank, name, data[name])
+            treebank.sent_offsets = data['sent_offsets']
+            for name in VOCABULARIES:
+                setattr(treebank, name,
+                        Vocabulary.from_array(data['vocab_' + name]))
+        return treebank
+
+
+def treebank_files(path):
+    """Return the XML files of a treebank file or directory."""
+    path = os.path.expanduser(path)
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        found.extend(os.path.join(root, name) for name in sorted(files)
+                     if name.endswith('.xml'))
+    return found
+
+
+def _stamp(paths):
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append([path, stat.st_size, stat.st_mtime_ns])
+    return json.dumps([CACHE_VERSION, stats])
+
+
+def cache_path(path):
+    """Where the binary cache of treebank ``path`` is kept."""
+    path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        return os.path.join(path, CACHE_NAME)
+    return os.path.join(os.path.dirname(path),
+                        '.' + os.path.basename(path) + '.npz')
+
+
+def load_treebank(path, cache=True):
+    """Load the treebank file or directory at ``path``, from its binary
+    cache if that is up to date with the XML files, else by parsing them
+    (and refreshing the cache).
+    """
+    paths = treebank_files(path)
+    if not paths:
+        raise IOError('No treebank XML files found at %s' % path)
+    stamp = _stamp(paths)
+    cached = cache_path(path)
+    if cache and os.path.isfile(cached):
+        try:
+            with numpy.load(cached) as data:
+                fresh = str(data['stamp']) == stamp
+        except (IOError, ValueError, KeyError):
+            fresh = False
+        if fresh:
+            return Treebank.load(cached)
+    treebank = Treebank.from_xml(paths)
+    if cache:
+        try:
+            treebank.save(cached, stamp)
+        except IOError:
+            logging.error('Failed to write treebank cache %s', cached)
+    return treebank
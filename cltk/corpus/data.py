@@ -3,8 +3,8 @@ __author__ = 'Stephen Margheim <stephen.margheim@gmail.com>'
 __license__ = 'MIT License. See LICENSE.'
 import os
 
-from cltk.cltk.corpus.common.catalogue import CORPORA
-from cltk.cltk.data import CLTKData, CorpusError
+from cltk.corpus.common.catalogue import CORPORA
+from cltk.data import CLTKData, CorpusError
 
 
 class CorpusData(object):
@@ -4,11 +4,16 @@ __license__ = 'MIT License. See LICENSE.'
 import os
 import tarfile
 import tempfile
-import requests
-from cltk.cltk.data import CorpusError
-from cltk.cltk.corpus.data import CorpusData
-from cltk.cltk.corpus.wrappers.tlgu import tlgu
-from cltk.cltk.corpus.wrappers.logger import logger
+from cltk.data import CorpusError
+from cltk.corpus.common.cache import corpus_cache, write_stream
+from cltk.corpus.common.local_import import import_file, import_tree, \
+    iter_files
+from cltk.corpus.common.checkpoint import CompileJournal, atomic_write, \
+    commit_file, partial_path
+from cltk.instrument import instrument
+from cltk.corpus.data import CorpusData
+from cltk.corpus.wrappers.tlgu import tlgu
+from cltk.corpus.wrappers.logger import logger
 
 
 class CorpusImporter(object):
@@ -18,30 +23,36 @@ class CorpusImporter(object):
 
     ## Main API call ----------------------------------------------------------
 
-    def retrieve(self, location=None):
+    @instrument.timed('CorpusImporter.retrieve')
+    def retrieve(self, location=None, refresh=False):
         """Retrieve corpus data and move into the corpus' `/originals`
         directory within the CLTK's `/cltk_data` directory. Corpus data
         can either be `remote` (online) or `local` (on disk).
 
         :param location: location of corpus data
         :type location: ``unicode``
+        :param refresh: retrieve again even if already present or cached
+        :type refresh: ``bool``
 
         """
         # Prepare local file
         tar_name = self.corpus.name + '.tar.gz'
         self.tar_file = os.path.join(self.corpus.originals_dir(),
                                      tar_name)
-        if os.path.exists(self.tar_file):
+        if os.path.exists(self.tar_file) and not refresh:
             msg = 'Tar file already exists at : {}'.format(self.tar_file)
         else:
             # Set location (default to corpus attribute)
             location = self._prepare_location(location)
-            if self.corpus.retrieval == 'local':
+            if self.corpus.retrieval == 'local' and os.path.isdir(location):
+                msg = 'Importing local directory : {}'.format(location)
+                self._import_local_dir(location)
+            elif self.corpus.retrieval == 'local':
                 msg = 'Retrieving local data from : {}'.format(location)
                 self._retrieve_local(location)
             elif self.corpus.retrieval == 'remote':
                 msg = 'Retrieving remote data from : {}'.format(location)
-                self._retrieve_remote(location)
+                self._retrieve_remote(location, refresh)
             else:
                 raise CorpusError('Corpus must be either `remote` or \
                                    `local`!')
@@ -64,30 +75,59 @@ class CorpusImporter(object):
         else:
             raise CorpusError('Local path does not exist!')
 
-    def _retrieve_remote(self, url):
+    def _retrieve_remote(self, url, refresh=False):
         """Download corpus data from `url` and move into
         `/originals` directory.
 
         :param url: URL of corpus data
         :type url: ``unicode``
+        :param refresh: download even if the cached copy is current
+        :type refresh: ``bool``
 
         """
         # Ensure reading raw data
         url = self._prepare_github_url(url)
-        # Open HTTP data stream to tar data
-        remote_data = requests.get(url, stream=True)
-        # Write tar data to file in originals dir
-        self._tar2tar(remote_data)
+        if corpus_cache.enabled:
+            # Link from the shared cache, downloading only on a miss or if
+            # the server has a newer tarball
+            corpus_cache.fetch(url, self.tar_file, refresh=refresh)
+            msg = 'Wrote tar file to : {}'.format(self.tar_file)
+            logger.info(msg)
+        else:
+            # Open HTTP data stream to tar data
+            import requests
+            remote_data = requests.get(url, stream=True)
+            # Write tar data to file in originals dir
+            self._tar2tar(remote_data)
+
+    def _import_local_dir(self, path):
+        """Link or copy a local directory tree into
+        `/originals/<name>/`, skipping unchanged files. `CorpusCompiler`
+        reads it from there without a tar round trip.
+
+        :param path: file path of corpus data
+        :type path: ``unicode``
+
+        """
+        dest = os.path.join(self.corpus.originals_dir(named=True),
+                            os.path.basename(os.path.normpath(path)))
+        summary = import_tree(path, dest)
+        msg = 'Imported {} to : {} ({})'.format(path, dest, summary)
+        logger.info(msg)
 
     #### Compress to `tar` methods --------------------------------------------
 
     def _tar2tar(self, tar):
-        """Write a tar file to disk, without unpacking."""
-        with open(self.tar_file, 'wb') as f:
-            for chunk in tar.iter_content(chunk_size=1024):
+        """Write a tar file to disk, without unpacking. The file is
+        renamed into place, since an old one may be a read-only hardlink
+        into the corpus cache.
+        """
+        def chunks():
+            for chunk in tar.iter_content(chunk_size=1024 * 1024):
                 if chunk:  # filter out keep-alive new chunks
-                    f.write(chunk)
-                    f.flush()
+                    instrument.count('bytes_downloaded', len(chunk))
+                    yield chunk
+        write_stream(chunks(), self.tar_file)
         msg = 'Wrote tar file to : {}'.format(self.tar_file)
         logger.info(msg)
 
@@ -123,6 +163,7 @@ class CorpusCompiler(object):
 
     ## Main API call ----------------------------------------------------------
 
+    @instrument.timed('CorpusCompiler.compile')
     def compile(self):
         """Unpack original tarfile into directory tree
         with fully structured files.
@@ -131,24 +172,28 @@ class CorpusCompiler(object):
         dir_path = self.corpus.structured_dir(named=True)
         check = self._path_exists(dir_path)
         if not check:
+            CompileJournal(dir_path).begin()
             if self.corpus.encoding == 'latin-1':
                 self._compile_binary()
             elif self.corpus.encoding == 'utf-8':
                 self._compile_unicode()
+                if self.corpus.markup == 'tei_xml':
+                    self._compile_plain()
             else:
                 raise CorpusError()
+            CompileJournal(dir_path).finish()
         else:
             msg = 'Structured dir already exists at : {}'.format(dir_path)
             logger.info(msg)
         return True
 
     def _path_exists(self, path):
+        """True only if a compile of ``path`` ran to completion; a
+        partially filled directory is resumed instead. A directory built
+        before compiles were journaled counts as complete.
+        """
         if os.path.exists(path):
-            if os.listdir(path):
-                print(path)
-                return True
-            else:
-                return False
+            return CompileJournal(path).adopt_legacy()
         else:
             return False
 
@@ -158,24 +203,38 @@ class CorpusCompiler(object):
         msg = 'Starting `{}` corpus compilation'.format(self.corpus.name)
         logger.info(msg)
 
-        # Define function to process files within tar
-        def process(tar, file):
+        journal = CompileJournal(self.corpus.structured_dir(True))
+        journal.begin()
+
+        # Define function to process files within tar or directory
+        def process(name, read, path=None):
+            if name in journal:
+                return
             # Ignore non-text files
-            if ((not file.name.endswith('.IDT') or file.name.endswith('.BIN'))
-               and file.isfile()):
-                orig_content = tar.extractfile(file).read()
-                struct_file = os.path.basename(file.name).lower()
+            if not name.endswith('.IDT') or name.endswith('.BIN'):
+                struct_file = os.path.basename(name).lower()
                 struct_path = os.path.join(self.corpus.structured_dir(True),
                                            struct_file)
-                with tempfile.NamedTemporaryFile(suffix='.txt') as temp:
-                    temp.write(orig_content)
+                partial = partial_path(struct_path)
+                convert = dict(markup='full', break_lines=True,
+                               divide_works=False, output_path=partial)
+                if path is not None:
                     # Use `tlgu` utility to compile to Unicode text
-                    tlgu.convert(temp.name,
-                                 markup='full',
-                                 break_lines=True,
-                                 divide_works=False,
-                                 output_path=struct_path)
-                msg = 'Compiled {} to : {}'.format(file.name, struct_path)
+                    instrument.count('files_read')
+                    instrument.count('bytes_read', os.path.getsize(path))
+                    tlgu.convert(path, **convert)
+                else:
+                    orig_content = read()
+                    instrument.count('files_read')
+                    instrument.count('bytes_read', len(orig_content))
+                    with tempfile.NamedTemporaryFile(suffix='.txt') as temp:
+                        temp.write(orig_content)
+                        temp.flush()
+                        tlgu.convert(temp.name, **convert)
+                if os.path.exists(partial):
+                    commit_file(partial, struct_path)
+                    journal.mark(name)
+                msg = 'Compiled {} to : {}'.format(name, struct_path)
                 logger.info(msg)
         return self.unpack_tar(process)
 
@@ -183,43 +242,76 @@ class CorpusCompiler(object):
         msg = 'Starting `{}` corpus compilation'.format(self.corpus.name)
         logger.info(msg)
 
-        # Define function to process files within tar
-        def process(tar, file):
-            if file.isfile():
-                # TODO: Do we want to ensure no double nested dirs are generated?
-                # i.e. when unpacking `greek_corpus_perseus`, the dir is:
-                # `/cltk_data/greek/text_corpora/structured/perseus/greek_corpus_perseus/...`
-                # However, with the treebanks, this is actually helpful. 
-                # Do we simply check to see if the tarfile is *merely* a directory,
-                # and if so, turn `named` off?
-                struct_path = self.corpus.structured_dir(named=True)
-                tar.extractall(struct_path)
-                msg = 'Compiled {} to : {}'.format(file.name, struct_path)
-                logger.info(msg)
+        # Define function to process files within tar or directory
+        def process(name, read, path=None):
+            # TODO: Do we want to ensure no double nested dirs are generated?
+            # i.e. when unpacking `greek_corpus_perseus`, the dir is:
+            # `/cltk_data/greek/text_corpora/structured/perseus/greek_corpus_perseus/...`
+            # However, with the treebanks, this is actually helpful. 
+            # Do we simply check to see if the tarfile is *merely* a directory,
+            # and if so, turn `named` off?
+            struct_path = self.corpus.structured_dir(named=True)
+            file_path = os.path.join(struct_path, name)
+            if path is not None:
+                import_file(path, file_path)
+            else:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                atomic_write(file_path, read())
+            msg = 'Compiled {} to : {}'.format(name, struct_path)
+            logger.info(msg)
         return self.unpack_tar(process)
 
+    def _compile_plain(self):
+        """Extract text and citations from structured TEI XML files into
+        the corpus' `/plain` directory.
+
+        """
+        from cltk.corpus.common.tei import extract_corpus
+        src_dir = self.corpus.structured_dir(named=True)
+        out_dir = self.corpus.plain_dir(named=True)
+        results = extract_corpus(src_dir, out_dir)
+        failed = [path for path, count in results.items() if count is None]
+        msg = 'Extracted {} TEI files to : {} ({} failed)'.format(
+            len(results), out_dir, len(failed))
+        logger.info(msg)
+        return results
+
     #### Tar Unpacker ---------------------------------------------------------
 
     def unpack_tar(self, process):
-        """Unpack original tarfile using `process` function.
+        """Unpack original tarfile using `process` function, which is
+        called with each regular file's name and a function returning its
+        bytes. Corpora imported as a directory are read in place, and
+        `process` also gets the file's path.
 
         """
         tar_file = os.path.join(self.corpus.originals_dir(),
                                 self.corpus.name + '.tar.gz')
+        source_dir = self.corpus.originals_dir(named=True)
+        if not os.path.exists(tar_file) and os.path.isdir(source_dir):
+            for name in iter_files(source_dir):
+                path = os.path.join(source_dir, name)
+                with instrument.timer('CorpusCompiler.file'):
+                    process(name, None, path)
+            return True
         # Iterate over original files
         with tarfile.open(tar_file, "r") as tar:
             for file in tar.getmembers():
-                process(tar, file)
+                if not file.isfile():
+                    continue
+                with instrument.timer('CorpusCompiler.file'):
+                    process(file.name,
+                            lambda member=file: tar.extractfile(member).read())
         return True
 
 
-def retrieve(arg, location=None):
+def retrieve(arg, location=None, refresh=False):
     """Wrapper function to utilize `CorpusImporter` class
 
     """
     corpus = CorpusData(arg)
     importer = CorpusImporter(corpus)
-    return importer.retrieve(location=location)
+    return importer.retrieve(location=location, refresh=refresh)
 
 
 def compile(arg):
@@ -5,7 +5,9 @@ TODO for replacer.py:
 __author__ = ['Patrick J. Burns <patrick@diyclassics.org>', 'Kyle P. Johnson <kyle@kyle-p-johnson.com>']
 __license__ = 'MIT License. See LICENSE.'
 
+import pickle
 import re
+import threading
 
 UPPER = [
     # Perseus-style head words
@@ -359,32 +361,110 @@ PUNCT = [
 ]
 
 
+_TABLES = {}
+_TABLES_LOCK = threading.Lock()
+
+
+_METACHARS = set('.^$*+?{}[]|()')
+
+
+def _literal(regex):
+    """Return the fixed string ``regex`` matches, or None if it is not a
+    plain (possibly backslash-escaped) literal.
+    """
+    chars = iter(regex)
+    literal = []
+    for char in chars:
+        if char == '\\':
+            char = next(chars, None)
+            if char is None or char.isalnum():
+                return None
+        elif char in _METACHARS:
+            return None
+        literal.append(char)
+    return ''.join(literal) or None
+
+
+def _compile_steps(patterns):
+    """Turn (regex, replacement) pairs into substitution steps. Patterns
+    that match a fixed string become ``str.replace`` steps with their
+    replacement template already expanded; anything else stays a regex.
+    """
+    steps = []
+    for regex, repl in patterns:
+        compiled = re.compile(regex)
+        literal = _literal(regex)
+        if literal is not None:
+            steps.append((literal, compiled.sub(repl, literal), True))
+        else:
+            steps.append((compiled, repl, False))
+    return tuple(steps)
+
+
+def conversion_table(pattern1=None, pattern2=None, pattern3=None):
+    """Return the immutable conversion table for the given pattern lists
+    (UPPER, LOWER and PUNCT by default). Each table is built once per
+    process and shared by every ``Replacer``; forked workers inherit it.
+    """
+    if pattern1 is None and pattern2 is None and pattern3 is None:
+        key = 'default'
+    else:
+        key = tuple(tuple(patterns) for patterns in (
+            UPPER if pattern1 is None else pattern1,
+            LOWER if pattern2 is None else pattern2,
+            PUNCT if pattern3 is None else pattern3))
+    table = _TABLES.get(key)
+    if table is None:
+        with _TABLES_LOCK:
+            table = _TABLES.get(key)
+            if table is None:
+                sources = (UPPER, LOWER, PUNCT) if key == 'default' else key
+                table = tuple(_compile_steps(patterns) for patterns in sources)
+                _TABLES[key] = table
+    return table
+
+
+def save_table(path, table=None):
+    """Pickle a conversion table (the default one if not given) to disk."""
+    if table is None:
+        table = conversion_table()
+    with open(path, 'wb') as file_open:
+        pickle.dump(table, file_open, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_table(path):
+    """Load a table written by ``save_table()`` and install it as the
+    default, so a fresh (e.g. spawned) worker skips building it.
+    """
+    with open(path, 'rb') as file_open:
+        table = pickle.load(file_open)
+    with _TABLES_LOCK:
+        _TABLES['default'] = table
+    return table
+
+
+def _apply(step, text):
+    pattern, repl, literal = step
+    if literal:
+        return text.replace(pattern, repl)
+    return pattern.sub(repl, text)
+
+
 class Replacer(object):  # pylint: disable=R0903
     """Beta match and replace; PUNCT broken?"""
     def __init__(self, pattern1=None, pattern2=None, pattern3=None):
-        if pattern1 is None:
-            pattern1 = UPPER
-        if pattern2 is None:
-            pattern2 = LOWER
-        if pattern3 is None:
-            pattern3 = PUNCT
-        self.pattern1 = \
-            [(re.compile(regex), repl) for (regex, repl) in pattern1]
-        self.pattern2 = \
-            [(re.compile(regex), repl) for (regex, repl) in pattern2]
-        self.pattern3 = \
-            [(re.compile(regex), repl) for (regex, repl) in pattern3]
+        self.pattern1, self.pattern2, self.pattern3 = \
+            conversion_table(pattern1, pattern2, pattern3)
 
     def beta_code(self, text):
         """Replace method, returns a tuple (new_string, number_of_subs_made)"""
         no_hyph = text.replace('-', '')
         beta_string = no_hyph
-        for (pattern, repl) in self.pattern1:
-            (beta_string, count) = \
-                re.subn(pattern, repl, beta_string)  # pylint: disable=W0612
-        for (pattern, repl) in self.pattern2:
-            (beta_string, count) = re.subn(pattern, repl, beta_string)
-        # remove third run, if punct list not used
-        for (pattern, repl) in self.pattern3:
-            (unicode_string, count) = re.subn(pattern, repl, beta_string)
+        for step in self.pattern1:
+            beta_string = _apply(step, beta_string)
+        for step in self.pattern2:
+            beta_string = _apply(step, beta_string)
+        # remove third run, if punct list not used; each PUNCT step starts
+        # again from `beta_string`, so only the last one takes effect
+        unicode_string = _apply(self.pattern3[-1], beta_string)
         return unicode_string
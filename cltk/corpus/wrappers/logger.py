@@ -1,19 +1,254 @@
 # encoding: utf-8
-"""The base-level `cltk` class"""
+"""The base-level `cltk` class
+
+Log records are handed to a ``QueueHandler`` and written to disk by a
+``QueueListener`` thread, so hot loops never block on file I/O. Worker
+processes can log through the same queue by passing ``queue_initializer``
+and ``(queue,)`` to a ``multiprocessing.Pool``. The queue and thread of
+the module's ``logger`` are only created when it first logs a record, its
+queue is asked for, or the process forks, so importing ``cltk`` starts no
+threads. Forked children log through the inherited queue and never write
+the log file themselves, so only one process rotates it.
+
+The following environment variables configure logging:
+
+- ``CLTK_LOG_LEVEL``: level name or number (default ``INFO``)
+- ``CLTK_LOG_FORMAT``: ``text`` (default) or ``json``
+- ``CLTK_LOG_MAX_BYTES``: size at which log files rotate (default 10 MB)
+- ``CLTK_LOG_BACKUP_COUNT``: rotated files to keep (default 5)
+"""
 __author__ = 'Stephen Margheim <stephen.margheim@gmail.com>'
 __license__ = 'MIT License. See LICENSE.'
 
+import atexit
+import json
 import os
 import logging
 import logging.handlers
-from cltk.cltk import CLTK_DATA_DIR
+import multiprocessing
+import threading
+import warnings
+import weakref
+from cltk import CLTK_DATA_DIR
+
+TEXT_FORMAT = '%(asctime)s %(filename)s:%(lineno)s %(levelname)-8s %(message)s'
+
+# Attributes every LogRecord has; anything else came in via ``extra=``
+_RECORD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | \
+    {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Format each record as one JSON object per line. Values passed with
+    ``extra={...}`` are included as top-level keys.
+    """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record, self.datefmt),
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'message': record.getMessage(),
+                 'module': record.module,
+                 'line': record.lineno,
+                 'process': record.process}
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def log_level():
+    """Return the level set by ``CLTK_LOG_LEVEL``."""
+    name = os.environ.get('CLTK_LOG_LEVEL', 'INFO').upper()
+    if name.isdigit():
+        return int(name)
+    level = logging.getLevelName(name)
+    if not isinstance(level, int):
+        warnings.warn('Unknown CLTK_LOG_LEVEL %r; using INFO' % name)
+        return logging.INFO
+    return level
+
+
+def make_formatter(fmt=TEXT_FORMAT, datefmt='%H:%M:%S'):
+    """Return a JSON or text formatter as set by ``CLTK_LOG_FORMAT``."""
+    if os.environ.get('CLTK_LOG_FORMAT', 'text').lower() == 'json':
+        return JSONFormatter(datefmt=datefmt)
+    return logging.Formatter(fmt, datefmt=datefmt)
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Opens the log file, and creates its directory, on first write."""
+
+    def __init__(self, filename, **kwargs):
+        kwargs['delay'] = True
+        super().__init__(filename, **kwargs)
+
+    def _open(self):
+        log_dir = os.path.dirname(self.baseFilename)
+        if not os.path.isdir(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        return super()._open()
+
+
+def file_handler(path, max_bytes=None, backup_count=None):
+    """Return a rotating file handler configured from the environment."""
+    if max_bytes is None:
+        max_bytes = int(os.environ.get('CLTK_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    if backup_count is None:
+        backup_count = int(os.environ.get('CLTK_LOG_BACKUP_COUNT', 5))
+    return RotatingFileHandler(path, maxBytes=max_bytes,
+                               backupCount=backup_count)
+
+
+def start_queue_logging(target, handlers, level=None):
+    """Attach a ``QueueHandler`` to logger ``target`` and start a
+    ``QueueListener`` feeding ``handlers``. Returns ``(queue, listener)``.
+    """
+    queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(queue, *handlers,
+                                              respect_handler_level=True)
+    target.addHandler(logging.handlers.QueueHandler(queue))
+    target.setLevel(log_level() if level is None else level)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return queue, listener
+
+
+# Lazy handlers, started before a fork so children inherit their queue
+_LAZY_HANDLERS = weakref.WeakSet()
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """A ``QueueHandler`` whose queue and ``QueueListener`` feeding
+    ``handlers`` are created when the first record is logged, or before
+    the process forks. A copy inherited by a forked child puts its
+    records on the parent's queue and never starts a listener.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(None)
+        self.handlers = handlers
+        self.listener = None
+        self.pid = os.getpid()
+        self._start_lock = threading.Lock()
+        _LAZY_HANDLERS.add(self)
+
+    def start(self):
+        """Create the queue and start the listener, once, in the process
+        that built the handler; returns the queue.
+        """
+        if os.getpid() != self.pid:
+            return self.queue
+        with self._start_lock:
+            if self.queue is None:
+                queue = multiprocessing.Queue(-1)
+                self.listener = logging.handlers.QueueListener(
+                    queue, *self.handlers, respect_handler_level=True)
+                self.listener.start()
+                atexit.register(self.stop)
+                self.queue = queue
+        return self.queue
+
+    def stop(self):
+        """Flush and stop the listener, if this process started it."""
+        if self.listener is not None and os.getpid() == self.pid:
+            stop_listener(self.listener)
+
+    def enqueue(self, record):
+        if self.queue is None and self.start() is None:
+            # Inherited by a child forked before the queue existed (the
+            # fork hook is missing): write to the console handlers only
+            for handler in self.handlers:
+                if not isinstance(handler, logging.FileHandler) and \
+                        record.levelno >= handler.level:
+                    handler.handle(record)
+            return
+        self.queue.put_nowait(record)
+
+
+def _start_before_fork():
+    """Start this process's lazy handlers, so forked children log
+    through their queues instead of opening the log files themselves.
+    """
+    for handler in list(_LAZY_HANDLERS):
+        if handler.pid == os.getpid():
+            handler.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_start_before_fork)
+
+
+def stop_listener(listener):
+    """Flush and stop a ``QueueListener``; safe to call more than once."""
+    if listener._thread is not None:  # pylint: disable=W0212
+        listener.stop()
+
+
+def queue_initializer(queue, level=None):
+    """``multiprocessing.Pool`` initializer: send this worker's `cltk` and
+    root log records to the parent's listener through ``queue``.
+    """
+    for name in (None, 'cltk'):
+        target = logging.getLogger(name)
+        for handler in list(target.handlers):
+            target.removeHandler(handler)
+        target.addHandler(logging.handlers.QueueHandler(queue))
+        target.setLevel(log_level() if level is None else level)
+    logging.getLogger('cltk').propagate = False
+
+
+_ROOT_QUEUE = {}
+
+
+def configure_root_logging(path, fmt='%(asctime)s %(message)s',
+                           datefmt='%m/%d/%Y %I:%M:%S %p'):
+    """Queue-backed replacement for ``logging.basicConfig(filename=path)``.
+    Like ``basicConfig`` it does nothing if the root logger already has
+    handlers. Returns the queue, for use with ``queue_initializer``.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return _ROOT_QUEUE.get('queue')
+    handler = file_handler(path)
+    handler.setFormatter(make_formatter(fmt, datefmt))
+    queue, listener = start_queue_logging(root, [handler])
+    _ROOT_QUEUE['queue'] = queue
+    _ROOT_QUEUE['listener'] = listener
+    return queue
 
 
 class Logger(object):
-    def __init__(self):
-        self.logfile = os.path.expanduser(os.path.join(CLTK_DATA_DIR, 'cltk.log'))
+    def __init__(self, logfile=None, max_bytes=None, backup_count=None):
+        if logfile is None:
+            logfile = os.path.join(CLTK_DATA_DIR, 'cltk.log')
+        self.logfile = os.path.expanduser(logfile)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._handler = None
         self._logger = None
 
+    @property
+    def queue(self):
+        """The queue pool workers log through (see ``queue_initializer``),
+        starting the listener if needed; ``None`` in a worker.
+        """
+        self.logger  # pylint: disable=W0104
+        if self._handler is None:
+            return None
+        return self._handler.start()
+
+    @property
+    def listener(self):
+        """The ``QueueListener`` thread, or ``None`` before the first
+        record.
+        """
+        if self._handler is None:
+            return None
+        return self._handler.listener
+
     @property
     def logger(self):
         """Create and return a logger that logs to both console and
@@ -31,25 +266,25 @@ class Logger(object):
         logger = logging.getLogger('cltk')
 
         if not logger.handlers:  # Only add one set of handlers
-            logfile = logging.handlers.RotatingFileHandler(
-                self.logfile,
-                maxBytes=1024 * 1024,
-                backupCount=0)
-
-            console = logging.StreamHandler()
-
-            fmt = logging.Formatter(
-                '%(asctime)s %(filename)s:%(lineno)s'
-                ' %(levelname)-8s %(message)s',
-                datefmt='%H:%M:%S')
-
-            logfile.setFormatter(fmt)
-            console.setFormatter(fmt)
-
-            logger.addHandler(logfile)
-            logger.addHandler(console)
+            if multiprocessing.parent_process() is not None:
+                # Workers log to the console unless `queue_initializer`
+                # routes them to the parent's listener
+                console = logging.StreamHandler()
+                console.setFormatter(make_formatter())
+                logger.addHandler(console)
+                logger.setLevel(log_level())
+            else:
+                logfile = file_handler(self.logfile, self.max_bytes,
+                                       self.backup_count)
+                console = logging.StreamHandler()
+                fmt = make_formatter()
+                logfile.setFormatter(fmt)
+                console.setFormatter(fmt)
+                # The listener thread starts with the first record
+                self._handler = LazyQueueHandler([logfile, console])
+                logger.addHandler(self._handler)
+                logger.setLevel(log_level())
 
-        logger.setLevel(logging.DEBUG)
         self._logger = logger
 
         return self._logger
@@ -4,11 +4,11 @@ __author__ = 'Stephen Margheim <stephen.margheim@gmail.com>'
 __license__ = 'MIT License. See LICENSE.'
 
 import os.path
-import requests
 import itertools
 import subprocess
 
-from cltk.cltk.data import cltk_data
+from cltk.data import cltk_data
+from cltk.instrument import instrument
 
 ARGS = {
     'book_breaks': '-b',
@@ -67,6 +67,7 @@ class TLGU(object):
         else:
             return 'Cannot compile `tlgu` without `gcc`!'
 
+    @instrument.timed('TLGU.convert')
     def convert(self, input_path, markup='plain',
                 break_lines=False, divide_works=False,
                 output_path=None, opts=[]):
@@ -126,6 +127,7 @@ class TLGU(object):
     def download(self):
         path = cltk_data.resolve_path(os.path.join(cltk_data.downloads_dir,
                                                    'tlgu.zip'))
+        import requests
         r = requests.get(self.url)
         with open(path, "wb") as code:
             code.write(r.content)
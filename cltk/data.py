@@ -4,8 +4,8 @@ __license__ = 'MIT License. See LICENSE.'
 
 import os
 import site
-from cltk.cltk import CLTK_DATA_DIR
-from cltk.cltk.corpus.wrappers.logger import logger
+from cltk import CLTK_DATA_DIR
+from cltk.corpus.wrappers.logger import logger
 
 
 class CorpusError(Exception):
@@ -0,0 +1,178 @@
+"""Lightweight timers, counters and histograms for corpus compilation and
+NLP calls.
+
+Instrumentation is off by default and costs one attribute check per
+instrumented call. Turn it on with the ``CLTK_INSTRUMENT=1`` environment
+variable or ``instrument.enabled = True``, then export with
+``instrument.to_json()`` or ``instrument.to_prometheus()``. Setting
+``CLTK_PROFILE_STAGE`` (or calling ``instrument.profile()``) additionally
+runs one named stage under ``cProfile``.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from contextlib import contextmanager
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+# Upper bounds, in seconds, of the per-stage histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0,
+           float('inf'))
+
+
+class Instrument(object):
+    """Collects per-stage timings and named counters."""
+
+    def __init__(self, enabled=None, profile_stage=None):
+        if enabled is None:
+            enabled = os.environ.get('CLTK_INSTRUMENT', '0') not in ('', '0')
+        if profile_stage is None:
+            profile_stage = os.environ.get('CLTK_PROFILE_STAGE') or None
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.stages = {}
+        self.profile_stage = None
+        self._profiler = None
+        if profile_stage:
+            self.profile(profile_stage)
+
+    ## Recording --------------------------------------------------------------
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as one observation of ``stage``."""
+        if not self.enabled:
+            yield
+            return
+        profiler = self._profiler if stage == self.profile_stage else None
+        if profiler:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+            self.observe(stage, elapsed)
+
+    def timed(self, stage):
+        """Decorator form of ``timer()``."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, stage, seconds):
+        """Record a duration for ``stage``."""
+        with self._lock:
+            node = self.stages.get(stage)
+            if node is None:
+                node = {'count': 0, 'sum': 0.0, 'max': 0.0,
+                        'buckets': [0] * len(BUCKETS)}
+                self.stages[stage] = node
+            node['count'] += 1
+            node['sum'] += seconds
+            node['max'] = max(node['max'], seconds)
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    node['buckets'][index] += 1
+                    break
+
+    def count(self, name, value=1):
+        """Add ``value`` to counter ``name`` (e.g. ``bytes_read``)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    ## Profiling --------------------------------------------------------------
+
+    def profile(self, stage):
+        """Run every later observation of ``stage`` under ``cProfile``."""
+        import cProfile
+        self.profile_stage = stage
+        self._profiler = cProfile.Profile()
+
+    def profile_stats(self, path=None):
+        """Return ``pstats.Stats`` for the profiled stage; optionally dump
+        them to ``path`` for ``snakeviz``/``pstats`` browsing.
+        """
+        import pstats
+        if self._profiler is None:
+            return None
+        if path:
+            self._profiler.dump_stats(path)
+        return pstats.Stats(self._profiler)
+
+    ## Export -----------------------------------------------------------------
+
+    def reset(self):
+        """Drop everything recorded so far."""
+        with self._lock:
+            self.counters = {}
+            self.stages = {}
+        if self.profile_stage:
+            self.profile(self.profile_stage)
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of all metrics."""
+        with self._lock:
+            stages = {}
+            for stage, node in self.stages.items():
+                stages[stage] = {
+                    'count': node['count'],
+                    'sum': node['sum'],
+                    'max': node['max'],
+                    'buckets': [[_bound_label(bound), number] for
+                                bound, number in zip(BUCKETS, node['buckets'])]}
+            return {'counters': dict(self.counters), 'stages': stages}
+
+    def to_json(self, indent=None):
+        """Serialize ``snapshot()`` as JSON."""
+        return json.dumps(self.snapshot(), indent=indent, sort_keys=True)
+
+    def to_prometheus(self, prefix='cltk'):
+        """Render metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+        for name, value in sorted(snap['counters'].items()):
+            metric = '%s_%s_total' % (prefix, _metric_name(name))
+            lines.append('# TYPE %s counter' % metric)
+            lines.append('%s %s' % (metric, value))
+        metric = '%s_stage_seconds' % prefix
+        if snap['stages']:
+            lines.append('# TYPE %s histogram' % metric)
+        for stage, node in sorted(snap['stages'].items()):
+            cumulative = 0
+            for bound, number in node['buckets']:
+                cumulative += number
+                lines.append('%s_bucket{stage="%s",le="%s"} %d' % (
+                    metric, stage, bound, cumulative))
+            lines.append('%s_sum{stage="%s"} %r' % (metric, stage, node['sum']))
+            lines.append('%s_count{stage="%s"} %d' % (metric, stage,
+                                                       node['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def _bound_label(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+# Process-wide instance used by the decorators
+instrument = Instrument()
@@ -4,14 +4,16 @@ __author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
 __license__ = 'MIT License. See LICENSE.'
 
 import re
-from cltk.stem.latin.lemmata_list import REPLACEMENT_PATTERNS
 
 
 class LemmaReplacer(object):
     """Lemmatizing class"""
 
-    def __init__(self, patterns=REPLACEMENT_PATTERNS):
+    def __init__(self, patterns=None):
         """Initializer for lemmatizer, imports replacement dict."""
+        if patterns is None:
+            from cltk.stem.latin.lemmata_list import REPLACEMENT_PATTERNS
+            patterns = REPLACEMENT_PATTERNS
         self.patterns = \
             [(re.compile(regex), repl) for (regex, repl) in patterns]
 
@@ -10,6 +10,18 @@ __license__ = 'MIT License. See LICENSE.'
 import re
 from cltk.stop.latin.stops import STOPS_LIST
 
+# Words ending in -que that are not word + enclitic
+QUE_PASS_LIST = frozenset([
+    'atque', 'quoque', 'neque', 'itaque', 'absque', 'apsque', 'abusque',
+    'adaeque', 'adusque', 'denique', 'deque', 'susque', 'oblique', 'peraeque',
+    'plenisque', 'quandoque', 'quisque', 'quaeque', 'cuiusque', 'cuique',
+    'quemque', 'quamque', 'quaque', 'quique', 'quorumque', 'quarumque',
+    'quibusque', 'quosque', 'quasque', 'quotusquisque', 'quousque', 'ubique',
+    'undique', 'usque', 'uterque', 'utique', 'utroque', 'utribique', 'torque',
+    'coque', 'concoque', 'contorque', 'detorque', 'decoque', 'excoque',
+    'extorque', 'obtorque', 'optorque', 'retorque', 'recoque', 'attorque',
+    'incoque', 'intorque', 'praetorque'])
+
 
 class Stemmer(object):
     """Stem Latin words via Schnike Latin stemming algorithm"""
@@ -23,89 +35,33 @@ class Stemmer(object):
     def stem(self, text):
         """Stem each word of the Latin text."""
 
-        stemmed_text = ''
-
-        for word in text.split(' '):
-            if word not in self.stops:
+        stem_word = self.stem_word
+        return ''.join([stem_word(word) + ' ' for word in text.split(' ')])
 
-                # remove '-que' suffix
-                word, in_que_pass_list = self._checkremove_que(word)
-                if not in_que_pass_list:
+    def stem_word(self, word):
+        """Stem one Latin word; stopwords are returned unchanged."""
 
-                    # remove the simple endings from the target word
-                    word, was_stemmed = self._matchremove_simple_endings(word)
+        if word not in self.stops:
 
-                    # if word didn't match the simple endings, try verb endings
-                    if not was_stemmed:
-                        word = self._matchremove_verb_endings(word)
+            # remove '-que' suffix
+            word, in_que_pass_list = self._checkremove_que(word)
+            if not in_que_pass_list:
 
-            # add the stemmed word to the text
-            stemmed_text += word + ' '
+                # remove the simple endings from the target word
+                word, was_stemmed = self._matchremove_simple_endings(word)
 
+                # if word didn't match the simple endings, try verb endings
+                if not was_stemmed:
+                    word = self._matchremove_verb_endings(word)
 
-        return stemmed_text
+        return word
 
     def _checkremove_que(self, word):
         """If word ends in -que and if word is not in pass list, strip -que"""
 
         in_que_pass_list = False
 
-        que_pass_list = ['atque',
-                        'quoque',
-                        'neque',
-                        'itaque',
-                        'absque',
-                        'apsque',
-                        'abusque',
-                        'adaeque',
-                        'adusque',
-                        'denique',
-                        'deque',
-                        'susque',
-                        'oblique',
-                        'peraeque',
-                        'plenisque',
-                        'quandoque',
-                        'quisque',
-                        'quaeque',
-                        'cuiusque',
-                        'cuique',
-                        'quemque',
-                        'quamque',
-                        'quaque',
-                        'quique',
-                        'quorumque',
-                        'quarumque',
-                        'quibusque',
-                        'quosque',
-                        'quasque',
-                        'quotusquisque',
-                        'quousque',
-                        'ubique',
-                        'undique',
-                        'usque',
-                        'uterque',
-                        'utique',
-                        'utroque',
-                        'utribique',
-                        'torque',
-                        'coque',
-                        'concoque',
-                        'contorque',
-                        'detorque',
-                        'decoque',
-                        'excoque',
-                        'extorque',
-                        'obtorque',
-                        'optorque',
-                        'retorque',
-                        'recoque',
-                        'attorque',
-                        'incoque',
-                        'intorque',
-                        'praetorque']
-
-        if word not in que_pass_list:
+        if word not in QUE_PASS_LIST:
             word = re.sub(r'que$', '', word)
         else:
             in_que_pass_list = True
@@ -0,0 +1,331 @@
+"""Flattened lookup tables for NLTK's n-gram backoff taggers.
+
+An ``nltk`` backoff chain such as ``TrigramTagger -> BigramTagger ->
+UnigramTagger`` asks each tagger object in turn, through several method
+calls, for every token. ``CompiledTagger.from_nltk()`` merges the
+chain's tables into a single dict keyed by word, whose values hold that
+word's entry in each table of the chain: a tag for unigram tables, a
+``{previous tags: tag}`` dict for n-gram ones. Tagging is then one tight
+loop per sentence with at most one lookup per level, and gives exactly
+the tags of the NLTK chain::
+
+    >>> tagger = CompiledTagger.from_nltk(nltk_tagger)
+    >>> tagger.tag_sents([['arma', 'virumque', 'cano']])
+    [[('arma', 'n-p---na-'), ('virumque', 'n-s---ma-'), ...]]
+
+``save()`` writes the tables in the pickle-free format of
+``cltk.tag.pos.model_file``, and ``MappedTagger.load()`` tags straight
+from its memory-mapped arrays, so worker processes share one copy of
+the tables through the page cache instead of each building the dict.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from bisect import bisect_left
+import pickle
+
+import numpy
+
+from cltk.instrument import instrument
+from cltk.tag.pos.model_file import (StringTable, load_model, model_path,
+                                     save_model, source_stamp)
+from cltk.vocab import Vocabulary
+
+
+class CompiledTagger(object):
+    """An n-gram backoff chain as one table of words."""
+
+    def __init__(self, orders=(), lexicon=None, default=None):
+        # Context length + 1 of each table, in backoff order
+        self.orders = tuple(orders)
+        # word -> tuple with one entry per table, None where the word
+        # is not in it
+        self.lexicon = lexicon or {}
+        # Tag of a trailing DefaultTagger
+        self.default = default
+
+    @classmethod
+    @instrument.timed('CompiledTagger.from_nltk')
+    def from_nltk(cls, tagger):
+        """Compile a trained ``nltk`` Unigram/Bigram/Trigram/NgramTagger
+        with its backoff chain.
+        """
+        from nltk.tag import DefaultTagger, NgramTagger, UnigramTagger
+        orders, tables, default = [], [], None
+        for link in tagger._taggers:
+            if isinstance(link, DefaultTagger):
+                default = link._tag
+                break
+            elif isinstance(link, UnigramTagger):
+                orders.append(1)
+            elif isinstance(link, NgramTagger):
+                orders.append(link._n)
+            else:
+                raise ValueError('Cannot compile a %s' % type(link).__name__)
+            tables.append(link._context_to_tag)
+        rows = ((level, context if order == 1 else context[1],
+                 None if order == 1 else context[0], tag)
+                for level, (order, table) in enumerate(zip(orders, tables))
+                for context, tag in table.items())
+        return cls(orders, _build_lexicon(len(orders), rows), default)
+
+    ## Tagging ----------------------------------------------------------------
+
+    def tag(self, tokens):
+        """Tag one sentence; returns ``(word, tag)`` pairs."""
+        tokens = list(tokens)
+        return list(zip(tokens, self._tags(tokens)))
+
+    @instrument.timed('CompiledTagger.tag_sents')
+    def tag_sents(self, sentences):
+        """Tag a list of tokenized sentences."""
+        tagged = []
+        for tokens in sentences:
+            tokens = list(tokens)
+            tagged.append(list(zip(tokens, self._tags(tokens))))
+        return tagged
+
+    def _tags(self, tokens):
+        lexicon_get = self.lexicon.get
+        levels = tuple(enumerate(self.orders))
+        default = self.default
+        tags = []
+        append = tags.append
+        for index, word in enumerate(tokens):
+            tag = None
+            entry = lexicon_get(word)
+            if entry is not None:
+                for level, order in levels:
+                    table = entry[level]
+                    if table is None:
+                        continue
+                    if order == 1:
+                        tag = table
+                    else:
+                        start = index - order + 1
+                        tag = table.get(tuple(tags[start if start > 0 else 0:
+                                                   index]))
+                    if tag is not None:
+                        break
+            append(default if tag is None else tag)
+        return tags
+
+    ## Storage ----------------------------------------------------------------
+
+    def save(self, path, source=None):
+        """Write the tables as a pickle-free model directory. Each level
+        is an int32 matrix whose rows are a word id, the previous tag ids
+        (-1 padded on the left, for contexts at the start of a sentence)
+        and the tag id. ``source`` is passed to ``save_model()``.
+        """
+        words = StringTable.from_strings(self.lexicon)
+        tags = Vocabulary()
+        arrays = {'words': words.strings}
+        for level, order in enumerate(self.orders):
+            rows = []
+            for word, entry in self.lexicon.items():
+                table = entry[level]
+                if table is None:
+                    continue
+                word_id = words.find(word)
+                if order == 1:
+                    rows.append((word_id, tags.add(table)))
+                    continue
+                for tag_context, tag in table.items():
+                    padding = (-1,) * (order - 1 - len(tag_context))
+                    rows.append((word_id,) + padding +
+                                tuple(tags.encode(tag_context)) +
+                                (tags.add(tag),))
+            rows.sort()
+            arrays['level%d' % level] = numpy.array(
+                rows, dtype=numpy.int32).reshape(len(rows), order + 1)
+        arrays['tags'] = tags.to_array()
+        for level in range(len(self.orders)):
+            arrays['keys%d' % level] = _row_keys(arrays['level%d' % level],
+                                                 len(tags) + 1)
+        save_model(path, 'ngram', arrays,
+                   {'orders': list(self.orders), 'default': self.default},
+                   source)
+
+    @classmethod
+    @instrument.timed('CompiledTagger.load')
+    def load(cls, path):
+        """Read a model written by ``save()``."""
+        arrays, meta = load_model(path, 'ngram', mmap=False)
+        words = arrays['words'].tolist()
+        tags = arrays['tags'].tolist()
+        orders = meta['orders']
+        rows = ((level, words[row[0]],
+                 None if order == 1 else tuple(tags[tag_id] for tag_id
+                                               in row[1:-1] if tag_id >= 0),
+                 tags[row[-1]])
+                for level, order in enumerate(orders)
+                for row in arrays['level%d' % level].tolist())
+        return cls(orders, _build_lexicon(len(orders), rows),
+                   meta['default'])
+
+
+class MappedTagger(object):
+    """A model written by ``CompiledTagger.save()``, tagging from its
+    memory-mapped arrays: words are found with ``StringTable.find_all``
+    and contexts by bisecting the sorted row keys, so nothing but the tag
+    list is copied into the process. Tags as ``CompiledTagger`` does.
+    """
+
+    def __init__(self, orders, words, tags, levels, keys, default=None):
+        self.orders = tuple(orders)
+        self.words = words
+        # Tag strings, by id
+        self.tags = tags
+        # Per level, the int32 rows of save() and their _row_keys()
+        self.levels = levels
+        self.keys = keys
+        self.default = default
+        self._base = len(tags) + 1
+        # Id of the default tag; NO_TAG when it has none, so contexts
+        # holding it match no row
+        self._default_id = tags.index(default) if default in tags \
+            else NO_TAG
+        # Tag of each id, then the default for NO_TAG
+        self._tag_table = numpy.array(tags + [default], dtype=object)
+
+    @classmethod
+    @instrument.timed('MappedTagger.load')
+    def load(cls, path, mmap=True):
+        """Read a model written by ``CompiledTagger.save()``, memory-mapping
+        its arrays unless ``mmap`` is false.
+        """
+        arrays, meta = load_model(path, 'ngram', mmap)
+        tags = arrays['tags'].tolist()
+        levels, keys = [], []
+        for level in range(len(meta['orders'])):
+            levels.append(arrays['level%d' % level])
+            level_keys = arrays.get('keys%d' % level)
+            if level_keys is None:  # exported before keys were saved
+                level_keys = _row_keys(levels[-1], len(tags) + 1)
+            keys.append(level_keys)
+        return cls(meta['orders'], StringTable(arrays['words']), tags, levels,
+                   keys, meta['default'])
+
+    def tag(self, tokens):
+        """Tag one sentence; returns ``(word, tag)`` pairs."""
+        tokens = list(tokens)
+        return list(zip(tokens, self._tags(tokens)))
+
+    @instrument.timed('MappedTagger.tag_sents')
+    def tag_sents(self, sentences):
+        """Tag a list of tokenized sentences."""
+        return [self.tag(tokens) for tokens in sentences]
+
+    def _tags(self, tokens):
+        if not tokens:
+            return []
+        word_ids = self.words.find_all(tokens)
+        base = self._base
+        # Per level: the rows [first, last) of each token's word; for
+        # unigram levels, directly the tag ids (or NO_TAG)
+        plan = []
+        for order, rows, keys in zip(self.orders, self.levels, self.keys):
+            scale = base ** (order - 1)
+            first = numpy.searchsorted(keys, word_ids * scale)
+            last = numpy.searchsorted(keys, (word_ids + 1) * scale)
+            if order == 1:
+                found = last > first
+                level_tags = numpy.full(len(first), NO_TAG, dtype=numpy.int64)
+                level_tags[found] = rows[first[found], -1]
+                plan.append((order, level_tags, None, None, None))
+            else:
+                plan.append((order, rows[:, -1], keys, first.tolist(),
+                             last.tolist()))
+        default_id = self._default_id
+        if all(order == 1 for order in self.orders):
+            # No context: the first level that knows the word wins
+            tag_ids = numpy.full(len(word_ids), default_id, dtype=numpy.int64)
+            for _, level_tags, _, _, _ in reversed(plan):
+                tag_ids = numpy.where(level_tags == NO_TAG, tag_ids,
+                                      level_tags)
+            return self._tag_strings(tag_ids)
+        plan = [(order, tags.tolist(), keys, first, last) if order == 1
+                else (order, tags, keys, first, last)
+                for order, tags, keys, first, last in plan]
+        word_ids = word_ids.tolist()
+        tag_ids = []
+        append = tag_ids.append
+        for index, word_id in enumerate(word_ids):
+            tag_id = NO_TAG
+            for order, tag_column, keys, first, last in plan:
+                if order == 1:
+                    tag_id = tag_column[index]
+                    if tag_id != NO_TAG:
+                        break
+                    continue
+                start, stop = first[index], last[index]
+                if start == stop:
+                    continue
+                key = word_id
+                for position in range(index - order + 1, index):
+                    context = tag_ids[position] if position >= 0 else -1
+                    if context == NO_TAG:
+                        break
+                    key = key * base + context + 1
+                else:
+                    row = bisect_left(keys, key, start, stop)
+                    if row < stop and keys[row] == key:
+                        tag_id = int(tag_column[row])
+                        break
+            append(default_id if tag_id == NO_TAG else tag_id)
+        return self._tag_strings(tag_ids)
+
+    def _tag_strings(self, tag_ids):
+        tag_ids = numpy.asarray(tag_ids, dtype=numpy.int64)
+        tag_ids[tag_ids == NO_TAG] = len(self.tags)
+        return self._tag_table[tag_ids].tolist()
+
+
+# Tag id of "no tag" in MappedTagger contexts; -1 pads sentence starts
+NO_TAG = -2
+
+
+def _row_keys(rows, base):
+    """Return one int64 key per row of a level, from its word id and
+    context tag ids (-1 padding counted as 0), in ``base`` = number of
+    tags + 1. Rows sorted as ``save()`` writes them give sorted keys.
+    """
+    n_rows, width = rows.shape
+    if n_rows and (int(rows[:, 0].max()) + 1) * base ** (width - 2) >= 2 ** 63:
+        raise ValueError('Too many words and tags for int64 row keys')
+    keys = rows[:, 0].astype(numpy.int64)
+    for column in range(1, width - 1):
+        keys = keys * base + rows[:, column] + 1
+    return keys
+
+
+def _build_lexicon(n_levels, rows):
+    """Build the word table from ``(level, word, tag_context, tag)`` rows;
+    ``tag_context`` is None for unigram levels.
+    """
+    lexicon = {}
+    for level, word, tag_context, tag in rows:
+        entry = lexicon.get(word)
+        if entry is None:
+            entry = lexicon[word] = [None] * n_levels
+        if tag_context is None:
+            entry[level] = tag
+        elif entry[level] is None:
+            entry[level] = {tag_context: tag}
+        else:
+            entry[level][tag_context] = tag
+    return {word: tuple(entry) for word, entry in lexicon.items()}
+
+
+def export_ngram(pickle_path, path=None):
+    """Convert a pickled n-gram tagger to a model directory (by default
+    next to the pickle, e.g. ``unigram.model``). Returns its path.
+    """
+    source = source_stamp(pickle_path)
+    with open(pickle_path, 'rb') as file_open:
+        tagger = CompiledTagger.from_nltk(pickle.load(file_open))
+    path = path or model_path(pickle_path)
+    tagger.save(path, source)
+    return path
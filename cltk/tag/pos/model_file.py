@@ -0,0 +1,142 @@
+"""Pickle-free tagger models that can be memory-mapped.
+
+A model is a directory of ``.npy`` arrays plus a ``model.json`` of
+scalars. Strings (words, suffixes) are kept in sorted fixed-width
+unicode arrays and looked up by binary search, so no per-process dict
+has to be built. ``load_model()`` maps the arrays read-only: loading is
+near-instant, and every process using a model shares one copy of it in
+the page cache::
+
+    tnt.model/
+        model.json
+        bigram.npy
+        words.npy
+        ...
+
+A model exported from a pickle records the pickle's size and mtime, so
+that a pickle replaced later (re-downloaded or retrained) is noticed.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import json
+import os
+import shutil
+
+import numpy
+
+FORMAT_VERSION = 1
+META_NAME = 'model.json'
+MODEL_SUFFIX = '.model'
+
+
+class StringTable(object):
+    """Sorted strings; a string's id is its position."""
+
+    def __init__(self, strings=None):
+        if strings is None:
+            strings = numpy.zeros(0, dtype='U1')
+        self.strings = strings
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Build a table of the distinct ``strings``."""
+        return cls(numpy.array(sorted(set(strings)), dtype=str))
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, index):
+        return str(self.strings[index])
+
+    def find(self, string):
+        """Return the id of ``string``, or -1."""
+        strings = self.strings
+        index = int(numpy.searchsorted(strings, string))
+        if index < len(strings) and strings[index] == string:
+            return index
+        return -1
+
+    def find_all(self, strings):
+        """Return the ids of ``strings`` as an array, -1 for unknown."""
+        table = self.strings
+        strings = numpy.asarray(strings, dtype=str)
+        if not len(table):
+            return numpy.full(len(strings), -1, dtype=numpy.int64)
+        index = numpy.searchsorted(table, strings)
+        index[index == len(table)] = 0
+        return numpy.where(table[index] == strings, index, -1)
+
+
+def model_path(path):
+    """Return the model directory for a pickle or model path."""
+    root, ext = os.path.splitext(path)
+    return path if ext == MODEL_SUFFIX else root + MODEL_SUFFIX
+
+
+def source_stamp(path):
+    """Return what identifies the version of the file ``path`` a model
+    is exported from.
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_model(path, kind, arrays, meta=None, source=None):
+    """Write ``arrays`` (name -> array) and the JSON-able ``meta`` as a
+    model directory of type ``kind``, replacing any existing one.
+    ``source`` is the ``source_stamp()`` of the pickle it came from.
+    """
+    partial = os.path.join(os.path.dirname(path) or '.',
+                           '.part-' + os.path.basename(path))
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for name, array in arrays.items():
+        numpy.save(os.path.join(partial, name + '.npy'), array,
+                   allow_pickle=False)
+    info = {'format': FORMAT_VERSION, 'kind': kind,
+            'arrays': sorted(arrays), 'meta': meta or {}}
+    if source is not None:
+        info['source'] = source
+    with open(os.path.join(partial, META_NAME), 'w') as file_open:
+        json.dump(info, file_open, indent=1)
+    old = None
+    if os.path.exists(path):
+        old = partial + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(path, old)
+    os.rename(partial, path)
+    if old:
+        shutil.rmtree(old)
+
+
+def model_info(path):
+    """Return the ``model.json`` of the model directory ``path``."""
+    with open(os.path.join(path, META_NAME)) as file_open:
+        return json.load(file_open)
+
+
+def model_kind(path):
+    """Return the type of the model directory ``path``."""
+    return model_info(path)['kind']
+
+
+def load_model(path, kind=None, mmap=True):
+    """Read a model directory; returns ``(arrays, meta)``. Arrays are
+    memory-mapped read-only unless ``mmap`` is false.
+    """
+    with open(os.path.join(path, META_NAME)) as file_open:
+        info = json.load(file_open)
+    if info.get('format') != FORMAT_VERSION:
+        raise ValueError('Unsupported model format in %s' % path)
+    if kind is not None and info['kind'] != kind:
+        raise ValueError('%s holds a %s model, not %s' % (path, info['kind'],
+                                                          kind))
+    mode = 'r' if mmap else None
+    # Plain ndarray views of the maps index faster than numpy.memmap
+    arrays = {name: numpy.asarray(numpy.load(os.path.join(path, name + '.npy'),
+                                             allow_pickle=False,
+                                             mmap_mode=mode))
+              for name in info['arrays']}
+    return arrays, info['meta']
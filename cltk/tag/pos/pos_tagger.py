@@ -3,11 +3,94 @@
 __author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
 __license__ = 'MIT License. See LICENSE.'
 
-from nltk.tokenize import wordpunct_tokenize
+from cltk.instrument import instrument
+from cltk.tokenize.word import tokenize_words
+import logging
 import os
 import pickle
 
 
+# Loaded model directories, by path, until they or their pickles change
+_MODELS = {}
+
+# Last characters of the tokens that end a sentence (the Greek question
+# mark included)
+SENTENCE_END = frozenset('.?!;\u037e')
+
+
+def _load_pickle(pickle_path):
+    with open(pickle_path, 'rb') as open_pickle:
+        return pickle.load(open_pickle)
+
+
+def _export(pickle_path, kind):
+    if kind == 'tnt':
+        from cltk.tag.pos.viterbi import export_tnt
+        return export_tnt(pickle_path)
+    from cltk.tag.pos.compiled import export_ngram
+    return export_ngram(pickle_path)
+
+
+def load_tagger(pickle_path):
+    """Load the tagger pickled at ``pickle_path``, or the pickle-free model
+    exported next to it (``unigram.model`` for ``unigram.pickle``) if
+    there is one. A model exported from an older version of the pickle
+    is exported again, or if that fails, the pickle is used.
+    """
+    from cltk.tag.pos.model_file import META_NAME, model_info, source_stamp
+    model_dir = os.path.splitext(pickle_path)[0] + '.model'
+    meta_path = os.path.join(model_dir, META_NAME)
+    try:
+        stat = os.stat(meta_path)
+    except OSError:
+        return _load_pickle(pickle_path)
+    try:
+        source = source_stamp(pickle_path)
+    except OSError:  # a model shipped without its pickle
+        source = None
+    stamp = (stat.st_ino, stat.st_mtime_ns)
+    cached = _MODELS.get(model_dir)
+    if cached is not None and cached[:2] == (stamp, source):
+        return cached[2]
+    info = model_info(model_dir)
+    if source is not None and info.get('source') != source:
+        logging.info('%s is older than %s; exporting it again', model_dir,
+                     pickle_path)
+        try:
+            _export(pickle_path, info['kind'])
+        except OSError as exc:
+            logging.warning('Could not export %s (%s); using the pickle',
+                            model_dir, exc)
+            return _load_pickle(pickle_path)
+        stat = os.stat(meta_path)
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+    if info['kind'] == 'tnt':
+        from cltk.tag.pos.viterbi import ViterbiTagger
+        tagger = ViterbiTagger.load(model_dir)
+    else:
+        from cltk.tag.pos.compiled import MappedTagger
+        tagger = MappedTagger.load(model_dir)
+    _MODELS[model_dir] = (stamp, source, tagger)
+    return tagger
+
+
+def split_sentences(tokens, max_len=100):
+    """Split ``tokens`` after sentence-final punctuation, and into spans of
+    at most ``max_len`` tokens, for taggers that decode sentence by
+    sentence.
+    """
+    sentences = []
+    sentence = []
+    for token in tokens:
+        sentence.append(token)
+        if token[-1] in SENTENCE_END or len(sentence) >= max_len:
+            sentences.append(sentence)
+            sentence = []
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
 class POSTag(object):
     """Picks up taggers made with UnigramTagger"""
 
@@ -15,6 +98,7 @@ class POSTag(object):
         """Initializer. Should it do anything?"""
         pass
 
+    @instrument.timed('POSTag.unigram_tagger')
     def unigram_tagger(self, untagged_string, language):
         """Reads language .pickle for right language"""
         if language == 'greek':
@@ -23,13 +107,14 @@ class POSTag(object):
             pickle_path = os.path.expanduser('~/cltk_data/latin/cltk_linguistic_data/taggers/pos/unigram.pickle')
         else:
             print('No unigram tagger for this language available.')
-        with open(pickle_path, 'rb') as open_pickle:
-            tagger = pickle.load(open_pickle)
-        untagged_tokens = wordpunct_tokenize(untagged_string)
+        tagger = load_tagger(pickle_path)
+        untagged_tokens = tokenize_words(untagged_string, language)
+        instrument.count('tokens_tagged', len(untagged_tokens))
         tagged_text = tagger.tag(untagged_tokens)
         return tagged_text
 
 
+    @instrument.timed('POSTag.bigram_tagger')
     def bigram_tagger(self, untagged_string, language):
         """Reads language .pickle for right language"""
         if language == 'greek':
@@ -38,13 +123,14 @@ class POSTag(object):
             pickle_path = os.path.expanduser('~/cltk_data/latin/cltk_linguistic_data/taggers/pos/bigram.pickle')
         else:
             print('No bigram tagger for this language available.')
-        with open(pickle_path, 'rb') as open_pickle:
-            tagger = pickle.load(open_pickle)
-        untagged_tokens = wordpunct_tokenize(untagged_string)
+        tagger = load_tagger(pickle_path)
+        untagged_tokens = tokenize_words(untagged_string, language)
+        instrument.count('tokens_tagged', len(untagged_tokens))
         tagged_text = tagger.tag(untagged_tokens)
         return tagged_text
 
 
+    @instrument.timed('POSTag.trigram_tagger')
     def trigram_tagger(self, untagged_string, language):
         """Reads language .pickle for right language"""
         if language == 'greek':
@@ -53,13 +139,14 @@ class POSTag(object):
             pickle_path = os.path.expanduser('~/cltk_data/latin/cltk_linguistic_data/taggers/pos/trigram.pickle')
         else:
             print('No trigram tagger for this language available.')
-        with open(pickle_path, 'rb') as open_pickle:
-            tagger = pickle.load(open_pickle)
-        untagged_tokens = wordpunct_tokenize(untagged_string)
+        tagger = load_tagger(pickle_path)
+        untagged_tokens = tokenize_words(untagged_string, language)
+        instrument.count('tokens_tagged', len(untagged_tokens))
         tagged_text = tagger.tag(untagged_tokens)
         return tagged_text
 
 
+    @instrument.timed('POSTag.ngram_123_backoff_tagger')
     def ngram_123_backoff_tagger(self, untagged_string, language):
         """Reads language .pickle for right language"""
         if language == 'greek':
@@ -68,13 +155,14 @@ class POSTag(object):
             pickle_path = os.path.expanduser('~/cltk_data/latin/cltk_linguistic_data/taggers/pos/123grambackoff.pickle')
         else:
             print('No n–gram backoff tagger for this language available.')
-        with open(pickle_path, 'rb') as open_pickle:
-            tagger = pickle.load(open_pickle)
-        untagged_tokens = wordpunct_tokenize(untagged_string)
+        tagger = load_tagger(pickle_path)
+        untagged_tokens = tokenize_words(untagged_string, language)
+        instrument.count('tokens_tagged', len(untagged_tokens))
         tagged_text = tagger.tag(untagged_tokens)
         return tagged_text
 
 
+    @instrument.timed('POSTag.tnt_tagger')
     def tnt_tagger(self, untagged_string, language):
         """Reads language .pickle for right language"""
         if language == 'greek':
@@ -83,8 +171,10 @@ class POSTag(object):
             pickle_path = os.path.expanduser('~/cltk_data/latin/cltk_linguistic_data/taggers/pos/tnt.pickle')
         else:
             print('No n–gram backoff tagger for this language available.')
-        with open(pickle_path, 'rb') as open_pickle:
-            tagger = pickle.load(open_pickle)
-        untagged_tokens = wordpunct_tokenize(untagged_string)
-        tagged_text = tagger.tag(untagged_tokens)
+        tagger = load_tagger(pickle_path)
+        untagged_tokens = tokenize_words(untagged_string, language)
+        instrument.count('tokens_tagged', len(untagged_tokens))
+        # Tag by sentence, so the Viterbi model decodes them as one batch
+        tagged_sents = tagger.tag_sents(split_sentences(untagged_tokens))
+        tagged_text = [pair for sent in tagged_sents for pair in sent]
         return tagged_text
@@ -0,0 +1,209 @@
+"""Train and cross-validate the five ``POSTag`` models on a treebank.
+
+Cross-validation folds run in parallel processes. For each model type the
+report gives mean accuracy, tagging throughput, pickle load time and
+size, so the fastest model that is accurate enough can be picked::
+
+    $ python -m cltk.tag.pos.train ~/cltk_data/latin/treebank/perseus \\
+          --language latin --folds 5
+
+Without ``--no-write`` the models are then retrained on the whole
+treebank and written where ``POSTag`` reads them.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import argparse
+import json
+import logging
+import os
+import pickle
+import random
+import time
+
+from cltk.corpus.common.checkpoint import atomic_write
+
+MODELS = ('unigram', 'bigram', 'trigram', '123grambackoff', 'tnt')
+# Relative training cost, so the slowest folds are started first
+COST = {'unigram': 1, 'bigram': 2, 'trigram': 3, '123grambackoff': 6,
+        'tnt': 20}
+TAGGER_DIR = '~/cltk_data/{}/cltk_linguistic_data/taggers/pos'
+
+
+def train_model(name, tagged_sents):
+    """Train the ``POSTag`` model ``name`` on ``(word, tag)`` sentences."""
+    from nltk.tag import BigramTagger, TrigramTagger, UnigramTagger
+    if name == 'unigram':
+        return UnigramTagger(tagged_sents)
+    elif name == 'bigram':
+        return BigramTagger(tagged_sents)
+    elif name == 'trigram':
+        return TrigramTagger(tagged_sents)
+    elif name == '123grambackoff':
+        unigram = UnigramTagger(tagged_sents)
+        bigram = BigramTagger(tagged_sents, backoff=unigram)
+        return TrigramTagger(tagged_sents, backoff=bigram)
+    elif name == 'tnt':
+        from nltk.tag.tnt import TnT
+        tagger = TnT()
+        tagger.train(tagged_sents)
+        return tagger
+    raise ValueError('Unknown tagger model %r' % name)
+
+
+def split_folds(n_sents, k, seed=0):
+    """Return ``k`` lists of sentence indexes, shuffled reproducibly."""
+    order = list(range(n_sents))
+    random.Random(seed).shuffle(order)
+    return [sorted(order[fold::k]) for fold in range(k)]
+
+
+def evaluate(tagger, test_sents):
+    """Return accuracy, tagging throughput, and pickle load time and size
+    of ``tagger`` on ``test_sents``.
+    """
+    words = [[word for word, _ in sent] for sent in test_sents]
+    start = time.perf_counter()
+    predicted = [tagger.tag(sent) for sent in words]
+    seconds = time.perf_counter() - start
+    total = correct = 0
+    for gold, guess in zip(test_sents, predicted):
+        for (_, gold_tag), (_, tag) in zip(gold, guess):
+            total += 1
+            correct += gold_tag == tag
+    data = pickle.dumps(tagger, pickle.HIGHEST_PROTOCOL)
+    start = time.perf_counter()
+    pickle.loads(data)
+    load_seconds = time.perf_counter() - start
+    return {'accuracy': correct / total if total else 0.0,
+            'tokens': total,
+            'tokens_per_sec': total / seconds if seconds else 0.0,
+            'load_seconds': load_seconds,
+            'size_bytes': len(data)}
+
+
+def run_fold(name, treebank_path, k, fold, seed=0):
+    """Train ``name`` on all folds but ``fold`` and evaluate on it."""
+    from cltk.corpus.common.treebank import load_treebank
+    sents = load_treebank(treebank_path).tagged_sents()
+    folds = split_folds(len(sents), k, seed)
+    held_out = set(folds[fold])
+    train = [sent for index, sent in enumerate(sents)
+             if index not in held_out]
+    test = [sents[index] for index in folds[fold]]
+    start = time.perf_counter()
+    tagger = train_model(name, train)
+    result = evaluate(tagger, test)
+    result['train_seconds'] = time.perf_counter() - start
+    result['model'] = name
+    result['fold'] = fold
+    return result
+
+
+def _run_fold_star(args):
+    return run_fold(*args)
+
+
+def cross_validate(treebank_path, models=MODELS, k=5, processes=None,
+                   seed=0):
+    """Run ``k``-fold cross-validation of each model in a process pool.
+    Returns ``{model: summary}`` with means over the folds and the
+    per-fold results under ``'folds'``.
+    """
+    from cltk.corpus.common.treebank import load_treebank
+    # Parse once here so workers all read the binary cache
+    load_treebank(treebank_path)
+    jobs = [(name, treebank_path, k, fold, seed) for name in models
+            for fold in range(k)]
+    jobs.sort(key=lambda job: -COST.get(job[0], 1))
+    if processes == 1:
+        fold_results = list(map(_run_fold_star, jobs))
+    else:
+        import multiprocessing
+        with multiprocessing.Pool(processes) as pool:
+            fold_results = list(pool.imap_unordered(_run_fold_star, jobs))
+    results = {}
+    for name in models:
+        folds = sorted((result for result in fold_results
+                        if result['model'] == name),
+                       key=lambda result: result['fold'])
+        summary = {}
+        for key in ('accuracy', 'tokens_per_sec', 'load_seconds',
+                    'size_bytes', 'train_seconds'):
+            values = [result[key] for result in folds]
+            summary[key] = sum(values) / len(values)
+        mean = summary['accuracy']
+        summary['accuracy_std'] = (sum((result['accuracy'] - mean) ** 2
+                                       for result in folds) / len(folds)) ** .5
+        summary['folds'] = folds
+        results[name] = summary
+    return results
+
+
+def train_all(treebank_path, language, models=MODELS, out_dir=None):
+    """Train each model on the whole treebank and write its pickle where
+    ``POSTag`` loads it. Returns the written paths.
+    """
+    from cltk.corpus.common.treebank import load_treebank
+    sents = load_treebank(treebank_path).tagged_sents()
+    if out_dir is None:
+        out_dir = os.path.expanduser(TAGGER_DIR.format(language))
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name in models:
+        tagger = train_model(name, sents)
+        path = os.path.join(out_dir, name + '.pickle')
+        atomic_write(path, pickle.dumps(tagger, pickle.HIGHEST_PROTOCOL))
+        logging.info('Wrote %s tagger to %s', name, path)
+        paths.append(path)
+        if name == 'tnt':
+            from cltk.tag.pos.viterbi import export_tnt
+            paths.append(export_tnt(path))
+        else:
+            from cltk.tag.pos.compiled import export_ngram
+            paths.append(export_ngram(path))
+    return paths
+
+
+def report(results):
+    """Format ``cross_validate()`` results as a table, most accurate
+    first.
+    """
+    lines = ['%-16s %9s %7s %12s %10s %10s' % (
+        'model', 'accuracy', '+/-', 'tokens/sec', 'load ms', 'size KiB')]
+    for name, summary in sorted(results.items(),
+                                key=lambda item: -item[1]['accuracy']):
+        lines.append('%-16s %9.4f %7.4f %12.0f %10.2f %10.0f' % (
+            name, summary['accuracy'], summary['accuracy_std'],
+            summary['tokens_per_sec'], summary['load_seconds'] * 1000,
+            summary['size_bytes'] / 1024))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Train and cross-validate the POSTag models.')
+    parser.add_argument('treebank', help='treebank XML file or directory')
+    parser.add_argument('--language', required=True)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--models', nargs='*', default=list(MODELS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results here')
+    parser.add_argument('--no-write', action='store_true',
+                        help='only cross-validate; keep existing models')
+    args = parser.parse_args(argv)
+    results = cross_validate(args.treebank, args.models, args.folds,
+                             args.processes, args.seed)
+    print(report(results))
+    if args.json:
+        atomic_write(args.json, json.dumps(results, indent=1) + '\n')
+    if not args.no_write:
+        for path in train_all(args.treebank, args.language, args.models):
+            print('Wrote', path)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,505 @@
+"""Vectorized Viterbi decoding of trained TnT models.
+
+``ViterbiTagger.from_tnt()`` turns an ``nltk`` TnT tagger into arrays
+indexed by state id, a state being a ``(tag, capitalized)`` pair: unigram
+and bigram transition log-probabilities as dense arrays and the observed
+trigrams as a sorted key array. ``tag_sents()`` then decodes a whole
+batch of sentences at once, one position at a time, each step being a
+handful of ``numpy`` operations over the flattened
+``(sentence, state, candidate)`` lattice instead of Python loops over
+dicts::
+
+    >>> tagger = ViterbiTagger.from_tnt(tnt)
+    >>> tagger.tag_sents([['arma', 'virumque', 'cano']])
+    [[('arma', 'n-p---na-'), ('virumque', 'n-s---ma-'), ...]]
+
+The scores, beam pruning and suffix model for unknown words follow
+``nltk.tag.tnt`` exactly, so the tags are those NLTK gives (paths of
+exactly equal probability aside).
+
+``save()`` writes the model in the pickle-free format of
+``cltk.tag.pos.model_file``, which ``load()`` memory-maps; ``POSTag``
+uses ``tnt.model`` in place of ``tnt.pickle`` when it exists.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import functools
+from math import log2
+import pickle
+
+import numpy
+
+from cltk.instrument import instrument
+from cltk.tag.pos.model_file import (StringTable, load_model, model_path,
+                                     save_model, source_stamp)
+from cltk.vocab import Vocabulary
+
+BOS = 'BOS'
+EOS = 'EOS'
+# Stands in for log2(0), as in nltk.tag.tnt
+LOG_FLOOR = log2(1e-300)
+# Longest suffix used for unknown words
+MAX_SUFFIX = 10
+# Sentences decoded together by tag_sents()
+BATCH_SIZE = 512
+# Distinct (word, capitalized) candidate lists kept per tagger
+CANDIDATE_CACHE_SIZE = 65536
+# Saved by save(); the rest of the model is in the meta data
+ARRAYS = ('unigram', 'bigram', 'trigram_keys', 'trigram_logp', 'eos_bigram',
+          'eos_trigram_keys', 'eos_trigram', 'lex_offsets', 'lex_tags',
+          'lex_counts', 'state_counts', 'suffix_offsets', 'suffix_tags',
+          'suffix_counts', 'prior_tags', 'priors')
+
+
+def _safe_log2(prob):
+    return log2(prob) if prob > 1e-300 else LOG_FLOOR
+
+
+class ViterbiTagger(object):
+    """Second-order HMM tagger decoding with ``numpy``.
+
+    States are numbered ``tag_id * n_caps + capitalized``, where tag ids
+    0 and 1 are the ``BOS`` and ``EOS`` markers.
+    """
+
+    def __init__(self):
+        self.tags = Vocabulary([BOS, EOS])
+        self.words = StringTable()
+        self.capitalization = False
+        self.log2_beam = log2(1000)
+        # Transition log-probabilities: unigram[cur], bigram[prev, cur]
+        # (falling back to unigram), trigram_logp[i] for the sorted keys
+        # (prev2 * K + prev) * K + cur
+        self.unigram = numpy.zeros(0)
+        self.bigram = numpy.zeros((0, 0))
+        self.trigram_keys = numpy.zeros(0, dtype=numpy.int64)
+        self.trigram_logp = numpy.zeros(0)
+        # EOS probabilities, weighted by the interpolation lambdas
+        self.eos_unigram = 0.0
+        self.eos_bigram = numpy.zeros(0)
+        self.eos_trigram_keys = numpy.zeros(0, dtype=numpy.int64)
+        self.eos_trigram = numpy.zeros(0)
+        # Lexicon: tags of words[i] are lex_tags[lex_offsets[i]:
+        # lex_offsets[i + 1]], seen lex_counts times
+        self.lex_offsets = numpy.zeros(1, dtype=numpy.int64)
+        self.lex_tags = numpy.zeros(0, dtype=numpy.int32)
+        self.lex_counts = numpy.zeros(0, dtype=numpy.int64)
+        self.state_counts = numpy.zeros(0, dtype=numpy.int64)
+        # Suffix model for unknown words: suffixes of capitalized words
+        # are prefixed '1', others '0', and laid out like the lexicon;
+        # then the tag priors and the smoothing weight theta
+        self.suffixes = StringTable()
+        self.suffix_offsets = numpy.zeros(1, dtype=numpy.int64)
+        self.suffix_tags = numpy.zeros(0, dtype=numpy.int32)
+        self.suffix_counts = numpy.zeros(0, dtype=numpy.int64)
+        self.prior_tags = numpy.zeros(0, dtype=numpy.int32)
+        self.priors = numpy.zeros(0)
+        self.theta = 0.0
+        # Least recently used words are dropped, so a long-lived tagger
+        # does not keep the candidates of every form it has seen
+        self._candidates = functools.lru_cache(CANDIDATE_CACHE_SIZE)(
+            self._find_candidates)
+
+    @property
+    def n_caps(self):
+        return 2 if self.capitalization else 1
+
+    @property
+    def n_states(self):
+        return len(self.tags) * self.n_caps
+
+    def state(self, tag, capitalized=False):
+        """Return the state id of ``tag``."""
+        return self.tags.ids[tag] * self.n_caps + bool(
+            capitalized and self.capitalization)
+
+    ## Conversion -------------------------------------------------------------
+
+    @classmethod
+    @instrument.timed('ViterbiTagger.from_tnt')
+    def from_tnt(cls, tnt):
+        """Convert a trained ``nltk.tag.tnt.TnT`` tagger."""
+        try:
+            unigram_logp = tnt._trans_logp_unigram
+            word_tag_freqs = tnt._word_tag_freqs
+        except AttributeError:
+            raise ValueError('Unsupported TnT model layout; retrain it with '
+                             'the installed version of nltk')
+        if tnt._unk is not None:
+            raise ValueError('TnT models with an external unknown-word '
+                             'tagger are not supported')
+        self = cls()
+        self.capitalization = bool(tnt._use_capitalization)
+        self.log2_beam = tnt._log2_beam_threshold
+        tag_names = set(tag for tag, _ in tnt._tag_unigrams)
+        for tag_freqs in word_tag_freqs.values():
+            tag_names.update(tag_freqs)
+        tag_names.update(tnt._tag_prior_probs)
+        tag_names.discard(BOS)
+        tag_names.discard(EOS)
+        self.tags.encode(sorted(tag_names))
+
+        n_states = self.n_states
+        state = self.state
+
+        def state_of(pair):
+            return state(pair[0], pair[1])
+
+        self.unigram = numpy.full(n_states, LOG_FLOOR)
+        self.state_counts = numpy.zeros(n_states, dtype=numpy.int64)
+        for pair, count in tnt._tag_unigrams.items():
+            self.state_counts[state_of(pair)] = count
+        for pair, logp in unigram_logp.items():
+            self.unigram[state_of(pair)] = logp
+        self.bigram = numpy.tile(self.unigram, (n_states, 1))
+        for prev, dist in tnt._trans_logp_bigram.items():
+            row = self.bigram[state_of(prev)]
+            for cur, logp in dist.items():
+                row[state_of(cur)] = logp
+        keys, values = [], []
+        for (prev2, prev), dist in tnt._trans_logp_trigram.items():
+            context = (state_of(prev2) * n_states + state_of(prev)) * n_states
+            for cur, logp in dist.items():
+                keys.append(context + state_of(cur))
+                values.append(logp)
+        self.trigram_keys, self.trigram_logp = _sorted_table(keys, values)
+
+        lambda1, lambda2, lambda3 = tnt._lambda1, tnt._lambda2, tnt._lambda3
+        eos = (EOS, False)
+        n_tags = tnt._num_tag_tokens
+        self.eos_unigram = lambda1 * (
+            tnt._tag_unigrams[eos] / n_tags if n_tags else 0.0)
+        self.eos_bigram = numpy.zeros(n_states)
+        for prev, dist in tnt._tag_bigrams.items():
+            if dist.N():
+                self.eos_bigram[state_of(prev)] = lambda2 * (
+                    dist[eos] / dist.N())
+        keys, values = [], []
+        for (prev2, prev), dist in tnt._tag_trigrams.items():
+            if dist.N() and dist[eos]:
+                keys.append(state_of(prev2) * n_states + state_of(prev))
+                values.append(lambda3 * (dist[eos] / dist.N()))
+        self.eos_trigram_keys, self.eos_trigram = _sorted_table(keys, values)
+
+        words = sorted(word_tag_freqs)
+        self.words = StringTable(numpy.array(words, dtype=str))
+        self.lex_offsets, self.lex_tags, self.lex_counts = self._ragged(
+            sorted(word_tag_freqs[word].items()) for word in words)
+
+        suffixes = sorted(('%d%s' % (capitalized, suffix), dist)
+                          for capitalized, trie in
+                          tnt._suffix_trie_by_cap.items()
+                          for suffix, dist in trie.items())
+        self.suffixes = StringTable(numpy.array(
+            [key for key, _ in suffixes], dtype=str))
+        (self.suffix_offsets, self.suffix_tags,
+         self.suffix_counts) = self._ragged(list(dist.items())
+                                            for _, dist in suffixes)
+        priors = tnt._tag_prior_probs
+        self.prior_tags = numpy.array([self.tags.ids[tag] for tag in priors],
+                                      dtype=numpy.int32)
+        self.priors = numpy.array(list(priors.values()))
+        self.theta = tnt._theta
+        return self
+
+    def _ragged(self, rows):
+        """Lay out rows of ``(tag, count)`` pairs as offsets, tag ids and
+        counts arrays.
+        """
+        offsets, tag_ids, counts = [0], [], []
+        for row in rows:
+            for tag, count in row:
+                tag_ids.append(self.tags.ids[tag])
+                counts.append(count)
+            offsets.append(len(tag_ids))
+        return (numpy.array(offsets, dtype=numpy.int64),
+                numpy.array(tag_ids, dtype=numpy.int32),
+                numpy.array(counts, dtype=numpy.int64))
+
+    ## Storage ----------------------------------------------------------------
+
+    def save(self, path, source=None):
+        """Write the model as a pickle-free model directory; ``source`` is
+        passed to ``save_model()``.
+        """
+        arrays = {name: getattr(self, name) for name in ARRAYS}
+        arrays['tags'] = self.tags.to_array()
+        arrays['words'] = self.words.strings
+        arrays['suffixes'] = self.suffixes.strings
+        meta = {'capitalization': self.capitalization,
+                'log2_beam': self.log2_beam,
+                'eos_unigram': self.eos_unigram,
+                'theta': self.theta}
+        save_model(path, 'tnt', arrays, meta, source)
+
+    @classmethod
+    @instrument.timed('ViterbiTagger.load')
+    def load(cls, path, mmap=True):
+        """Read a model written by ``save()``, memory-mapping its arrays
+        unless ``mmap`` is false.
+        """
+        arrays, meta = load_model(path, 'tnt', mmap)
+        self = cls()
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.tags = Vocabulary.from_array(arrays['tags'])
+        self.words = StringTable(arrays['words'])
+        self.suffixes = StringTable(arrays['suffixes'])
+        for name, value in meta.items():
+            setattr(self, name, value)
+        return self
+
+    ## Emissions --------------------------------------------------------------
+
+    def candidates(self, word):
+        """Return the candidate states of ``word`` and their emission
+        log-probabilities, as two arrays.
+        """
+        return self._candidates(word, bool(word) and word[0].isupper())
+
+    def _find_candidates(self, word, capitalized):
+        cap = int(capitalized and self.capitalization)
+        word_id = self.words.find(word)
+        if word_id >= 0:
+            start, stop = self.lex_offsets[word_id:word_id + 2]
+            states = self.lex_tags[start:stop].astype(numpy.int64) \
+                * self.n_caps + cap
+            emits = [log2(count / total) if total else LOG_FLOOR
+                     for count, total in zip(self.lex_counts[start:stop].tolist(),
+                                             self.state_counts[states].tolist())]
+        else:
+            tag_ids, scores = self._unknown_scores(word, capitalized)
+            if not len(tag_ids):
+                raise ValueError('Tagger has no tag priors; is it trained?')
+            states = tag_ids.astype(numpy.int64) * self.n_caps + cap
+            emits = [_safe_log2(score) for score in scores.tolist()]
+        # Sorted, so the lattice stays in state order
+        order = numpy.argsort(states, kind='stable')
+        return (states[order],
+                numpy.array(emits, dtype=numpy.float64)[order])
+
+    def _unknown_scores(self, word, capitalized):
+        """Brants's suffix model, Bayes-inverted, as in ``nltk.tag.tnt``.
+        Returns ``(tag_ids, scores)``.
+        """
+        positive = self.priors > 0
+        tag_ids, priors = self.prior_tags[positive], self.priors[positive]
+        prefix = '%d' % capitalized
+        find = self.suffixes.find
+        longest = 0
+        for length in range(min(len(word), MAX_SUFFIX), 0, -1):
+            if find(prefix + word[-length:]) >= 0:
+                longest = length
+                break
+        if not longest:
+            return tag_ids, numpy.ones(len(tag_ids))
+        theta = self.theta
+        if theta == 0.0:
+            dist_tags, counts = self._suffix(prefix + word[-longest:])
+            total = sum(counts)
+            prior_of = dict(zip(tag_ids.tolist(), priors.tolist()))
+            pairs = [(tag, (count * (1.0 / total)) / prior_of[tag])
+                     for tag, count in zip(dist_tags, counts)
+                     if prior_of.get(tag, 0) > 0]
+            return (numpy.array([tag for tag, _ in pairs], dtype=numpy.int32),
+                    numpy.array([score for _, score in pairs]))
+        denom = 1.0 + theta
+        miss_scale = theta / denom
+        global_scale = 1.0
+        delta = {}
+        for length in range(1, longest + 1):
+            dist_tags, counts = self._suffix(prefix + word[-length:])
+            inv_total = 1.0 / sum(counts)
+            global_scale *= miss_scale
+            corr_scale = inv_total / (denom * global_scale)
+            for tag, count in zip(dist_tags, counts):
+                delta[tag] = delta.get(tag, 0.0) + count * corr_scale
+        scores = [global_scale if tag not in delta else
+                  global_scale * (1.0 + delta[tag] / prior)
+                  for tag, prior in zip(tag_ids.tolist(), priors.tolist())]
+        return tag_ids, numpy.array(scores)
+
+    def _suffix(self, key):
+        """Return the tag ids and counts of a suffix, as lists."""
+        index = self.suffixes.find(key)
+        start, stop = self.suffix_offsets[index:index + 2].tolist()
+        return (self.suffix_tags[start:stop].tolist(),
+                self.suffix_counts[start:stop].tolist())
+
+    ## Decoding ---------------------------------------------------------------
+
+    def tag(self, tokens):
+        """Tag one sentence; returns ``(word, tag)`` pairs."""
+        return self.tag_sents([tokens])[0]
+
+    @instrument.timed('ViterbiTagger.tag_sents')
+    def tag_sents(self, sentences, batch_size=BATCH_SIZE):
+        """Tag a list of tokenized sentences."""
+        sentences = [list(sent) for sent in sentences]
+        tagged = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            paths = self._decode(batch)
+            tags = self.tags.tokens
+            n_caps = self.n_caps
+            for sent, path in zip(batch, paths):
+                tagged.append([(word, tags[state // n_caps])
+                               for word, state in zip(sent, path)])
+        return tagged
+
+    def _decode(self, sentences):
+        """Return the best state path of each sentence."""
+        n_states = self.n_states
+        lengths = numpy.array([len(sent) for sent in sentences],
+                              dtype=numpy.int64)
+        n_sents = len(sentences)
+        bos = self.state(BOS)
+        # Lattice: one entry per surviving (sentence, prev, cur) state,
+        # kept sorted by that key
+        sent = numpy.nonzero(lengths)[0]
+        prev = numpy.full(len(sent), bos, dtype=numpy.int64)
+        cur = prev.copy()
+        score = numpy.zeros(len(sent))
+        history = []
+        finals = []
+        for position in range(int(lengths.max()) if n_sents else 0):
+            # Candidates of each sentence's word at this position
+            n_cands = numpy.zeros(n_sents, dtype=numpy.int64)
+            cand_states, cand_emits = [], []
+            active = numpy.nonzero(lengths > position)[0]
+            for index in active.tolist():
+                states, emits = self.candidates(sentences[index][position])
+                cand_states.append(states)
+                cand_emits.append(emits)
+            n_cands[active] = [len(states) for states in cand_states]
+            cand_states = numpy.concatenate(cand_states)
+            cand_emits = numpy.concatenate(cand_emits)
+            cand_start = numpy.cumsum(n_cands) - n_cands
+
+            # States reaching the same (sentence, cur) compete for the
+            # same successors, so order them into such segments
+            order = numpy.argsort(sent * n_states + cur, kind='stable')
+            sent, prev, cur = sent[order], prev[order], cur[order]
+            score = score[order]
+            segment = numpy.cumsum(_run_starts(sent, cur)) - 1
+
+            # Every state paired with every candidate of its sentence
+            repeat = n_cands[sent]
+            state_index = numpy.repeat(numpy.arange(len(sent)), repeat)
+            offsets = numpy.cumsum(repeat) - repeat
+            within = (numpy.arange(int(repeat.sum()))
+                      - numpy.repeat(offsets, repeat))
+            cand_index = within + numpy.repeat(cand_start[sent], repeat)
+            prev2, prev1 = prev[state_index], cur[state_index]
+            nxt = cand_states[cand_index]
+            trans = self.bigram[prev1, nxt]
+            keys = (prev2 * n_states + prev1) * n_states + nxt
+            found = _lookup(self.trigram_keys, keys)
+            hit = found >= 0
+            trans[hit] = self.trigram_logp[found[hit]]
+            path = score[state_index] + (trans + cand_emits[cand_index])
+
+            # Keep the best path into each (sentence, prev1, next): the
+            # groups are numbered segment by segment, candidate by
+            # candidate, which is also their (sentence, prev1, next) order
+            seg_sizes = numpy.zeros(int(segment[-1]) + 1, dtype=numpy.int64)
+            seg_sizes[segment] = repeat
+            seg_start = numpy.cumsum(seg_sizes) - seg_sizes
+            group = seg_start[segment[state_index]] + within
+            n_groups = int(seg_sizes.sum())
+            top = numpy.full(n_groups, -numpy.inf)
+            numpy.maximum.at(top, group, path)
+            winner = numpy.nonzero(path == top[group])[0]
+            best = numpy.full(n_groups, len(path), dtype=numpy.int64)
+            numpy.minimum.at(best, group[winner], winner)
+            sent = sent[state_index[best]]
+            prev, cur = prev1[best], nxt[best]
+            back, score = prev2[best], path[best]
+
+            # Beam: drop states far below their sentence's best
+            first = _run_starts(sent)
+            top = numpy.maximum.reduceat(score, numpy.nonzero(first)[0])
+            keep = score >= (top - self.log2_beam)[numpy.cumsum(first) - 1]
+            sent, prev, cur = sent[keep], prev[keep], cur[keep]
+            back, score = back[keep], score[keep]
+            history.append(((sent * n_states + prev) * n_states + cur, back))
+
+            done = lengths[sent] == position + 1
+            if done.any():
+                finals.append(self._finish(sent[done], prev[done], cur[done],
+                                           score[done]))
+                sent, prev, cur = sent[~done], prev[~done], cur[~done]
+                score = score[~done]
+
+        # Follow the backpointers from each sentence's best final state
+        paths = [[0] * length for length in lengths.tolist()]
+        key_prev = numpy.zeros(n_sents, dtype=numpy.int64)
+        key_cur = numpy.zeros(n_sents, dtype=numpy.int64)
+        for final_sent, final_prev, final_cur in finals:
+            key_prev[final_sent] = final_prev
+            key_cur[final_sent] = final_cur
+        for level in range(len(history), 0, -1):
+            active = numpy.nonzero(lengths >= level)[0]
+            keys, back = history[level - 1]
+            for index, state in zip(active.tolist(),
+                                    key_cur[active].tolist()):
+                paths[index][level - 1] = state
+            found = _lookup(keys, (active * n_states + key_prev[active])
+                            * n_states + key_cur[active])
+            key_cur[active] = key_prev[active]
+            key_prev[active] = back[found]
+        return paths
+
+    def _finish(self, sent, prev, cur, score):
+        """Score the EOS transition and return the best final
+        ``(sentence, prev, cur)`` states.
+        """
+        n_states = self.n_states
+        found = _lookup(self.eos_trigram_keys, prev * n_states + cur)
+        eos_trigram = numpy.where(found >= 0, self.eos_trigram[found], 0.0)
+        prob = self.eos_unigram + self.eos_bigram[cur] + eos_trigram
+        with numpy.errstate(divide='ignore'):
+            final = score + numpy.where(prob > 1e-300, numpy.log2(prob),
+                                        LOG_FLOOR)
+        order = numpy.lexsort((-final, sent))
+        best = order[_run_starts(sent[order])]
+        return sent[best], prev[best], cur[best]
+
+
+def _run_starts(*columns):
+    """Mark where the value of any of the (sorted) ``columns`` changes."""
+    first = numpy.ones(len(columns[0]), dtype=bool)
+    first[1:] = False
+    for column in columns:
+        first[1:] |= column[1:] != column[:-1]
+    return first
+
+
+def _sorted_table(keys, values):
+    keys = numpy.array(keys, dtype=numpy.int64)
+    values = numpy.array(values, dtype=numpy.float64)
+    order = numpy.argsort(keys, kind='stable')
+    return keys[order], values[order]
+
+
+def _lookup(sorted_keys, keys):
+    """Return the index of each of ``keys`` in ``sorted_keys``, or -1."""
+    if not len(sorted_keys):
+        return numpy.full(len(keys), -1, dtype=numpy.int64)
+    index = numpy.searchsorted(sorted_keys, keys)
+    index[index == len(sorted_keys)] = 0
+    return numpy.where(sorted_keys[index] == keys, index, -1)
+
+
+def export_tnt(pickle_path, path=None):
+    """Convert a pickled TnT tagger to a model directory (by default next
+    to the pickle, as ``tnt.model``). Returns its path.
+    """
+    source = source_stamp(pickle_path)
+    with open(pickle_path, 'rb') as file_open:
+        tagger = ViterbiTagger.from_tnt(pickle.load(file_open))
+    path = path or model_path(pickle_path)
+    tagger.save(path, source)
+    return path
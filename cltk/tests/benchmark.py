@@ -0,0 +1,622 @@
+"""Benchmarks for CLTK's text-processing hot paths.
+
+All fixtures are synthetic and built offline inside a temporary home
+directory, so no corpora or downloaded models are required. Run with:
+
+    python -m cltk.tests.benchmark --save baseline.json
+    python -m cltk.tests.benchmark --compare baseline.json
+    python -m cltk.tests.benchmark --imports
+
+Each benchmark reports throughput in tokens/sec and MB/sec, plus peak
+Python memory as measured by ``tracemalloc``.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import argparse
+import json
+import os
+import pickle
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BETA_WORDS = ['O(/PWS', 'OU)=N', 'MH\\', 'TAU)TO\\', 'LO/GOS', 'KAI\\',
+              'A)NH/R', 'QEO/S', 'E)N', 'TH=|', 'PO/LEI', 'TW=N', 'A)/NDRWN',
+              'E)STI/N', 'GA\\R', 'DE\\', '*)AQH=NAI', '*(/OMHROS', 'LE/GEI,',
+              'E)PI\\', 'TOU/TOIS.', 'PRA/GMATA:']
+
+LATIN_WORDS = ['est', 'interdum', 'praestare', 'mercaturis', 'rem',
+               'quaerere', 'nisi', 'tam', 'periculosum', 'sit', 'arma',
+               'virumque', 'cano', 'troiae', 'qui', 'primus', 'ab', 'oris',
+               'italiam', 'fato', 'profugus', 'laviniaque', 'venit',
+               'litora', 'multum', 'ille', 'et', 'terris', 'iactatus',
+               'alto', 'jam', 'vel', 'atque', 'itaque', 'populusque']
+
+GREEK_WORDS = ['ἅρπαγος', 'δὲ', 'καταστρεψάμενος', 'ἰωνίην', 'ἐποιέετο',
+               'στρατηίην', 'ἐπὶ', 'κᾶρας', 'καὶ', 'καυνίους', 'λυκίους',
+               'ἅμα', 'ἀγόμενος', 'ἴωνας', 'αἰολέας', 'ὁ', 'τῶν', 'γὰρ']
+
+TAGS = ['n-s---mn-', 'v3spia---', 'a-s---fn-', 'c--------', 'r--------',
+        'd--------', 'p-s---mn-', 'u--------']
+
+BENCHMARKS = []
+
+# Modules timed by ``python -X importtime``, one per subpackage
+IMPORT_MODULES = ['cltk.corpus.common.compiler',
+                  'cltk.corpus.downloader',
+                  'cltk.corpus.greek.beta_to_unicode',
+                  'cltk.stem.latin.stemmer',
+                  'cltk.stem.latin.j_and_v_converter',
+                  'cltk.stem.latin.lemmatizer',
+                  'cltk.stop.latin.stops',
+                  'cltk.stop.greek.stops_unicode',
+                  'cltk.tag.pos.pos_tagger',
+                  'cltk.tokenize.sentence.tokenize_sentences',
+                  'cltk.tokenize.word']
+
+# Dependencies that must only be imported on first use
+HEAVY_MODULES = ('requests', 'requests_toolbelt', 'ssl', 'nltk', 'numpy',
+                 'pprint', 'cltk.corpus.greek.beta_to_unicode')
+
+
+def benchmark(name):
+    """Register a benchmark. The decorated function receives a
+    ``Fixtures`` instance and returns ``(callable, tokens, n_bytes)``.
+    """
+    def register(func):
+        BENCHMARKS.append((name, func))
+        return func
+    return register
+
+
+def text_benchmark(name, text='latin_text', copies=1):
+    """Register a benchmark over ``copies`` copies of the ``Fixtures``
+    attribute ``text``. The decorated function returns only the callable;
+    tokens and bytes are counted from the text.
+    """
+    def register(func):
+        def bench(fix):
+            source = getattr(fix, text)
+            return (func(fix), copies * len(source.split()),
+                    copies * len(source.encode('utf-8')))
+        BENCHMARKS.append((name, bench))
+        return func
+    return register
+
+
+def make_text(words, n_words, seed=0, sentence_len=12):
+    """Build a reproducible pseudo-text from a word list."""
+    rand = random.Random(seed)
+    out = []
+    for count in range(1, n_words + 1):
+        word = rand.choice(words)
+        if count % sentence_len == 0:
+            word += '.'
+        out.append(word)
+    return ' '.join(out)
+
+
+def make_tagged_sents(words, n_sents, seed=0, sentence_len=12):
+    """Build reproducible POS-tagged sentences for tagger training."""
+    rand = random.Random(seed)
+    tag_of = {word: TAGS[i % len(TAGS)] for i, word in enumerate(words)}
+    sents = []
+    for _ in range(n_sents):
+        sent = [rand.choice(words) for _ in range(sentence_len)]
+        sents.append([(word, tag_of[word]) for word in sent])
+    return sents
+
+
+class Fixtures(object):
+    """Synthetic texts, models and corpora in a throwaway home directory.
+
+    ``os.path.expanduser('~')`` resolves to the temporary directory while
+    the fixtures are active, which is where ``Compile``, ``POSTag`` and
+    ``TokenizeSentence`` look for their data.
+    """
+
+    def __init__(self, n_words=20000):
+        self.n_words = n_words
+        self.home = None
+        self._old_home = None
+        self.beta_text = make_text(BETA_WORDS, n_words, seed=1)
+        self.latin_text = make_text(LATIN_WORDS, n_words, seed=2)
+        self.greek_text = make_text(GREEK_WORDS, n_words, seed=3)
+        self.latin_tokens = self.latin_text.split()
+        self.greek_tokens = self.greek_text.split()
+
+    def __enter__(self):
+        self.home = tempfile.mkdtemp(prefix='cltk_bench_')
+        self._old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        return self
+
+    def __exit__(self, *exc):
+        if self._old_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self._old_home
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def linguistic_dir(self, language):
+        """Return ``~/cltk_data/<language>/cltk_linguistic_data``."""
+        return os.path.join(self.home, 'cltk_data', language,
+                            'cltk_linguistic_data')
+
+    def write_pickle(self, obj, path):
+        """Pickle ``obj`` to ``path``, creating parent dirs."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file_open:
+            pickle.dump(obj, file_open)
+
+    def build_taggers(self, language, words):
+        """Train the five ``POSTag`` models on synthetic sentences."""
+        from nltk.tag import UnigramTagger, BigramTagger, TrigramTagger
+        from nltk.tag.tnt import TnT
+        train = make_tagged_sents(words, 200)
+        pos_dir = os.path.join(self.linguistic_dir(language), 'taggers', 'pos')
+        unigram = UnigramTagger(train)
+        bigram = BigramTagger(train, backoff=unigram)
+        tnt = TnT()
+        tnt.train(train)
+        models = {'unigram.pickle': unigram,
+                  'bigram.pickle': BigramTagger(train),
+                  'trigram.pickle': TrigramTagger(train),
+                  '123grambackoff.pickle': TrigramTagger(train,
+                                                         backoff=bigram),
+                  'tnt.pickle': tnt}
+        for file_name, model in models.items():
+            self.write_pickle(model, os.path.join(pos_dir, file_name))
+
+    def build_treebank(self, language, words, n_sents=None):
+        """Write a Perseus-style treebank XML file of synthetic sentences;
+        return its path and word count.
+        """
+        from xml.sax.saxutils import quoteattr
+        n_sents = n_sents or max(self.n_words // 12, 1)
+        sents = make_tagged_sents(words, n_sents)
+        path = os.path.join(self.home, 'cltk_data', language, 'treebank',
+                            'perseus', 'treebank.xml')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<treebank version="1.5" format="aldt">']
+        for number, sent in enumerate(sents):
+            lines.append('<sentence id="%d">' % number)
+            for index, (word, tag) in enumerate(sent):
+                lines.append('<word id="%d" form=%s lemma=%s postag="%s" '
+                             'head="%d" relation="ATR"/>' % (
+                                 index + 1, quoteattr(word),
+                                 quoteattr(word[:4]), tag, index))
+            lines.append('</sentence>')
+        lines.append('</treebank>')
+        with open(path, 'w', encoding='utf-8') as file_open:
+            file_open.write('\n'.join(lines))
+        return path, sum(len(sent) for sent in sents)
+
+    def build_punkt(self, language, text):
+        """Train a Punkt model where ``TokenizeSentence`` expects it."""
+        from nltk.tokenize.punkt import PunktTrainer
+        trainer = PunktTrainer()
+        trainer.train(text)
+        path = os.path.join(self.linguistic_dir(language), 'tokenizers',
+                            'sentence', language + '.pickle')
+        self.write_pickle(trainer, path)
+
+    def write_docs(self, texts=None, n_docs=8):
+        """Write each of ``texts`` (by default ``n_docs`` copies of the
+        Latin text) to ``doc<number>.txt``; returns the paths.
+        """
+        if texts is None:
+            texts = [self.latin_text] * n_docs
+        paths = []
+        for number, text in enumerate(texts):
+            path = os.path.join(self.home, 'doc%d.txt' % number)
+            with open(path, 'w', encoding='utf-8') as file_open:
+                file_open.write(text)
+            paths.append(path)
+        return paths
+
+    def build_corpus(self, corpus, n_files=4):
+        """Write a minimal TLG or PHI5 disk image into ``originals/``."""
+        orig_dir = os.path.join(self.home, 'cltk_data', 'originals', corpus)
+        os.makedirs(orig_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.home, 'cltk_data', 'compiled', corpus),
+                    exist_ok=True)
+        if corpus == 'tlg':
+            prefix, tail, words = 'TLG', 7, BETA_WORDS
+        else:
+            prefix, tail, words = 'LAT', 21, LATIN_WORDS
+        per_file = max(self.n_words // n_files, 1)
+        entries = []
+        n_bytes = 0
+        for number in range(n_files):
+            file_name = '%s%04d' % (prefix, number)
+            entries.append('%s Author %d' % (file_name, number))
+            body = '{1TITLE %d}1 ' % number + \
+                make_text(words, per_file, seed=number)
+            data = body.encode('latin-1')
+            n_bytes += len(data)
+            with open(os.path.join(orig_dir, file_name + '.TXT'), 'wb') as f:
+                f.write(data)
+        authtab = '\xff'.join(['HEAD'] + entries + [''] * tail)
+        with open(os.path.join(orig_dir, 'AUTHTAB.DIR'), 'wb') as file_open:
+            file_open.write(authtab.encode('latin-1'))
+        return per_file * n_files, n_bytes
+
+
+@text_benchmark('beta_code', 'beta_text')
+def bench_beta_code(fix):
+    from cltk.corpus.greek.beta_to_unicode import Replacer
+    replacer = Replacer()
+    return lambda: replacer.beta_code(fix.beta_text)
+
+
+@text_benchmark('latin_stemmer')
+def bench_stemmer(fix):
+    from cltk.stem.latin.stemmer import Stemmer
+    stemmer = Stemmer()
+    return lambda: stemmer.stem(fix.latin_text)
+
+
+@text_benchmark('latin_stemmer_types')
+def bench_stemmer_types(fix):
+    from cltk.stem.latin.stemmer import Stemmer
+    from cltk.vocab import map_types
+    stem_word = Stemmer().stem_word
+    tokens = fix.latin_text.split(' ')
+    return lambda: map_types(stem_word, tokens)
+
+
+@text_benchmark('jv_replacer')
+def bench_jv_replacer(fix):
+    from cltk.stem.latin.j_and_v_converter import JVReplacer
+    replacer = JVReplacer()
+    return lambda: replacer.replace(fix.latin_text)
+
+
+@text_benchmark('latin_lemmatizer')
+def bench_lemmatizer(fix):
+    from cltk.stem.latin.lemmatizer import LemmaReplacer
+    try:
+        lemmatizer = LemmaReplacer()
+    except ImportError:
+        # No lemmata table installed; time the engine on a synthetic one
+        lemmatizer = LemmaReplacer([(r'\b%s\b' % word, word[:4])
+                                    for word in LATIN_WORDS])
+    return lambda: lemmatizer.lemmatize(fix.latin_text)
+
+
+@text_benchmark('latin_stopwords')
+def bench_latin_stops(fix):
+    from cltk.stop.latin.stops import STOPS_LIST
+    tokens = fix.latin_tokens
+    return lambda: [w for w in tokens if w not in STOPS_LIST]
+
+
+@text_benchmark('greek_stopwords', 'greek_text')
+def bench_greek_stops(fix):
+    from cltk.stop.greek.stops_unicode import STOPS_LIST
+    tokens = fix.greek_tokens
+    return lambda: [w for w in tokens if w not in STOPS_LIST]
+
+
+@text_benchmark('sentence_tokenizer_latin')
+def bench_sentence_tokenizer(fix):
+    from cltk.tokenize.sentence.tokenize_sentences import TokenizeSentence
+    fix.build_punkt('latin', fix.latin_text)
+    tokenizer = TokenizeSentence()
+    return lambda: tokenizer.sentence_tokenizer(fix.latin_text, 'latin')
+
+
+@text_benchmark('sentence_tokenize_corpus_latin', copies=8)
+def bench_sentence_tokenize_corpus(fix):
+    from cltk.tokenize.sentence.tokenize_sentences import TokenizeSentence
+    fix.build_punkt('latin', fix.latin_text)
+    paths = fix.write_docs()
+    tokenizer = TokenizeSentence()
+    return lambda: list(tokenizer.tokenize_corpus(paths, 'latin'))
+
+
+@text_benchmark('punkt_trainer_latin', copies=8)
+def bench_punkt_trainer(fix):
+    from cltk.tokenize.sentence.trainer import train_punkt
+    paths = fix.write_docs()
+    return lambda: train_punkt(paths, 'latin', files_per_chunk=2)
+
+
+@text_benchmark('ngram_count_latin', copies=8)
+def bench_ngram_count(fix):
+    from cltk.corpus.common.ngrams import count_files
+    paths = fix.write_docs()
+    return lambda: count_files(paths, 3, files_per_chunk=2)
+
+
+@text_benchmark('ngram_count_latin_counter', copies=8)
+def bench_ngram_counter(fix):
+    from collections import Counter
+    from cltk.tokenize.word import tokenize_words
+    paths = fix.write_docs()
+
+    def count():
+        counts = Counter()
+        for path in paths:
+            with open(path, encoding='utf-8') as file_open:
+                tokens = tokenize_words(file_open.read())
+            counts.update(zip(tokens, tokens[1:], tokens[2:]))
+        return counts
+    return count
+
+
+def _concordance(fix):
+    from cltk.corpus.common.concordance import build_index
+    from cltk.stem.latin.lemmatizer import LemmaReplacer
+    lemmatizer = LemmaReplacer([(r'\b%s\b' % word, word[:4])
+                                for word in LATIN_WORDS])
+    files = [('doc%d' % number, path)
+             for number, path in enumerate(fix.write_docs())]
+    out_dir = os.path.join(fix.home, 'concordance')
+    return (lambda: build_index(files, out_dir, 'latin',
+                                lemmatizer=lemmatizer),
+            lemmatizer, out_dir)
+
+
+@text_benchmark('concordance_index_latin', copies=8)
+def bench_concordance_index(fix):
+    build, _, _ = _concordance(fix)
+    return build
+
+
+@benchmark('concordance_search_latin')
+def bench_concordance_search(fix):
+    from cltk.corpus.common.concordance import Concordance
+    build, lemmatizer, out_dir = _concordance(fix)
+    build()
+    concordance = Concordance(out_dir, lemmatizer=lemmatizer)
+    queries = LATIN_WORDS[:10]
+
+    def search():
+        for word in queries:
+            concordance.search(word, by='lemma', authors=['doc3'], page=1)
+    return search, len(queries), 0
+
+
+@text_benchmark('text_reuse_latin', copies=4)
+def bench_text_reuse(fix):
+    from cltk.text_reuse.minhash import find_reuse
+    paths = fix.write_docs(n_docs=4)
+    return lambda: find_reuse(paths, 'latin')
+
+
+@text_benchmark('word_tokenizer_latin')
+def bench_word_tokenizer(fix):
+    from cltk.tokenize.word import WordTokenizer
+    tokenizer = WordTokenizer('latin')
+    return lambda: tokenizer.tokenize(fix.latin_text)
+
+
+@text_benchmark('wordpunct_tokenize_latin')
+def bench_wordpunct(fix):
+    from nltk.tokenize import wordpunct_tokenize
+    return lambda: wordpunct_tokenize(fix.latin_text)
+
+
+def _bench_tagger(method_name):
+    def bench(fix):
+        from cltk.tag.pos.pos_tagger import POSTag
+        fix.build_taggers('latin', LATIN_WORDS)
+        tagger = POSTag()
+        method = getattr(tagger, method_name)
+        # Taggers reload their pickle per call, so tag a realistic chunk
+        text = ' '.join(fix.latin_tokens[:2000])
+        return (lambda: method(text, 'latin'), 2000,
+                len(text.encode('utf-8')))
+    return bench
+
+
+for _method in ('unigram_tagger', 'bigram_tagger', 'trigram_tagger',
+                'ngram_123_backoff_tagger', 'tnt_tagger'):
+    benchmark('pos_' + _method)(_bench_tagger(_method))
+
+
+def _bench_compiled(method_name, file_name):
+    def bench(fix):
+        from cltk.tag.pos.compiled import export_ngram
+        bench = _bench_tagger(method_name)(fix)
+        export_ngram(os.path.join(fix.linguistic_dir('latin'), 'taggers',
+                                  'pos', file_name))
+        return bench
+    return bench
+
+
+benchmark('pos_unigram_tagger_compiled')(
+    _bench_compiled('unigram_tagger', 'unigram.pickle'))
+benchmark('pos_ngram_123_backoff_tagger_compiled')(
+    _bench_compiled('ngram_123_backoff_tagger', '123grambackoff.pickle'))
+
+
+@benchmark('pos_tnt_tagger_mapped')
+def bench_tnt_mapped(fix):
+    from cltk.tag.pos.viterbi import export_tnt
+    bench = _bench_tagger('tnt_tagger')(fix)
+    export_tnt(os.path.join(fix.linguistic_dir('latin'), 'taggers', 'pos',
+                            'tnt.pickle'))
+    return bench
+
+
+@benchmark('pos_tnt_viterbi')
+def bench_tnt_viterbi(fix):
+    from cltk.tag.pos.viterbi import ViterbiTagger
+    fix.build_taggers('latin', LATIN_WORDS)
+    path = os.path.join(fix.linguistic_dir('latin'), 'taggers', 'pos',
+                        'tnt.pickle')
+    with open(path, 'rb') as file_open:
+        tagger = ViterbiTagger.from_tnt(pickle.load(file_open))
+    tokens = fix.latin_tokens[:2000]
+    sents = [tokens[i:i + 12] for i in range(0, len(tokens), 12)]
+    return (lambda: tagger.tag_sents(sents), len(tokens),
+            len(' '.join(tokens).encode('utf-8')))
+
+
+def _bench_treebank(cached):
+    def bench(fix):
+        from cltk.corpus.common.treebank import load_treebank
+        path, tokens = fix.build_treebank('latin', LATIN_WORDS)
+        load_treebank(path, cache=cached)
+        return (lambda: load_treebank(path, cache=cached), tokens,
+                os.path.getsize(path))
+    return bench
+
+
+benchmark('treebank_parse')(_bench_treebank(False))
+benchmark('treebank_cached')(_bench_treebank(True))
+
+
+@benchmark('compile_tlg')
+def bench_compile_tlg(fix):
+    from cltk.corpus.common.compiler import Compile
+    tokens, n_bytes = fix.build_corpus('tlg')
+    return (lambda: Compile().compile_tlg_txt(), tokens, n_bytes)
+
+
+@benchmark('compile_phi5')
+def bench_compile_phi5(fix):
+    from cltk.corpus.common.compiler import Compile
+    tokens, n_bytes = fix.build_corpus('phi5')
+    return (lambda: Compile().compile_phi5_txt(), tokens, n_bytes)
+
+
+def run_benchmark(func, fix, repeat=3):
+    """Time one benchmark; return a result dict, or one with ``skipped``
+    set if its dependencies are unavailable.
+    """
+    try:
+        call, tokens, n_bytes = func(fix)
+    except ImportError as err:
+        return {'skipped': str(err)}
+    seconds = min(_timed(call) for _ in range(repeat))
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': seconds,
+            'tokens_per_sec': tokens / seconds,
+            'mb_per_sec': n_bytes / seconds / 2 ** 20,
+            'peak_memory_kb': peak / 1024}
+
+
+def _timed(call):
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def run_all(n_words=20000, repeat=3, only=None):
+    """Run every registered benchmark (or those named in ``only``)."""
+    results = {}
+    for name, func in BENCHMARKS:
+        if only and name not in only:
+            continue
+        with Fixtures(n_words) as fix:
+            results[name] = run_benchmark(func, fix, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Return a list of human-readable regressions against ``baseline``.
+    Throughput may drop, and peak memory may grow, by ``tolerance``.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or 'skipped' in result or 'skipped' in base:
+            continue
+        if result['tokens_per_sec'] < base['tokens_per_sec'] * (1 - tolerance):
+            regressions.append('%s: %.0f tokens/sec (baseline %.0f)' % (
+                name, result['tokens_per_sec'], base['tokens_per_sec']))
+        if result['peak_memory_kb'] > base['peak_memory_kb'] * (1 + tolerance):
+            regressions.append('%s: %.0f KiB peak (baseline %.0f)' % (
+                name, result['peak_memory_kb'], base['peak_memory_kb']))
+    return regressions
+
+
+def import_profile(module):
+    """Import ``module`` in a fresh interpreter under ``-X importtime``.
+    Return its cumulative import time in seconds and the heavy modules it
+    pulled in (other than itself).
+    """
+    heavy = [name for name in HEAVY_MODULES if name != module]
+    code = 'import sys, %s; print(",".join(m for m in %r if m in sys.modules))' \
+        % (module, heavy)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [p for p in [env.get('PYTHONPATH')] if p])
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, env=env, check=True)
+    cumulative = 0
+    for line in proc.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative = int(fields[1]) / 1e6
+    loaded = [name for name in proc.stdout.strip().split(',') if name]
+    return cumulative, loaded
+
+
+def report(results, stream=sys.stdout):
+    """Print a results table."""
+    stream.write('%-32s %14s %10s %12s\n'
+                 % ('benchmark', 'tokens/sec', 'MB/sec', 'peak KiB'))
+    for name, result in sorted(results.items()):
+        if 'skipped' in result:
+            stream.write('%-32s skipped: %s\n' % (name, result['skipped']))
+            continue
+        stream.write('%-32s %14.0f %10.2f %12.0f\n' % (
+            name, result['tokens_per_sec'], result['mb_per_sec'],
+            result['peak_memory_kb']))
+
+
+def main(argv=None):
+    """Command line entry point; exits 1 on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--imports', action='store_true',
+                        help='report per-subpackage import times and exit')
+    args = parser.parse_args(argv)
+    if args.imports:
+        for module in IMPORT_MODULES:
+            seconds, loaded = import_profile(module)
+            print('%-45s %8.1f ms  %s' % (module, seconds * 1000,
+                                          ' '.join(loaded)))
+        return 0
+    results = run_all(args.words, args.repeat, args.only)
+    report(results)
+    if args.save:
+        with open(args.save, 'w') as file_open:
+            json.dump(results, file_open, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file_open:
+            baseline = json.load(file_open)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
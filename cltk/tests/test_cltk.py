@@ -15,6 +15,20 @@ from nltk.tokenize.punkt import PunktWordTokenizer
 import os
 
 
+def _log_from_worker(number):
+    """Pool target for the queue logging test."""
+    import logging
+    logging.getLogger('cltk').info('worker %d', number)
+
+
+def _log_from_fork(number):
+    """Pool target for the forked logging test."""
+    import logging
+    log = logging.getLogger('cltk.test_fork')
+    for record in range(50):
+        log.info('worker %d record %d', number, record)
+
+
 class TestSequenceFunctions(unittest.TestCase):  # pylint: disable=R0904
     """Class for unittest"""
 
@@ -26,6 +40,22 @@ class TestSequenceFunctions(unittest.TestCase):  # pylint: disable=R0904
             c.import_corpus('cltk_greek_linguistic_data')
             c.import_corpus('cltk_latin_linguistic_data')
 
+    def fixtures(self, n_words, taggers=False, punkt=False, **corpora):
+        """Return ``Fixtures`` active until the end of the test, with the
+        Latin POS taggers and Punkt model if asked, and ``corpus=n_files``
+        disk images of ``corpora``.
+        """
+        from cltk.tests.benchmark import Fixtures, LATIN_WORDS
+        fix = Fixtures(n_words=n_words).__enter__()
+        self.addCleanup(fix.__exit__, None, None, None)
+        if taggers:
+            fix.build_taggers('latin', LATIN_WORDS)
+        if punkt:
+            fix.build_punkt('latin', fix.latin_text)
+        for corpus, n_files in corpora.items():
+            fix.build_corpus(corpus, n_files=n_files)
+        return fix
+
     def test_latin_i_u_transform(self):
         """Test conversion of j to i and v to u"""
         j = JVReplacer()
@@ -68,6 +98,714 @@ class TestSequenceFunctions(unittest.TestCase):  # pylint: disable=R0904
         target_unicode = 'ὅπως οὖν μὴ ταὐτὸ '
         self.assertEqual(unicode, target_unicode)
 
+    def test_greek_betacode_shared_table(self):
+        """Replacers share one conversion table, which survives a disk
+        round trip.
+        """
+        from cltk.corpus.greek.beta_to_unicode import conversion_table
+        from cltk.corpus.greek.beta_to_unicode import load_table, save_table
+        import tempfile
+        self.assertIs(Replacer().pattern2, Replacer().pattern2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'beta_table.pickle')
+            save_table(path)
+            self.assertEqual(load_table(path), conversion_table())
+        unicode = Replacer().beta_code(r"""O(/PWS OU)=N MH\ TAU)TO\ """)
+        self.assertEqual(unicode, 'ὅπως οὖν μὴ ταὐτὸ ')
+
+    def test_remove_non_ascii_bytes(self):
+        """The bytes-level filter matches the str-level one, for mmapped
+        files larger than one chunk too.
+        """
+        from cltk.corpus.common import compiler
+        import random
+        import tempfile
+        rand = random.Random(0)
+        data = bytes(rand.randrange(256) for _ in range(5000))
+        expected = compiler.remove_non_ascii(data.decode('latin-1'))
+        self.assertEqual(compiler.remove_non_ascii_bytes(data).decode(),
+                         expected)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'TLG0001.TXT')
+            with open(path, 'wb') as file_open:
+                file_open.write(data)
+            old_chunk = compiler.CHUNK_SIZE
+            compiler.CHUNK_SIZE = 1000
+            try:
+                self.assertEqual(compiler.read_ascii(path).decode(), expected)
+            finally:
+                compiler.CHUNK_SIZE = old_chunk
+
+    def test_work_titles_collected_while_compiling(self):
+        """Titles and byte offsets found during compilation match those
+        found by re-reading the compiled files, also for titles of more
+        than 50 bytes.
+        """
+        from cltk.corpus.common.compiler import Compile, WORK_TITLE_REGEX
+        from cltk.corpus.common.compiler import WORK_TITLE_BYTES_REGEX
+        text = ('λόγος {1Ἰλιὰς ῥαψῳδία πρώτη καὶ δευτέρα}1 ἔπος '
+                '{1\n}1 {1Odyssea}1')
+        self.assertEqual(
+            [(len(text[:match.start()].encode('utf-8')), match.group())
+             for match in WORK_TITLE_REGEX.finditer(text)],
+            [(match.start(), match.group().decode('utf-8'))
+             for match in WORK_TITLE_BYTES_REGEX.finditer(
+                 text.encode('utf-8'))])
+        self.fixtures(200, tlg=2)
+        compiler = Compile()
+        compiler.compile_tlg_txt()
+        for file_name, titles in compiler.works['tlg'].items():
+            self.assertEqual(
+                titles, compiler.read_tlg_author_work_titles(file_name))
+            path = os.path.join(compiler.compiled_files_dir, 'tlg',
+                                file_name + '.txt')
+            with open(path, 'rb') as file_open:
+                data = file_open.read()
+            for offset, title in compiler.work_offsets['tlg'][file_name]:
+                self.assertTrue(
+                    data[offset:].startswith(title.encode('utf-8')))
+        compiler.make_tlg_index_auth_works()
+        offsets_path = os.path.join(compiler.compiled_files_dir, 'tlg',
+                                    'index_work_offsets.txt')
+        self.assertTrue(os.path.isfile(offsets_path))
+
+    def test_compile_session_concurrent(self):
+        """Two corpora compile at once in threads sharing one session, and
+        the session survives pickling for worker processes.
+        """
+        from cltk.corpus.common.compiler import Compile
+        from cltk.corpus.common.session import CompileSession
+        import pickle
+        import threading
+        fix = self.fixtures(400, tlg=3, phi5=3)
+        session = CompileSession(os.path.join(fix.home, 'cltk_data'))
+        threads = [
+            threading.Thread(target=Compile(session).compile_tlg_txt),
+            threading.Thread(target=Compile(session).compile_phi5_txt)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(session.index('tlg')),
+                         ['TLG0000', 'TLG0001', 'TLG0002'])
+        self.assertEqual(len(session.works['phi5']), 3)
+        copy = pickle.loads(pickle.dumps(Compile(session)))
+        self.assertEqual(copy.session.works, session.works)
+        self.assertEqual(copy.read_phi5_index_file_author(),
+                         session.index('phi5'))
+
+    def test_compile_resume_after_crash(self):
+        """A compile killed midway, then rerun, gives the same output as a
+        clean build and does not redo finished files.
+        """
+        from cltk.corpus.common import compiler
+        from cltk.corpus.common.checkpoint import JOURNAL_NAME
+        from cltk.corpus.common.compiler import Compile
+        from cltk.corpus.common.session import CompileSession
+        from unittest import mock
+        import shutil
+        import subprocess
+        import sys
+        crash = '\n'.join([
+            'import os, signal, sys',
+            'from cltk.corpus.common import checkpoint, compiler',
+            'from cltk.corpus.common.session import CompileSession',
+            'calls = []',
+            'def atomic_write(path, data):',
+            '    calls.append(path)',
+            '    # The author index, two author files, then die in the third',
+            '    if len(calls) == 4:',
+            '        with open(checkpoint.partial_path(path), "wb") as f:',
+            '            f.write(data[:10])',
+            '        os.kill(os.getpid(), signal.SIGKILL)',
+            '    checkpoint.atomic_write(path, data)',
+            'compiler.atomic_write = atomic_write',
+            'session = CompileSession(sys.argv[1], log=False)',
+            'compiler.Compile(session).compile_tlg_txt()'])
+
+        def outputs(cltk_data):
+            tlg_dir = os.path.join(cltk_data, 'compiled', 'tlg')
+            result = {}
+            for name in os.listdir(tlg_dir):
+                if name != JOURNAL_NAME and not name.startswith('.part-'):
+                    with open(os.path.join(tlg_dir, name), 'rb') as f:
+                        result[name] = f.read()
+            return result
+
+        fix = self.fixtures(400, tlg=5)
+        cltk_data = os.path.join(fix.home, 'cltk_data')
+        clean = os.path.join(fix.home, 'clean')
+        shutil.copytree(cltk_data, clean)
+        Compile(CompileSession(clean, log=False)).compile_tlg_txt()
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join(sys.path))
+        proc = subprocess.run([sys.executable, '-c', crash, cltk_data],
+                              env=env)
+        self.assertNotEqual(proc.returncode, 0)
+        journal = os.path.join(cltk_data, 'compiled', 'tlg',
+                               JOURNAL_NAME)
+        with open(journal) as file_open:
+            finished = file_open.read().split()
+        self.assertEqual(len(finished), 2)
+        session = CompileSession(cltk_data, log=False)
+        with mock.patch.object(compiler, 'atomic_write',
+                               wraps=compiler.atomic_write) as writer:
+            Compile(session).compile_tlg_txt()
+        written = [os.path.basename(call[0][0])
+                   for call in writer.call_args_list]
+        self.assertEqual(len(written), len(set(written)))
+        for file_name in finished:
+            self.assertNotIn(file_name + '.txt', written)
+        self.assertIn('index_file_author.txt', written)
+        self.assertEqual(outputs(cltk_data), outputs(clean))
+
+    def test_compile_journal_legacy(self):
+        """A filled directory without a journal was compiled before
+        journals were kept and counts as complete; one whose build began
+        with a journal does not until it finishes.
+        """
+        from cltk.corpus.common.checkpoint import CompileJournal
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = os.path.join(tmp, 'legacy')
+            os.makedirs(legacy)
+            with open(os.path.join(legacy, 'LAT0001.txt'), 'w') as file_open:
+                file_open.write('arma')
+            self.assertTrue(CompileJournal(legacy).adopt_legacy())
+            self.assertTrue(CompileJournal(legacy).complete)
+            crashed = os.path.join(tmp, 'crashed')
+            CompileJournal(crashed).begin()
+            with open(os.path.join(crashed, 'LAT0001.txt'), 'w') as file_open:
+                file_open.write('arma')
+            self.assertFalse(CompileJournal(crashed).adopt_legacy())
+            empty = os.path.join(tmp, 'empty')
+            os.makedirs(empty)
+            self.assertFalse(CompileJournal(empty).adopt_legacy())
+
+    def test_shard_plan_and_merge(self):
+        """Shards are balanced by size, and compiling them separately then
+        merging gives the same indexes as one compile.
+        """
+        from cltk.corpus.common import sharding
+        from cltk.corpus.common.compiler import Compile
+        from cltk.corpus.common.session import CompileSession
+        import shutil
+        self.assertEqual(sharding.lpt_schedule({'a': 5, 'b': 4, 'c': 3,
+                                                'd': 3, 'e': 3}, 2),
+                         [(8, ['a', 'd']), (10, ['b', 'c', 'e'])])
+        fix = self.fixtures(800, phi5=6)
+        cltk_data = os.path.join(fix.home, 'cltk_data')
+        orig = os.path.join(cltk_data, 'originals', 'phi5')
+        with open(os.path.join(orig, 'LAT0000.TXT'), 'ab') as file_open:
+            file_open.write(b' arma virumque cano' * 200)
+        clean = os.path.join(fix.home, 'clean')
+        shutil.copytree(cltk_data, clean)
+        Compile(CompileSession(clean, log=False)).compile_phi5_txt()
+        session = CompileSession(cltk_data, log=False)
+        plan = sharding.plan_shards('phi5', 3, session)
+        files = [name for shard in plan['shards']
+                 for name in shard['files']]
+        self.assertEqual(sorted(files), ['LAT%04d' % n for n in range(6)])
+        self.assertEqual(plan['shards'][0]['files'], ['LAT0000'])
+        manifest = os.path.join(fix.home, 'manifest.json')
+        sharding.write_manifest(plan, manifest)
+        for shard in plan['shards']:
+            sharding.run_shard(manifest, shard['id'],
+                               CompileSession(cltk_data, log=False))
+        sharding.merge_shards(manifest,
+                              CompileSession(cltk_data, log=False))
+        for name in ['index_author_works.txt', 'index_work_offsets.txt',
+                     'LAT0003.txt']:
+            paths = [os.path.join(root, 'compiled', 'phi5', name)
+                     for root in (cltk_data, clean)]
+            with open(paths[0]) as first, open(paths[1]) as second:
+                self.assertEqual(first.read(), second.read())
+
+    def test_corpus_cache(self):
+        """A second fetch of a URL is revalidated and linked from the cache
+        without a download; changed content is downloaded again; least
+        recently used objects are evicted.
+        """
+        from cltk.corpus.common.cache import CorpusCache
+        import hashlib
+        import tempfile
+        import time
+        downloads = []
+        versions = {}
+
+        class Response(object):
+            def __init__(self, url, headers=None):
+                self.data = url.encode() * 1000 + versions.get(url, b'')
+                etag = hashlib.sha256(self.data).hexdigest()
+                self.headers = {'ETag': etag}
+                if (headers or {}).get('If-None-Match') == etag:
+                    self.status_code = 304
+                else:
+                    self.status_code = 200
+                    downloads.append(url)
+
+            def raise_for_status(self):
+                pass
+
+            def iter_content(self, size):
+                return [self.data[i:i + size]
+                        for i in range(0, len(self.data), size)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CorpusCache(os.path.join(tmp, 'cache'), max_bytes=25000)
+            first = os.path.join(tmp, 'a', 'corpus.tar.gz')
+            second = os.path.join(tmp, 'b', 'corpus.tar.gz')
+            cache.fetch('http://x/corpus.tar.gz', first, opener=Response)
+            cache.fetch('http://x/corpus.tar.gz', second, opener=Response)
+            self.assertEqual(downloads, ['http://x/corpus.tar.gz'])
+            self.assertEqual(os.stat(first).st_ino, os.stat(second).st_ino)
+            checksum = hashlib.sha256(b'http://x/corpus.tar.gz' * 1000)
+            self.assertIsNotNone(cache.lookup('http://y/mirror.tar.gz',
+                                              checksum.hexdigest()))
+            # The server has a new tarball, or a refresh is forced
+            versions['http://x/corpus.tar.gz'] = b'new'
+            cache.fetch('http://x/corpus.tar.gz', second, opener=Response)
+            with open(second, 'rb') as file_open:
+                self.assertTrue(file_open.read().endswith(b'new'))
+            cache.fetch('http://x/corpus.tar.gz', second, opener=Response,
+                        refresh=True)
+            self.assertEqual(len(downloads), 3)
+            # Without the cache, a linked file is replaced, not rewritten
+            os.environ['CLTK_CACHE'] = '0'
+            try:
+                cache.fetch('http://x/corpus.tar.gz', first, opener=Response)
+            finally:
+                del os.environ['CLTK_CACHE']
+            with open(cache.lookup('http://x/corpus.tar.gz'), 'rb') as \
+                    file_open:
+                self.assertTrue(file_open.read().endswith(b'new'))
+            with self.assertRaises(IOError):
+                cache.fetch('http://x/other.tar.gz', first, checksum='0',
+                            opener=Response)
+            time.sleep(0.01)
+            cache.fetch('http://x/other.tar.gz', first, opener=Response)
+            self.assertIsNone(cache.lookup('http://x/corpus.tar.gz'))
+            self.assertTrue(os.path.isfile(second))
+
+    def test_local_directory_import(self):
+        """A local corpus directory is linked into originals/, skipped when
+        unchanged, and read by the compiler without a tarball.
+        """
+        from cltk.corpus.common.local_import import import_tree
+        from cltk.corpus.data import CorpusData
+        from cltk.corpus.downloader import CorpusCompiler, CorpusImporter
+        fix = self.fixtures(400, phi5=4)
+        disk = os.path.join(fix.home, 'cltk_data', 'originals', 'phi5')
+        corpus = CorpusData('phi5')
+        CorpusImporter(corpus).retrieve(location=disk)
+        self.assertFalse(os.path.exists(
+            os.path.join(corpus.originals_dir(), 'phi5.tar.gz')))
+        imported = os.path.join(corpus.originals_dir(named=True), 'phi5')
+        self.assertEqual(os.stat(os.path.join(imported, 'LAT0001.TXT')),
+                         os.stat(os.path.join(disk, 'LAT0001.TXT')))
+        self.assertEqual(import_tree(disk, imported), {'skipped': 5})
+        seen = []
+        CorpusCompiler(corpus).unpack_tar(
+            lambda name, read, path: seen.append((name, path)))
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen[0], (os.path.join('phi5', 'AUTHTAB.DIR'),
+                                   os.path.join(imported, 'AUTHTAB.DIR')))
+
+    def test_tei_extraction(self):
+        """TEI passages stream out with their citations; notes are dropped
+        and DTD entities resolved; an interrupted file leaves nothing
+        behind.
+        """
+        from cltk.corpus.common import tei
+        from cltk.corpus.common.tei import extract_corpus, iter_tei
+        from unittest import mock
+        import io
+        import tempfile
+        tei_data = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE TEI.2 PUBLIC "-//TEI P4//DTD Main DTD Driver File//EN"
+ "http://www.tei-c.org/Guidelines/DTD/tei2.dtd" [
+<!ENTITY auth "Homer">
+]>
+<TEI.2><teiHeader><title>Iliad, &auth;</title></teiHeader>
+<text><body><div1 type="Book" n="1"><milestone unit="card" n="1"/>
+<l n="1">μῆνιν ἄειδε θεὰ &mdash; Ἀχιλῆος</l>
+<l n="2">οὐλομένην, <note>a note</note>ἣ <hi>μυρί᾽</hi></l>
+</div1><div1 type="Book" n="2"><p>&auth; <lb n="3"/>sang.</p></div1>
+</body></text></TEI.2>'''.encode('utf-8')
+        passages = list(iter_tei(io.BytesIO(tei_data)))
+        self.assertEqual(passages[0].ref, (('book', '1'), ('card', '1'),
+                                           ('line', '1')))
+        self.assertEqual(passages[0].text, 'μῆνιν ἄειδε θεὰ — Ἀχιλῆος')
+        self.assertEqual(passages[1].text, 'οὐλομένην, ἣ μυρί᾽')
+        self.assertEqual(passages[2], ((('book', '2'),), 'Homer sang.'))
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('a.xml', 'b.xml'):
+                with open(os.path.join(tmp, name), 'wb') as file_open:
+                    file_open.write(tei_data)
+            out = os.path.join(tmp, 'plain')
+            results = extract_corpus(tmp, out, processes=2)
+            self.assertEqual(sorted(results.values()), [3, 3])
+            with open(os.path.join(out, 'a.txt')) as file_open:
+                self.assertEqual(file_open.readline(),
+                                 '1.1.1\tμῆνιν ἄειδε θεὰ — Ἀχιλῆος\n')
+
+            def interrupted(path):
+                yield passages[0]
+                raise KeyboardInterrupt
+            with mock.patch.object(tei, 'iter_tei', interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    tei.extract_file(os.path.join(tmp, 'a.xml'),
+                                     os.path.join(out, 'c.txt'))
+            self.assertEqual(sorted(os.listdir(out)), ['a.txt', 'b.txt'])
+
+    def test_treebank_columns_and_cache(self):
+        """Treebank XML loads into arrays and reloads from its cache until
+        the XML changes.
+        """
+        from cltk.corpus.common.treebank import cache_path, load_treebank
+        import tempfile
+        import time
+        xml = '''<?xml version="1.0" encoding="UTF-8"?>
+<treebank version="1.5" xml:lang="grc" format="aldt">
+<sentence id="1" document_id="Perseus:text:1999.01.0133">
+<word id="1" form="μῆνιν" lemma="μῆνις1" postag="n-s---fa-" head="2"
+ relation="OBJ"/>
+<word id="2" form="ἄειδε" lemma="ἀείδω1" postag="v2spma---" head="0"
+ relation="PRED"/>
+</sentence>
+<sentence id="2"><word id="1" form="θεὰ" lemma="θεά1" postag="n-s---fv-"
+ head="0" relation="ExD"/></sentence>
+</treebank>'''
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'iliad.xml')
+            with open(path, 'w') as file_open:
+                file_open.write(xml)
+            treebank = load_treebank(tmp)
+            self.assertEqual(len(treebank), 2)
+            self.assertEqual(treebank.head.tolist(), [2, 0, 0])
+            self.assertEqual(treebank.sent_offsets.tolist(), [0, 2, 3])
+            self.assertEqual(treebank.tagged_sents()[0],
+                             [('μῆνιν', 'n-s---fa-'), ('ἄειδε', 'v2spma---')])
+            self.assertEqual(treebank.relations.tokens,
+                             ['OBJ', 'PRED', 'ExD'])
+            self.assertTrue(os.path.isfile(cache_path(tmp)))
+            cached = load_treebank(tmp)
+            self.assertEqual(cached.words(1), ['θεὰ'])
+            self.assertEqual(cached.lemmas, treebank.lemmas)
+            time.sleep(0.01)
+            with open(path, 'w') as file_open:
+                file_open.write(xml.replace('θεὰ', 'θεά'))
+            self.assertEqual(load_treebank(tmp).words(1), ['θεά'])
+
+    def test_tagger_training_pipeline(self):
+        """Cross-validation runs folds in parallel, and trained models are
+        written where POSTag reads them.
+        """
+        from cltk.tag.pos.train import cross_validate, split_folds, train_all
+        from cltk.tests.benchmark import LATIN_WORDS
+        folds = split_folds(10, 3)
+        self.assertEqual(sorted(sum(folds, [])), list(range(10)))
+        fix = self.fixtures(1200)
+        path, _ = fix.build_treebank('latin', LATIN_WORDS)
+        results = cross_validate(path, ('unigram', 'tnt'), k=2,
+                                 processes=2)
+        self.assertEqual(len(results['tnt']['folds']), 2)
+        self.assertGreater(results['unigram']['accuracy'], 0.9)
+        self.assertGreater(results['unigram']['tokens_per_sec'], 0)
+        train_all(path, 'latin', ('unigram',))
+        tagged = POSTag().unigram_tagger(LATIN_WORDS[0], 'latin')
+        self.assertEqual(tagged[0][0], LATIN_WORDS[0])
+        self.assertIsNotNone(tagged[0][1])
+
+    def test_viterbi_matches_tnt(self):
+        """The numpy decoder gives NLTK's TnT tags, unknown words
+        included, with and without capitalization states.
+        """
+        import random
+        from nltk.tag.tnt import TnT
+        from cltk.tag.pos.viterbi import ViterbiTagger
+        from cltk.tests.benchmark import LATIN_WORDS, TAGS
+        rand = random.Random(7)
+
+        def make_sents(words, n_sents):
+            sents = []
+            for _ in range(n_sents):
+                sent, prev = [], 0
+                for _ in range(rand.randint(1, 15)):
+                    word = rand.choice(words)
+                    prev = (len(word) + prev + rand.randint(0, 1)) % len(TAGS)
+                    sent.append((word, TAGS[prev]))
+                sents.append(sent)
+            return sents
+
+        words = LATIN_WORDS + ['Marcus', 'Tullius', 'Cicero']
+        train = make_sents(words, 400)
+        test = make_sents(words + ['Caesar', 'bellum', 'gallicum'], 60)
+        test_words = [[word for word, _ in sent] for sent in test] + [[]]
+        for capitalization in (False, True):
+            tnt = TnT(C=capitalization)
+            tnt.train(train)
+            expected = [tnt.tag(sent) for sent in test_words]
+            tagger = ViterbiTagger.from_tnt(tnt)
+            self.assertEqual(tagger.tag_sents(test_words, batch_size=16),
+                             expected)
+            self.assertEqual(tagger.tag(test_words[0]), expected[0])
+
+    def test_mapped_tnt_model(self):
+        """An exported TnT model is memory-mapped read-only and tags as
+        the pickle does, also through POSTag, and is exported again when
+        the pickle is replaced.
+        """
+        import numpy
+        from cltk.tag.pos.model_file import StringTable
+        from cltk.tag.pos.viterbi import ViterbiTagger, export_tnt
+        from cltk.tests.benchmark import LATIN_WORDS
+        table = StringTable.from_strings(['et', 'arma', 'cano', 'et'])
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.find('cano'), 1)
+        self.assertEqual(table.find('virum'), -1)
+        self.assertEqual(table.find_all(['et', 'zz', 'arma']).tolist(),
+                         [2, -1, 0])
+        text = 'arma virumque cano troiae qui primus ab oris Caesar'
+        fix = self.fixtures(100, taggers=True)
+        expected = POSTag().tnt_tagger(text, 'latin')
+        pickle_path = os.path.join(fix.linguistic_dir('latin'), 'taggers',
+                                   'pos', 'tnt.pickle')
+        model_dir = export_tnt(pickle_path)
+        self.assertEqual(os.path.basename(model_dir), 'tnt.model')
+        tagger = ViterbiTagger.load(model_dir)
+        self.assertIsInstance(tagger.bigram.base, numpy.memmap)
+        self.assertFalse(tagger.bigram.flags.writeable)
+        self.assertEqual(tagger.tag([word for word, _ in expected]),
+                         expected)
+        self.assertEqual(POSTag().tnt_tagger(text, 'latin'), expected)
+        from unittest import mock
+        from cltk.tag.pos import viterbi
+        with mock.patch.object(viterbi, 'CANDIDATE_CACHE_SIZE', 2):
+            small = ViterbiTagger.load(model_dir)
+        words = [word for word, _ in expected]
+        self.assertEqual(small.tag_sents([words, words]),
+                         [expected, expected])
+        from nltk.tag.tnt import TnT
+        retrained = TnT()
+        retrained.train([[(word, 'x--------') for word in LATIN_WORDS]])
+        fix.write_pickle(retrained, pickle_path)
+        words = [word for word, _ in expected]
+        self.assertEqual(POSTag().tnt_tagger(text, 'latin'),
+                         retrained.tag(words))
+        from cltk.tag.pos.pos_tagger import split_sentences
+        self.assertEqual(split_sentences(['arma', 'cano', '.', 'qui', '?',
+                                          'ab', 'oris'], max_len=2),
+                         [['arma', 'cano'], ['.'], ['qui', '?'],
+                          ['ab', 'oris']])
+        self.assertEqual(POSTag().tnt_tagger('arma cano. qui primus', 'latin'),
+                         retrained.tag(['arma', 'cano', '.']) +
+                         retrained.tag(['qui', 'primus']))
+
+    def test_compiled_backoff_tagger(self):
+        """Compiled n-gram chains tag exactly as the NLTK taggers, before
+        and after a save/load round trip.
+        """
+        import random
+        from nltk.tag import (BigramTagger, DefaultTagger, TrigramTagger,
+                              UnigramTagger)
+        from cltk.tag.pos.compiled import (CompiledTagger, MappedTagger,
+                                           export_ngram)
+        from cltk.tests.benchmark import LATIN_WORDS, TAGS
+        rand = random.Random(3)
+        sents = [[(word, rand.choice(TAGS[:3]) if len(word) > 4 else TAGS[3])
+                  for word in rand.sample(LATIN_WORDS, rand.randint(1, 9))]
+                 for _ in range(300)]
+        train, test = sents[:250], sents[250:]
+        test = [[word for word, _ in sent] for sent in test]
+        test.append(['Caesar', 'et', 'arma', 'Gallia'])
+        unigram = UnigramTagger(train, backoff=DefaultTagger('u--------'))
+        bigram = BigramTagger(train, backoff=unigram)
+        chains = [UnigramTagger(train), unigram, BigramTagger(train),
+                  TrigramTagger(train, backoff=bigram)]
+        fix = self.fixtures(100)
+        for number, chain in enumerate(chains):
+            expected = [chain.tag(sent) for sent in test]
+            compiled = CompiledTagger.from_nltk(chain)
+            self.assertEqual(compiled.tag_sents(test), expected)
+            path = os.path.join(fix.home, 'tagger%d.pickle' % number)
+            fix.write_pickle(chain, path)
+            model_dir = export_ngram(path)
+            loaded = CompiledTagger.load(model_dir)
+            self.assertEqual(loaded.tag_sents(test), expected)
+            self.assertEqual(loaded.tag(test[-1]), expected[-1])
+            mapped = MappedTagger.load(model_dir)
+            self.assertFalse(mapped.levels[-1].flags.writeable)
+            self.assertEqual(mapped.tag_sents(test + [[]]), expected + [[]])
+
+    def test_tokenize_corpus(self):
+        """Documents split on a process pool give the same sentences, in
+        order, as splitting each one in turn.
+        """
+        fix = self.fixtures(3000, punkt=True)
+        tokenizer = TokenizeSentence()
+        texts = [fix.latin_text[number * 500:] for number in range(3)]
+        paths = fix.write_docs(texts)
+        expected = [(path, index, sentence)
+                    for path, text in zip(paths, texts)
+                    for index, sentence in enumerate(
+                        tokenizer.sentence_tokenizer(text, 'latin'))]
+        for workers in (1, 2):
+            self.assertEqual(list(tokenizer.tokenize_corpus(
+                paths, 'latin', workers=workers)), expected)
+
+    def test_punkt_trainer(self):
+        """Training in chunks on a pool gives the same parameters for any
+        number of workers, and writes a pickle TokenizeSentence loads.
+        """
+        from cltk.tokenize.sentence.trainer import train_punkt
+        fix = self.fixtures(6000)
+        text = fix.latin_text + \
+            ' Cn. Pompeius et M. Tullius venerunt.' * 20
+        paths = fix.write_docs([text[number * len(text) // 4:
+                                     (number + 1) * len(text) // 4]
+                                for number in range(4)])
+        serial = train_punkt(paths, 'latin', workers=1,
+                             files_per_chunk=1, block_size=2000)
+        params = train_punkt([fix.home], 'latin', out_path=True,
+                             workers=2, files_per_chunk=1,
+                             block_size=2000)
+        self.assertEqual(params.abbrev_types, serial.abbrev_types)
+        self.assertEqual(params.collocations, serial.collocations)
+        self.assertIn('cn', params.abbrev_types)
+        sentences = TokenizeSentence().sentence_tokenizer(
+            'Cn. Pompeius venit. Et M. Tullius.', 'latin')
+        self.assertEqual(sentences, ['Cn. Pompeius venit.',
+                                     'Et M. Tullius.'])
+
+    def test_ngram_counts(self):
+        """Spilled, merged n-gram counts match collections.Counter, for
+        any number of workers; the sketch never undercounts; ids too wide
+        for their bits are refused.
+        """
+        from collections import Counter
+        from cltk.corpus.common.ngrams import CountMinSketch, NgramCounter
+        from cltk.corpus.common.ngrams import count_files
+        from cltk.tokenize.word import tokenize_words
+        fix = self.fixtures(3000)
+        texts = [fix.latin_text[number * 3000:(number + 1) * 3000]
+                 for number in range(5)]
+        paths = fix.write_docs(texts)
+        expected = Counter()
+        for text in texts:
+            tokens = tokenize_words(text)
+            expected.update(zip(tokens, tokens[1:]))
+        serial = count_files(paths, 2, workers=1, files_per_chunk=2,
+                             buffer_size=100)
+        counts = count_files(paths, 2, workers=2, files_per_chunk=2,
+                             buffer_size=100,
+                             out_path=os.path.join(fix.home, 'bigrams'))
+        self.assertEqual(dict(counts.items()), dict(expected))
+        self.assertEqual(counts.keys.tolist(), serial.keys.tolist())
+        self.assertEqual(counts.most_common(1), expected.most_common(1))
+        sketch = count_files(paths, 2, files_per_chunk=2,
+                             sketch=CountMinSketch(64, 3))
+        self.assertTrue((sketch.query(counts.keys) >=
+                         counts.counts).all())
+        with self.assertRaises(ValueError):
+            NgramCounter(2, bits=4).add([1, 17, 2])
+
+    def test_concordance(self):
+        """A positional index of a compiled corpus finds surface forms,
+        lemmata and stems, filtered by author, with context.
+        """
+        from cltk.corpus.common.compiler import Compile
+        from cltk.corpus.common.concordance import Concordance, index_corpus
+        from cltk.stem.latin.lemmatizer import LemmaReplacer
+        import re
+        fix = self.fixtures(2000, phi5=2)
+        Compile().compile_phi5_txt()
+        lemmatizer = LemmaReplacer([(r'\bmercaturis\b', 'mercatura')])
+        concordance = Concordance(index_corpus('phi5',
+                                               lemmatizer=lemmatizer),
+                                  lemmatizer=lemmatizer)
+        path = os.path.join(fix.home, 'cltk_data', 'compiled', 'phi5',
+                            'LAT0001.txt')
+        with open(path, encoding='utf-8') as file_open:
+            expected = len(re.findall(r'\bmercaturis\b',
+                                      file_open.read()))
+        self.assertEqual(concordance.count('Mercaturis',
+                                           authors=['LAT0001']),
+                         expected)
+        page = concordance.search('mercatura', by='lemma', context=2,
+                                  page_size=5)
+        self.assertEqual(page.total, concordance.count('mercaturis'))
+        self.assertEqual(page.total, concordance.count('mercaturis',
+                                                       by='stem'))
+        self.assertEqual(len(page.hits), 5)
+        hit = page.hits[0]
+        self.assertEqual(hit.keyword, 'mercaturis')
+        self.assertEqual(len(hit.left.split()), 2)
+        self.assertEqual(hit.work, '{1TITLE 0}1')
+
+    def test_text_reuse(self):
+        """A passage copied between two files is found, whatever its
+        accents, with the same result serially and in parallel.
+        """
+        from cltk.text_reuse.minhash import find_reuse
+        import random
+        import tempfile
+        rand = random.Random(0)
+        letters = 'αβγδεζηθικλμνξοπρστυφχψω'
+        vocab = [''.join(rand.choice(letters) for _ in range(6))
+                 for _ in range(2000)]
+        shared = [rand.choice(vocab) for _ in range(100)]
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for number in range(4):
+                words = [rand.choice(vocab) for _ in range(1000)]
+                if number == 1:
+                    words[300:300] = shared
+                elif number == 3:
+                    words[500:500] = [word.upper() + '\u0301'
+                                      for word in shared]
+                path = os.path.join(tmp, 'doc%d.txt' % number)
+                with open(path, 'w', encoding='utf-8') as file_open:
+                    file_open.write(' '.join(words))
+                paths.append(path)
+            matches = find_reuse(paths, 'greek', workers=1)
+            self.assertEqual(find_reuse(paths, 'greek', workers=2), matches)
+        self.assertEqual(len(matches), 1)
+        match = matches[0]
+        self.assertEqual((match.a.doc, match.b.doc), (paths[1], paths[3]))
+        self.assertEqual(match.similarity, 1.0)
+        self.assertLessEqual(match.a.start, 300)
+        self.assertGreaterEqual(match.a.end, 400)
+
+    def test_word_tokenizer(self):
+        """Latin enclitics are split off, with offsets; Greek elided
+        words keep their apostrophe.
+        """
+        from cltk.tokenize.word import Token, WordTokenizer, tokenize_words
+        tokenizer = WordTokenizer('latin')
+        text = 'Arma virumque cano. Estne bene? Plusve atque omne, itaque'
+        self.assertEqual(tokenizer.tokenize(text),
+                         ['Arma', 'virum', '-que', 'cano', '.', 'Est', '-ne',
+                          'bene', '?', 'Plus', '-ve', 'atque', 'omne', ',',
+                          'itaque'])
+        tokens = tokenizer.tokenize_offsets(text)
+        self.assertEqual(tokens[1:3], [Token('virum', 5, 10),
+                                       Token('-que', 10, 13)])
+        for token in tokens:
+            self.assertEqual(text[token.start:token.end],
+                             token.text.lstrip('-'))
+        self.assertEqual(list(tokenizer.tokenize_many(['et arma', 'ne'])),
+                         [['et', 'arma'], ['ne']])
+        # Only the words that may end in an enclitic are remembered, and
+        # tokenizing again gives the same splits
+        self.assertEqual(tokenizer.cache_size(), 8)
+        self.assertEqual(tokenize_words(text), tokenizer.tokenize(text))
+        self.assertEqual(tokenize_words(text), tokenizer.tokenize(text))
+        tokenizer.tokenize('et arma cano et arma')
+        self.assertEqual(tokenizer.cache_size(), 8)
+        self.assertEqual(tokenize_words('τῶνδ᾽ ἀπαλλαγὴν πόνων·', 'greek'),
+                         ['τῶνδ᾽', 'ἀπαλλαγὴν', 'πόνων', '·'])
+
     def test_latin_stemmer(self):
         """Test Latin stemmer."""
         cato = 'Est interdum praestare mercaturis rem quaerere, nisi tam periculosum sit.'
@@ -78,6 +816,32 @@ class TestSequenceFunctions(unittest.TestCase):  # pylint: disable=R0904
         target = 'est interd praestar mercatur r quaerere, nisi tam periculos sit. '
         self.assertEqual(stemmed_text, target)
 
+    def test_type_map(self):
+        """Per-word normalizers run once per type give the same result
+        as on every token, for lists and numpy arrays.
+        """
+        from cltk.stop.latin.stops import STOPS_LIST
+        from cltk.vocab import TypeMap, map_types
+        import numpy
+        text = 'arma virumque cano et arma cano et virum'
+        tokens = text.split(' ')
+        calls = []
+
+        def stem_word(word):
+            calls.append(word)
+            return Stemmer().stem_word(word)
+        stem = TypeMap(stem_word)
+        self.assertEqual(stem(tokens).tolist(), Stemmer().stem(text).split())
+        self.assertEqual(stem(numpy.array(tokens)).tolist(),
+                         stem(tokens).tolist())
+        self.assertEqual(sorted(calls), sorted(set(tokens)))
+        self.assertEqual(stem.get('arma'), 'arm')
+        replaced = map_types(JVReplacer().replace, ['iam', 'vem'])
+        self.assertEqual(replaced.tolist(), ['iam', 'uem'])
+        is_stop = map_types(STOPS_LIST.__contains__, tokens, dtype=bool)
+        self.assertEqual(is_stop.dtype, numpy.bool_)
+        self.assertEqual(numpy.flatnonzero(is_stop).tolist(), [3, 6])
+
     def test_import_cltk_linguistic_data_greek(self):
         """Import CLTK linguistic data to ~/cltk_data/greek/"""
         rel_path = '~/cltk_data/greek/cltk_linguistic_data/'
@@ -166,6 +930,132 @@ class TestSequenceFunctions(unittest.TestCase):  # pylint: disable=R0904
         tagged = p.ngram_123_backoff_tagger('Gallia est omnis divisa in partes tres', 'latin')
         self.assertTrue(tagged)
 
+    def test_benchmark_harness(self):
+        """Run benchmarks on synthetic fixtures and flag regressions."""
+        from cltk.tests.benchmark import run_all, compare
+        results = run_all(n_words=500, repeat=1,
+                          only=['beta_code', 'jv_replacer'])
+        self.assertGreater(results['beta_code']['tokens_per_sec'], 0)
+        faster = {name: dict(result, tokens_per_sec=result['tokens_per_sec'] * 10)
+                  for name, result in results.items()}
+        self.assertEqual(compare(results, results), [])
+        self.assertEqual(len(compare(results, faster)), 2)
+
+    def test_instrument_export(self):
+        """Timers, counters and histograms export to JSON and Prometheus."""
+        from cltk.instrument import Instrument
+        import json
+        inst = Instrument(enabled=True)
+        inst.profile('work')
+        with inst.timer('work'):
+            sum(range(1000))
+        inst.count('bytes_read', 10)
+        snap = json.loads(inst.to_json())
+        self.assertEqual(snap['counters'], {'bytes_read': 10})
+        self.assertEqual(snap['stages']['work']['count'], 1)
+        prom = inst.to_prometheus()
+        self.assertIn('cltk_bytes_read_total 10', prom)
+        self.assertIn('cltk_stage_seconds_count{stage="work"} 1', prom)
+        self.assertTrue(inst.profile_stats().total_calls)
+        disabled = Instrument(enabled=False)
+        disabled.count('bytes_read')
+        with disabled.timer('work'):
+            pass
+        self.assertEqual(disabled.snapshot(), {'counters': {}, 'stages': {}})
+
+    def test_queue_logging_json(self):
+        """Records from this process and pool workers reach one JSON log."""
+        from cltk.corpus.wrappers.logger import JSONFormatter, file_handler
+        from cltk.corpus.wrappers.logger import queue_initializer
+        from cltk.corpus.wrappers.logger import start_queue_logging
+        from cltk.corpus.wrappers.logger import stop_listener
+        import json
+        import logging
+        import multiprocessing
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'logs', 'cltk.log')
+            handler = file_handler(path, max_bytes=1024 * 1024, backup_count=2)
+            handler.setFormatter(JSONFormatter())
+            log = logging.getLogger('cltk.test_queue')
+            log.propagate = False
+            queue, listener = start_queue_logging(log, [handler],
+                                                  level=logging.INFO)
+            log.info('compiled %s', 'TLG0001', extra={'corpus': 'tlg'})
+            with multiprocessing.Pool(2, queue_initializer, (queue,)) as pool:
+                pool.map(_log_from_worker, range(2))
+            stop_listener(listener)
+            stop_listener(listener)
+            handler.close()
+            with open(path) as file_open:
+                records = [json.loads(line) for line in file_open]
+        self.assertEqual(records[0]['message'], 'compiled TLG0001')
+        self.assertEqual(records[0]['corpus'], 'tlg')
+        self.assertEqual(sorted(r['message'] for r in records[1:]),
+                         ['worker 0', 'worker 1'])
+
+    def test_lazy_logging_fork(self):
+        """Workers forked without ``queue_initializer`` log through the
+        parent's queue, so no record is lost to concurrent rotation.
+        """
+        from cltk.corpus.wrappers.logger import LazyQueueHandler, file_handler
+        import glob
+        import logging
+        import multiprocessing
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cltk.log')
+            handler = LazyQueueHandler(
+                [file_handler(path, max_bytes=2000, backup_count=1000)])
+            log = logging.getLogger('cltk.test_fork')
+            log.propagate = False
+            log.setLevel(logging.INFO)
+            log.addHandler(handler)
+            try:
+                pool = multiprocessing.get_context('fork').Pool(4)
+                pool.map(_log_from_fork, range(8))
+                pool.close()
+                pool.join()
+                handler.stop()
+            finally:
+                log.removeHandler(handler)
+                handler.handlers[0].close()
+            n_records = 0
+            for log_path in glob.glob(path + '*'):
+                with open(log_path) as file_open:
+                    n_records += len(file_open.readlines())
+        self.assertEqual(n_records, 8 * 50)
+
+    def test_log_level(self):
+        """An unknown ``CLTK_LOG_LEVEL`` falls back to INFO."""
+        from cltk.corpus.wrappers.logger import log_level
+        import logging
+        import warnings
+        from unittest import mock
+        with mock.patch.dict(os.environ, {'CLTK_LOG_LEVEL': 'verbose'}):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(log_level(), logging.INFO)
+            self.assertEqual(len(caught), 1)
+        with mock.patch.dict(os.environ, {'CLTK_LOG_LEVEL': 'debug'}):
+            self.assertEqual(log_level(), logging.DEBUG)
+
+    def test_import_time(self):
+        """Importing a subpackage must not load requests, nltk or TLS,
+        nor start the logging thread.
+        """
+        from cltk.tests.benchmark import IMPORT_MODULES, import_profile
+        import subprocess
+        import sys
+        for module in IMPORT_MODULES:
+            seconds, loaded = import_profile(module)
+            self.assertEqual(loaded, [], module)
+            self.assertLess(seconds, 1.0, module)
+        threads = subprocess.check_output(
+            [sys.executable, '-c', 'import threading, cltk.corpus.downloader;'
+             ' print(threading.active_count())'])
+        self.assertEqual(threads.strip(), b'1')
+
 
 if __name__ == '__main__':
     unittest.main()
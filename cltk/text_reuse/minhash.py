@@ -0,0 +1,392 @@
+"""Find passages shared between authors with MinHash and LSH.
+
+Each file is tokenized and normalized (Beta Code converted if asked,
+accents and case folded, j/v replaced by i/u for Latin), and every run of
+``shingle_size`` words is hashed to a 64-bit *shingle*. Passages are
+windows of ``window`` words every ``stride`` words. A passage's MinHash
+signature holds, for each of ``num_perm`` hash functions, the smallest
+hash of its shingles: the fraction of equal values in two signatures
+estimates the Jaccard similarity of their shingle sets. Signatures are
+computed with ``numpy`` a block of ``stride`` shingles at a time, so each
+window's minimum is the minimum of its blocks.
+
+Signatures are cut into ``bands``; passages whose band values agree in
+some band land in the same bucket and become candidate pairs, so no two
+files are ever compared directly. Candidates are then verified by their
+estimated similarity and, optionally, their exact Jaccard similarity,
+and overlapping matches are merged::
+
+    index = ReuseIndex('greek')
+    index.add_files(glob.glob('compiled/tlg/TLG*.txt'), workers=16)
+    for match in index.matches(threshold=0.5):
+        print(match.a.doc, match.b.doc, match.similarity)
+
+Files are processed in parallel; the shingles are kept in a work
+directory, and each verified passage reads its slice back from there.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from collections import namedtuple
+import hashlib
+from itertools import combinations
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+
+import numpy
+
+# Letters with their combining diacritics; numbers and markup are skipped
+LETTERS = re.compile(r'(?:[^\W\d_]|[\u0300-\u036f])+')
+MIX = numpy.uint64(0x9E3779B97F4A7C15)
+
+Passage = namedtuple('Passage', ['doc', 'start', 'end', 'char_start',
+                                 'char_end'])
+Match = namedtuple('Match', ['a', 'b', 'similarity'])
+
+
+class Normalizer(object):
+    """Fold words to the form compared across texts, once per word."""
+
+    def __init__(self, language):
+        self.language = language
+        self._cache = {}
+        self._jv = None
+        if language == 'latin':
+            from cltk.stem.latin.j_and_v_converter import JVReplacer
+            self._jv = JVReplacer()
+
+    def fold(self, word):
+        """Strip accents and breathings, lowercase, and for Latin replace
+        j/v with i/u.
+        """
+        word = ''.join(char for char in unicodedata.normalize('NFD', word)
+                       if not unicodedata.combining(char)).lower()
+        if self.language == 'greek':
+            word = word.replace('ς', 'σ')
+        elif self._jv is not None:
+            word = self._jv.replace(word)
+        return word
+
+    def hash(self, word):
+        """Return a 64-bit hash of the folded ``word``, the same in every
+        process.
+        """
+        value = self._cache.get(word)
+        if value is None:
+            digest = hashlib.blake2b(self.fold(word).encode('utf-8'),
+                                     digest_size=8).digest()
+            value = self._cache[word] = int.from_bytes(digest, 'little')
+        return value
+
+
+def shingle(hashes, size):
+    """Combine each run of ``size`` word hashes into one shingle hash."""
+    count = len(hashes) - size + 1
+    if count <= 0:
+        return numpy.zeros(0, dtype=numpy.uint64)
+    shingles = hashes[:count].copy()
+    for offset in range(1, size):
+        shingles *= MIX
+        shingles ^= hashes[offset:offset + count]
+    return shingles
+
+
+def _permutations(num_perm, seed):
+    rand = numpy.random.RandomState(seed)
+    multipliers = rand.randint(0, 1 << 62, size=num_perm,
+                               dtype=numpy.int64).astype(numpy.uint64)
+    multipliers = multipliers * numpy.uint64(2) + numpy.uint64(1)
+    offsets = rand.randint(0, 1 << 62, size=num_perm,
+                           dtype=numpy.int64).astype(numpy.uint64)
+    return multipliers, offsets
+
+
+def block_minhash(shingles, block_size, multipliers, offsets,
+                  chunk_blocks=1024):
+    """Return the MinHash of each block of ``block_size`` consecutive
+    shingles, as a ``(blocks, num_perm)`` uint32 array.
+    """
+    num_perm = len(multipliers)
+    n_blocks = -(-len(shingles) // block_size)
+    out = numpy.empty((n_blocks, num_perm), dtype=numpy.uint32)
+    step = chunk_blocks * block_size
+    shift = numpy.uint64(32)
+    for first in range(0, len(shingles), step):
+        chunk = shingles[first:first + step]
+        values = ((chunk[:, None] * multipliers + offsets) >> shift).astype(
+            numpy.uint32)
+        starts = numpy.arange(0, len(chunk), block_size)
+        block = first // block_size
+        out[block:block + len(starts)] = numpy.minimum.reduceat(values,
+                                                                starts)
+    return out
+
+
+def _hash_file(args):
+    """Tokenize, shingle and MinHash one file. Returns the passage
+    table and signatures; the shingles are saved to ``shingle_path`` as
+    raw little-endian uint64.
+    """
+    (path, language, beta_code, shingle_size, window, stride, num_perm,
+     seed, shingle_path) = args
+    with open(path, encoding='utf-8', errors='replace') as file_open:
+        text = file_open.read()
+    if beta_code:
+        from cltk.corpus.greek.beta_to_unicode import Replacer
+        text = Replacer().beta_code(text)
+    normalizer = Normalizer(language)
+    hashes, starts, ends = [], [], []
+    for match in LETTERS.finditer(text):
+        hashes.append(normalizer.hash(match.group()))
+        starts.append(match.start())
+        ends.append(match.end())
+    hashes = numpy.array(hashes, dtype=numpy.uint64)
+    shingles = shingle(hashes, shingle_size)
+    shingles.astype('<u8').tofile(shingle_path)
+    if not len(shingles):
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        return (empty, empty, empty, empty,
+                numpy.zeros((0, num_perm), dtype=numpy.uint32))
+    blocks = block_minhash(shingles, stride, *_permutations(num_perm, seed))
+    span = max(1, window // stride)
+    n_passages = max(1, len(blocks) - span + 1)
+    signatures = blocks[:n_passages].copy()
+    for offset in range(1, min(span, len(blocks))):
+        numpy.minimum(signatures, blocks[offset:offset + n_passages],
+                      out=signatures)
+    first = numpy.arange(n_passages, dtype=numpy.int64) * stride
+    last = numpy.minimum(first + span * stride, len(shingles)) + \
+        shingle_size - 1
+    starts = numpy.array(starts, dtype=numpy.int64)
+    ends = numpy.array(ends, dtype=numpy.int64)
+    return first, last, starts[first], ends[last - 1], signatures
+
+
+def _band_keys(signatures, bands):
+    """Hash each band of each signature to one uint64."""
+    rows = signatures.shape[1] // bands
+    keys = numpy.empty((len(signatures), bands), dtype=numpy.uint64)
+    for band in range(bands):
+        key = numpy.full(len(signatures), band, dtype=numpy.uint64)
+        for column in range(band * rows, (band + 1) * rows):
+            key *= MIX
+            key ^= signatures[:, column].astype(numpy.uint64)
+        keys[:, band] = key
+    return keys
+
+
+class ReuseIndex(object):
+    """MinHash signatures of the passages of a set of files."""
+
+    def __init__(self, language='greek', shingle_size=3, window=40,
+                 stride=20, num_perm=48, bands=12, seed=0, beta_code=False,
+                 work_dir=None):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.language = language
+        self.shingle_size = shingle_size
+        self.window = window
+        self.stride = stride
+        self.num_perm = num_perm
+        self.bands = bands
+        self.seed = seed
+        self.beta_code = beta_code
+        self._own_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='cltk_reuse_')
+        self.docs = []
+        # One row per passage
+        self.passage_doc = numpy.zeros(0, dtype=numpy.int64)
+        self.passage_first = numpy.zeros(0, dtype=numpy.int64)
+        self.passage_last = numpy.zeros(0, dtype=numpy.int64)
+        self.char_starts = numpy.zeros(0, dtype=numpy.int64)
+        self.char_ends = numpy.zeros(0, dtype=numpy.int64)
+        self.signatures = numpy.zeros((0, num_perm), dtype=numpy.uint32)
+
+    def close(self):
+        """Delete the work directory if this index made it."""
+        if self._own_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def __len__(self):
+        """Number of passages."""
+        return len(self.passage_doc)
+
+    def _shingle_path(self, doc_id):
+        return os.path.join(self.work_dir, 'shingles-%d.u64' % doc_id)
+
+    def add_files(self, paths, workers=None):
+        """Hash the passages of the UTF-8 files ``paths`` on ``workers``
+        processes.
+        """
+        paths = list(paths)
+        first_doc = len(self.docs)
+        jobs = [(path, self.language, self.beta_code, self.shingle_size,
+                 self.window, self.stride, self.num_perm, self.seed,
+                 self._shingle_path(first_doc + number))
+                for number, path in enumerate(paths)]
+        if workers == 1 or len(jobs) < 2:
+            results = list(map(_hash_file, jobs))
+        else:
+            import multiprocessing
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.map(_hash_file, jobs, chunksize=1)
+        self.docs.extend(paths)
+        columns = [[self.passage_doc], [self.passage_first],
+                   [self.passage_last], [self.char_starts],
+                   [self.char_ends], [self.signatures]]
+        for number, result in enumerate(results):
+            columns[0].append(numpy.full(len(result[0]), first_doc + number,
+                                         dtype=numpy.int64))
+            for column, values in zip(columns[1:], result):
+                column.append(values)
+        (self.passage_doc, self.passage_first, self.passage_last,
+         self.char_starts, self.char_ends, self.signatures) = [
+             numpy.concatenate(column) for column in columns]
+
+    def passage(self, index):
+        """Return passage ``index`` as a ``Passage``."""
+        return Passage(self.docs[self.passage_doc[index]],
+                       int(self.passage_first[index]),
+                       int(self.passage_last[index]),
+                       int(self.char_starts[index]),
+                       int(self.char_ends[index]))
+
+    def candidates(self, max_bucket=50, same_doc=False):
+        """Return the pairs of passage indexes (two arrays, first < second)
+        sharing a bucket in some band. Buckets with more than
+        ``max_bucket`` passages (formulae, boilerplate) are skipped.
+        """
+        keys = _band_keys(self.signatures, self.bands)
+        docs = self.passage_doc
+        pairs = []
+        for band in range(self.bands):
+            column = keys[:, band]
+            order = numpy.argsort(column, kind='stable')
+            sorted_keys = column[order]
+            starts = numpy.flatnonzero(numpy.concatenate(
+                ([True], sorted_keys[1:] != sorted_keys[:-1])))
+            sizes = numpy.diff(numpy.append(starts, len(order)))
+            for start, size in zip(starts[(sizes > 1) &
+                                          (sizes <= max_bucket)].tolist(),
+                                   sizes[(sizes > 1) &
+                                         (sizes <= max_bucket)].tolist()):
+                members = order[start:start + size].tolist()
+                pairs.extend(combinations(sorted(members), 2))
+        if not pairs:
+            empty = numpy.zeros(0, dtype=numpy.int64)
+            return empty, empty
+        pairs = numpy.unique(numpy.array(pairs, dtype=numpy.int64), axis=0)
+        first, second = pairs[:, 0], pairs[:, 1]
+        if not same_doc:
+            keep = docs[first] != docs[second]
+            first, second = first[keep], second[keep]
+        return first, second
+
+    def estimate(self, first, second, chunk=1 << 16):
+        """Return the MinHash estimate of the Jaccard similarity of each
+        pair of passages.
+        """
+        out = numpy.empty(len(first), dtype=numpy.float64)
+        for start in range(0, len(first), chunk):
+            a = self.signatures[first[start:start + chunk]]
+            b = self.signatures[second[start:start + chunk]]
+            out[start:start + chunk] = (a == b).mean(axis=1)
+        return out
+
+    def _passage_shingles(self, index):
+        """Read the distinct shingles of passage ``index`` from its file,
+        which is not kept open.
+        """
+        first = int(self.passage_first[index])
+        last = int(self.passage_last[index]) - self.shingle_size + 1
+        shingles = numpy.fromfile(
+            self._shingle_path(int(self.passage_doc[index])), dtype='<u8',
+            count=last - first, offset=first * 8)
+        return numpy.unique(shingles.astype(numpy.uint64))
+
+    def jaccard(self, first, second):
+        """Exact Jaccard similarity of the shingles of two passages."""
+        a = self._passage_shingles(first)
+        b = self._passage_shingles(second)
+        shared = len(numpy.intersect1d(a, b, assume_unique=True))
+        return shared / float(len(a) + len(b) - shared or 1)
+
+    def matches(self, threshold=0.5, exact=True, merge=True,
+                max_bucket=50, same_doc=False):
+        """Return verified ``Match``es: candidate pairs whose estimated
+        (and, if ``exact``, exact) similarity is at least ``threshold``.
+        With ``merge``, overlapping matches between the same two files are
+        joined.
+        """
+        first, second = self.candidates(max_bucket, same_doc)
+        similarity = self.estimate(first, second)
+        # The estimate is noisy; verify anything near the threshold
+        keep = similarity >= threshold * 0.75 if exact else \
+            similarity >= threshold
+        found = []
+        for a, b, estimate in zip(first[keep].tolist(),
+                                  second[keep].tolist(),
+                                  similarity[keep].tolist()):
+            if exact:
+                estimate = self.jaccard(a, b)
+                if estimate < threshold:
+                    continue
+            found.append((a, b, estimate))
+        if merge:
+            return self._merge(found)
+        return [Match(self.passage(a), self.passage(b), estimate)
+                for a, b, estimate in found]
+
+    def _merge(self, found):
+        """Join matches between the same two files whose passages overlap
+        on both sides.
+        """
+        docs = self.passage_doc
+        found.sort(key=lambda item: (docs[item[0]], docs[item[1]], item[0],
+                                     item[1]))
+        merged = []
+        for a, b, similarity in found:
+            if merged:
+                a0, a1, b0, b1, best = merged[-1]
+                if docs[a] == docs[a0] and docs[b] == docs[b0] and \
+                        self.passage_first[a] < self.passage_last[a1] and \
+                        self.passage_first[b] < self.passage_last[b1] and \
+                        self.passage_last[b] > self.passage_first[b0]:
+                    merged[-1] = (a0, max(a1, a, key=self._end),
+                                  min(b0, b, key=self._start),
+                                  max(b1, b, key=self._end),
+                                  max(best, similarity))
+                    continue
+            merged.append((a, a, b, b, similarity))
+        return [Match(self._span(a0, a1), self._span(b0, b1), similarity)
+                for a0, a1, b0, b1, similarity in merged]
+
+    def _start(self, index):
+        return self.passage_first[index]
+
+    def _end(self, index):
+        return self.passage_last[index]
+
+    def _span(self, first, last):
+        return Passage(self.docs[self.passage_doc[first]],
+                       int(self.passage_first[first]),
+                       int(self.passage_last[last]),
+                       int(self.char_starts[first]),
+                       int(self.char_ends[last]))
+
+
+def find_reuse(paths, language='greek', workers=None, threshold=0.5,
+               **options):
+    """Return the passages shared between the files ``paths`` as merged
+    ``Match``es; ``options`` go to ``ReuseIndex``.
+    """
+    index = ReuseIndex(language, **options)
+    try:
+        index.add_files(paths, workers)
+        return index.matches(threshold)
+    finally:
+        index.close()
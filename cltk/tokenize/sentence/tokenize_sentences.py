@@ -1,13 +1,120 @@
-"""Tokenizes sentences."""
+"""Tokenizes sentences.
+
+The Punkt parameters of a language are read from its pickle once per
+process and reused. ``tokenize_corpus()`` splits many documents on a
+process pool: the parameters are loaded once in the parent and handed
+to each worker when it starts (inherited for free under ``fork``,
+pickled once per worker otherwise), and sentences come back as a stream
+of ``(doc_id, sentence_index, sentence)`` records in document order::
+
+    for doc_id, index, sentence in TokenizeSentence().tokenize_corpus(
+            paths, 'latin', workers=8):
+        ...
+"""
 
 __author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
 __license__ = 'MIT License. See LICENSE.'
 
 import pickle
-from nltk.tokenize.punkt import PunktLanguageVars
-from nltk.tokenize.punkt import PunktSentenceTokenizer
 import os
 
+PICKLE_PATHS = {
+    'greek': '~/cltk_data/greek/cltk_linguistic_data/tokenizers/sentence/greek.pickle',  # pylint: disable=C0301
+    'latin': '~/cltk_data/latin/cltk_linguistic_data/tokenizers/sentence/latin.pickle'}  # pylint: disable=C0301
+# language -> (sent_end_chars, internal_punctuation)
+PUNCTUATION = {'greek': (('.', ';'), (',', '·')),
+               'latin': (('.', '?', ':'), (',', ';'))}
+
+# language -> ((st_ino, st_mtime_ns) of the pickle, PunktParameters)
+_PARAMS = {}
+# language -> (PunktParameters, PunktSentenceTokenizer)
+_TOKENIZERS = {}
+# language -> PunktLanguageVars subclass
+_LANGUAGE_VARS = {}
+
+
+def language_vars(language):
+    """Return ``PunktLanguageVars`` with the sentence-final and internal
+    punctuation of ``language``.
+    """
+    cls = _LANGUAGE_VARS.get(language)
+    if cls is None:
+        from nltk.tokenize.punkt import PunktLanguageVars
+        sent_end_chars, internal_punctuation = PUNCTUATION[language]
+        # PunktLanguageVars has __slots__, so it is customized by
+        # subclassing
+        cls = _LANGUAGE_VARS[language] = type(
+            language.capitalize() + 'PunktLanguageVars',
+            (PunktLanguageVars,),
+            {'__slots__': (), 'sent_end_chars': sent_end_chars,
+             'internal_punctuation': internal_punctuation})
+    return cls()
+
+
+def load_params(language):
+    """Return the Punkt parameters of ``language``, reading its pickle
+    only when it is new or has changed.
+    """
+    if language not in PICKLE_PATHS:
+        raise ValueError('No sentence tokenizer for %r' % language)
+    pickle_path = os.path.expanduser(PICKLE_PATHS[language])
+    stat = os.stat(pickle_path)
+    stamp = (stat.st_ino, stat.st_mtime_ns)
+    cached = _PARAMS.get(language)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(pickle_path, 'rb') as open_pickle:
+        tokenizer = pickle.load(open_pickle)
+    tokenizer.INCLUDE_ALL_COLLOCS = True
+    tokenizer.INCLUDE_ABBREV_COLLOCS = True
+    params = tokenizer.get_params()
+    _PARAMS[language] = (stamp, params)
+    return params
+
+
+def sentence_splitter(language, params=None):
+    """Return a ``PunktSentenceTokenizer`` for ``language``, built once
+    per set of parameters.
+    """
+    if params is None:
+        params = load_params(language)
+    cached = _TOKENIZERS.get(language)
+    if cached is not None and cached[0] is params:
+        return cached[1]
+    from nltk.tokenize.punkt import PunktSentenceTokenizer
+    sbd = PunktSentenceTokenizer(params, lang_vars=language_vars(language))
+    _TOKENIZERS[language] = (params, sbd)
+    return sbd
+
+
+def split_sentences(text, language):
+    """Return the sentences of ``text`` as a list of strings."""
+    sbd = sentence_splitter(language)
+    return list(sbd.sentences_from_text(text, realign_boundaries=True))
+
+
+def _init_worker(language, params):
+    """``multiprocessing.Pool`` initializer: install the parent's Punkt
+    parameters in this worker.
+    """
+    sentence_splitter(language, params)
+
+
+def _split_file(args):
+    doc_id, path, language = args
+    with open(path, encoding='utf-8') as file_open:
+        text = file_open.read()
+    # Installed by tokenize_corpus() or _init_worker()
+    sbd = _TOKENIZERS[language][1]
+    return doc_id, list(sbd.sentences_from_text(text,
+                                                realign_boundaries=True))
+
+
+def _records(results):
+    for doc_id, sentences in results:
+        for index, sentence in enumerate(sentences):
+            yield doc_id, index, sentence
+
 
 class TokenizeSentence(object):
     """Tokenize sentences."""
@@ -18,27 +125,25 @@ class TokenizeSentence(object):
 
     def sentence_tokenizer(self, untokenized_string, language):
         """Reads language .pickle for right language"""
-        if language == 'greek':
-            pickle_path = os.path.expanduser('~/cltk_data/greek/cltk_linguistic_data/tokenizers/sentence/greek.pickle')
-            language_punkt_vars = PunktLanguageVars
-            language_punkt_vars.sent_end_chars = ('.', ';')
-            language_punkt_vars.internal_punctuation = (',', '·')
-        elif language == 'latin':
-            pickle_path = os.path.expanduser('~/cltk_data/latin/cltk_linguistic_data/tokenizers/sentence/latin.pickle')
-            language_punkt_vars = PunktLanguageVars
-            language_punkt_vars.sent_end_chars = ('.', '?', ':')
-            language_punkt_vars.internal_punctuation = (',', ';')
+        return split_sentences(untokenized_string, language)
+
+    def tokenize_corpus(self, paths, language, workers=None):
+        """Split each UTF-8 file of ``paths`` into sentences on ``workers``
+        processes (default: one per core). Yields ``(doc_id,
+        sentence_index, sentence)`` in the order of ``paths``; ``doc_id``
+        is the path. A dict of ``{doc_id: path}`` may be given instead.
+        """
+        if isinstance(paths, dict):
+            items = list(paths.items())
         else:
-            print("No sentence tokenizer for this language available.")
-
-        with open(pickle_path, 'rb') as open_pickle:
-            tokenizer = pickle.load(open_pickle)
-        tokenizer.INCLUDE_ALL_COLLOCS = True
-        tokenizer.INCLUDE_ABBREV_COLLOCS = True
-        params = tokenizer.get_params()
-        sbd = PunktSentenceTokenizer(params)
-        tokenized_sentences = []
-        for sentence in sbd.sentences_from_text(untokenized_string,
-                                                realign_boundaries=True):
-            tokenized_sentences.append(sentence)
-        return tokenized_sentences
+            items = [(path, path) for path in paths]
+        params = load_params(language)
+        jobs = [(doc_id, path, language) for doc_id, path in items]
+        if workers == 1 or len(jobs) < 2:
+            sentence_splitter(language, params)
+            yield from _records(map(_split_file, jobs))
+            return
+        import multiprocessing
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(language, params)) as pool:
+            yield from _records(pool.imap(_split_file, jobs))
@@ -0,0 +1,228 @@
+"""Train the Punkt sentence tokenizer on whole corpora.
+
+NLTK's ``PunktTrainer`` takes its training text as one string. Here the
+files of a corpus are read in blocks of about ``BLOCK_SIZE`` characters,
+ending at a line break, and fed to a ``PunktTrainer`` without
+finalizing, so memory is bounded by one block plus the counts. Files are
+grouped into chunks of ``files_per_chunk``, each trained by a fresh
+trainer in a worker process. The parent sums the counts of the chunks
+(``PunktStats``), re-scores the abbreviation types against the summed
+counts, then finds collocations and sentence starters as
+``finalize_training()`` does. Chunks do not depend on the number of
+workers, and summing is order-independent, so the parameters are the
+same for any ``workers``::
+
+    params = train_punkt(['~/cltk_data/compiled/phi5'], 'latin',
+                         out_path=True)
+
+The result is written as the pickle ``TokenizeSentence`` loads.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+import argparse
+from collections import Counter
+import logging
+import os
+import pickle
+
+from cltk.corpus.common.checkpoint import atomic_write
+from cltk.tokenize.sentence.tokenize_sentences import PICKLE_PATHS, \
+    language_vars
+
+BLOCK_SIZE = 1 << 20
+FILES_PER_CHUNK = 8
+
+
+class PunktStats(object):
+    """The counts a ``PunktTrainer`` gathers, in a form that can be
+    summed across trainers.
+    """
+
+    def __init__(self):
+        self.type_counts = Counter()
+        self.period_tokens = 0
+        self.collocations = Counter()
+        self.sent_starters = Counter()
+        self.sentbreaks = 0
+        # type -> bit flags of the orthographic contexts it was seen in
+        self.ortho_context = {}
+        self.abbrev_types = set()
+
+    @classmethod
+    def from_trainer(cls, trainer):
+        """Take the counts of an unfinalized ``PunktTrainer``."""
+        # pylint: disable=W0212
+        stats = cls()
+        stats.type_counts.update(trainer._type_fdist)
+        stats.period_tokens = trainer._num_period_toks
+        stats.collocations.update(trainer._collocation_fdist)
+        stats.sent_starters.update(trainer._sent_starter_fdist)
+        stats.sentbreaks = trainer._sentbreak_count
+        stats.ortho_context = dict(trainer._params.ortho_context)
+        stats.abbrev_types = set(trainer._params.abbrev_types)
+        return stats
+
+    def update(self, other):
+        """Add the counts of ``other`` to these."""
+        self.type_counts.update(other.type_counts)
+        self.period_tokens += other.period_tokens
+        self.collocations.update(other.collocations)
+        self.sent_starters.update(other.sent_starters)
+        self.sentbreaks += other.sentbreaks
+        ortho_context = self.ortho_context
+        for typ, flags in other.ortho_context.items():
+            ortho_context[typ] = ortho_context.get(typ, 0) | flags
+        self.abbrev_types |= other.abbrev_types
+        return self
+
+    def to_params(self, language):
+        """Finish training on these counts; returns ``PunktParameters``."""
+        # pylint: disable=W0212
+        from nltk.probability import FreqDist
+        trainer = new_trainer(language)
+        trainer._type_fdist = FreqDist(self.type_counts)
+        trainer._num_period_toks = self.period_tokens
+        trainer._collocation_fdist = FreqDist(self.collocations)
+        trainer._sent_starter_fdist = FreqDist(self.sent_starters)
+        trainer._sentbreak_count = self.sentbreaks
+        params = trainer._params
+        params.ortho_context.update(self.ortho_context)
+        params.abbrev_types = set(self.abbrev_types)
+        # Re-score every candidate against the summed counts, as
+        # PunktTrainer does for the types of each new text
+        for abbr, score, is_add in trainer._reclassify_abbrev_types(
+                sorted(self.type_counts)):
+            if score >= trainer.ABBREV:
+                if is_add:
+                    params.abbrev_types.add(abbr)
+            elif not is_add:
+                params.abbrev_types.discard(abbr)
+        trainer.finalize_training()
+        return params
+
+
+def new_trainer(language):
+    """Return an empty ``PunktTrainer`` set up as ``TokenizeSentence``
+    uses the parameters.
+    """
+    from nltk.tokenize.punkt import PunktTrainer
+    trainer = PunktTrainer(lang_vars=language_vars(language))
+    trainer.INCLUDE_ALL_COLLOCS = True
+    trainer.INCLUDE_ABBREV_COLLOCS = True
+    return trainer
+
+
+def iter_files(paths):
+    """Yield the ``.txt`` files of ``paths``, walking directories in
+    sorted order.
+    """
+    for path in paths:
+        path = os.path.expanduser(path)
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.endswith('.txt'):
+                    yield os.path.join(root, file_name)
+
+
+def iter_blocks(path, block_size=BLOCK_SIZE):
+    """Yield the UTF-8 text of ``path`` in blocks of about
+    ``block_size`` characters, each ending at a line break.
+    """
+    with open(path, encoding='utf-8', errors='replace') as file_open:
+        lines, size = [], 0
+        for line in file_open:
+            lines.append(line)
+            size += len(line)
+            if size >= block_size:
+                yield ''.join(lines)
+                lines, size = [], 0
+        if lines:
+            yield ''.join(lines)
+
+
+def train_chunk(paths, language, block_size=BLOCK_SIZE):
+    """Train a fresh trainer on the files ``paths``; returns its
+    ``PunktStats``.
+    """
+    trainer = new_trainer(language)
+    for path in paths:
+        for block in iter_blocks(path, block_size):
+            trainer.train(block, finalize=False)
+    return PunktStats.from_trainer(trainer)
+
+
+def _train_chunk_star(args):
+    return train_chunk(*args)
+
+
+def save_params(params, path):
+    """Pickle ``params`` where ``TokenizeSentence`` can load them."""
+    from nltk.tokenize.punkt import PunktTrainer
+    # An empty, finalized trainer: get_params() returns params as is
+    holder = PunktTrainer()
+    holder._params = params  # pylint: disable=W0212
+    atomic_write(path, pickle.dumps(holder, pickle.HIGHEST_PROTOCOL))
+
+
+def train_punkt(paths, language, out_path=None, workers=None,
+                files_per_chunk=FILES_PER_CHUNK, block_size=BLOCK_SIZE):
+    """Train Punkt parameters for ``language`` on the files (or
+    directories of ``.txt`` files) ``paths``, on ``workers`` processes.
+    Writes them to ``out_path`` if given; ``True`` means the pickle path
+    ``TokenizeSentence`` reads. Returns the ``PunktParameters``.
+    """
+    files = list(iter_files(paths))
+    jobs = [(files[start:start + files_per_chunk], language, block_size)
+            for start in range(0, len(files), files_per_chunk)]
+    stats = PunktStats()
+    if workers == 1 or len(jobs) < 2:
+        for chunk_stats in map(_train_chunk_star, jobs):
+            stats.update(chunk_stats)
+    else:
+        import multiprocessing
+        with multiprocessing.Pool(workers) as pool:
+            for chunk_stats in pool.imap_unordered(_train_chunk_star, jobs):
+                stats.update(chunk_stats)
+    params = stats.to_params(language)
+    logging.info('Trained %s Punkt on %d files: %d abbreviations, %d '
+                 'collocations, %d sentence starters', language, len(files),
+                 len(params.abbrev_types), len(params.collocations),
+                 len(params.sent_starters))
+    if out_path:
+        if out_path is True:
+            out_path = os.path.expanduser(PICKLE_PATHS[language])
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+        save_params(params, out_path)
+        logging.info('Wrote %s', out_path)
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Train a Punkt sentence tokenizer on text files.')
+    parser.add_argument('paths', nargs='+',
+                        help='text files or directories of .txt files')
+    parser.add_argument('--language', required=True,
+                        choices=sorted(PICKLE_PATHS))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--files-per-chunk', type=int,
+                        default=FILES_PER_CHUNK)
+    parser.add_argument('--out', help='pickle path (default: where '
+                                      'TokenizeSentence loads it)')
+    args = parser.parse_args(argv)
+    params = train_punkt(args.paths, args.language, args.out or True,
+                         args.workers, args.files_per_chunk)
+    print('%d abbreviations, %d collocations, %d sentence starters' % (
+        len(params.abbrev_types), len(params.collocations),
+        len(params.sent_starters)))
+    return params
+
+
+if __name__ == '__main__':
+    main()
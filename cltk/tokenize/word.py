@@ -0,0 +1,169 @@
+"""Tokenize Latin and Greek text into words and punctuation.
+
+One precompiled regular expression scans the text: runs of word
+characters (combining diacritics included, so decomposed Greek stays
+whole, and a Greek elision mark stays with its word) and runs of
+punctuation. Latin words ending in the enclitics -que, -ne and -ve are
+then split into host and enclitic, written ``-que`` as in the Perseus
+treebanks::
+
+    >>> WordTokenizer('latin').tokenize('Arma virumque cano, Troiae qui')
+    ['Arma', 'virum', '-que', 'cano', ',', 'Troiae', 'qui']
+
+Whether a word splits is decided once per distinct word, from exception
+sets (``atque``, ``bene``, ``sive`` ...) and the letter before the
+enclitic, and remembered, so the cost per token is one dict lookup. Only
+words ending in an enclitic's letters are remembered, so a long-lived
+tokenizer does not grow with the vocabulary it has seen.
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+from collections import namedtuple
+import re
+
+from cltk.stem.latin.stemmer import QUE_PASS_LIST
+
+Token = namedtuple('Token', ['text', 'start', 'end'])
+
+WORD = r'[\w\u0300-\u036f]+'
+PUNCT = r'[^\w\s\u0300-\u036f]+'
+# Apostrophe, right single quote, koronis and modifier apostrophe
+ELISION = "['\u2019\u1fbd\u02bc]"
+SCANNERS = {'latin': re.compile('%s|%s' % (WORD, PUNCT)),
+            'greek': re.compile('%s%s?|%s' % (WORD, ELISION, PUNCT))}
+
+QUE_EXCEPTIONS = QUE_PASS_LIST | frozenset([
+    'aeque', 'namque', 'plerumque', 'quinque', 'utrumque', 'utraque',
+    'utriusque', 'utrique', 'utramque', 'utrosque', 'utrasque', 'utrisque',
+    'utrorumque', 'utrarumque', 'quodque', 'quidque', 'cumque',
+    'utrimque', 'utrobique', 'usquequaque'])
+# -ne and -ve only split after these letters (estne, videsne, plusve,
+# diemve), not after vowels (bene, sine, breve) or l, g, r (salve,
+# digne, aeterne), which end many unrelated words
+HOST_ENDINGS = frozenset('bcdmnpstx')
+NE_EXCEPTIONS = frozenset([
+    'nonne', 'omne', 'sollemne', 'solemne', 'alumne', 'autumne', 'damne',
+    'hymne', 'columne', 'aetne', 'pessumne'])
+VE_EXCEPTIONS = frozenset()
+# Last two letters of the words that may end in an enclitic
+ENCLITIC_TAILS = frozenset(['ue', 'ne', 've'])
+
+
+def split_enclitic(word):
+    """Return ``(host, enclitic)`` if the Latin ``word`` ends in an
+    enclitic, else None.
+    """
+    lower = word.lower()
+    if lower.endswith('que'):
+        if len(lower) < 5 or lower in QUE_EXCEPTIONS or \
+                lower.endswith('cumque'):
+            return None
+        return word[:-3], '-que'
+    for enclitic, exceptions in (('ne', NE_EXCEPTIONS),
+                                 ('ve', VE_EXCEPTIONS)):
+        if lower.endswith(enclitic):
+            if len(lower) < 4 or lower[-3] not in HOST_ENDINGS or \
+                    lower in exceptions:
+                return None
+            return word[:-2], '-' + enclitic
+    return None
+
+
+class WordTokenizer(object):
+    """Word tokenizer for ``'latin'`` or ``'greek'``."""
+
+    def __init__(self, language='latin', enclitics=None):
+        if language not in SCANNERS:
+            raise ValueError('No word tokenizer for %r' % language)
+        self.language = language
+        self.scanner = SCANNERS[language]
+        self.enclitics = language == 'latin' if enclitics is None \
+            else enclitics
+        # word -> (host, enclitic) for the words that split
+        self.splits = {}
+        # Words ending in ENCLITIC_TAILS already decided
+        self._seen = set()
+
+    def _learn(self, words):
+        """Decide which of the new ``words`` that may end in an enclitic
+        split.
+        """
+        new = {word for word in words
+               if word[-2:].lower() in ENCLITIC_TAILS} - self._seen
+        if new:
+            self._seen |= new
+            splits = self.splits
+            for word in new:
+                split = split_enclitic(word)
+                if split is not None:
+                    splits[word] = split
+
+    def cache_size(self):
+        """Return the number of words whose split has been decided and
+        remembered.
+        """
+        return len(self._seen)
+
+    def tokenize(self, text):
+        """Return the tokens of ``text``."""
+        tokens = self.scanner.findall(text)
+        if not self.enclitics:
+            return tokens
+        self._learn(set(tokens))
+        splits = self.splits
+        if splits.keys().isdisjoint(tokens):
+            return tokens
+        get = splits.get
+        out = []
+        append, extend = out.append, out.extend
+        for token in tokens:
+            split = get(token)
+            if split is None:
+                append(token)
+            else:
+                extend(split)
+        return out
+
+    def tokenize_offsets(self, text):
+        """Return ``Token(text, start, end)`` for each token of ``text``;
+        an enclitic's span is its letters, without the hyphen.
+        """
+        out = []
+        append = out.append
+        get = self.splits.get if self.enclitics else {}.get
+        learn = self._learn
+        seen = self._seen
+        for match in self.scanner.finditer(text):
+            token = match.group()
+            start, end = match.span()
+            if self.enclitics and token not in seen and \
+                    token[-2:].lower() in ENCLITIC_TAILS:
+                learn({token})
+            split = get(token)
+            if split is None:
+                append(Token(token, start, end))
+            else:
+                host, enclitic = split
+                middle = start + len(host)
+                append(Token(host, start, middle))
+                append(Token(enclitic, middle, end))
+        return out
+
+    def tokenize_many(self, texts, offsets=False):
+        """Tokenize each of ``texts``, yielding one list per text."""
+        tokenize = self.tokenize_offsets if offsets else self.tokenize
+        for text in texts:
+            yield tokenize(text)
+
+
+_TOKENIZERS = {}
+
+
+def tokenize_words(text, language='latin'):
+    """Tokenize ``text`` with a shared ``WordTokenizer``."""
+    tokenizer = _TOKENIZERS.get(language)
+    if tokenizer is None:
+        tokenizer = _TOKENIZERS[language] = WordTokenizer(language)
+    return tokenizer.tokenize(text)
@@ -0,0 +1,149 @@
+"""Interning of strings (forms, lemmata, tags) as small integer ids, so
+corpora and models can be held in compact arrays.
+
+``TypeMap`` runs a per-word function (stemmer, lemmatizer, j/v or Beta
+Code replacement, stopword test) once per distinct word type rather
+than once per token, and broadcasts the results back to the tokens as an
+array. Results are kept across calls, so a corpus streamed in batches
+pays for each type once::
+
+    stem = TypeMap(Stemmer().stem_word)
+    stems = stem(tokens)                      # object array, one per token
+    is_stop = TypeMap(STOPS.__contains__, dtype=bool)
+    content = [token for token, stop in zip(tokens, is_stop(tokens))
+               if not stop]
+"""
+
+__author__ = 'Kyle P. Johnson <kyle@kyle-p-johnson.com>'
+__license__ = 'MIT License. See LICENSE.'
+
+
+class Vocabulary(object):
+    """Maps each distinct string to a consecutive id, starting at 0, in
+    order of first appearance.
+    """
+
+    def __init__(self, tokens=()):
+        self.ids = {}
+        self.tokens = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.ids
+
+    def __getitem__(self, token_id):
+        return self.tokens[token_id]
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __eq__(self, other):
+        return isinstance(other, Vocabulary) and self.tokens == other.tokens
+
+    def add(self, token):
+        """Return the id of ``token``, assigning a new one if needed."""
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.ids[token] = token_id
+            self.tokens.append(token)
+        return token_id
+
+    def get(self, token, default=-1):
+        """Return the id of ``token``, or ``default`` if it is unknown."""
+        return self.ids.get(token, default)
+
+    def encode(self, tokens):
+        """Return the ids of ``tokens``, adding any new ones."""
+        add = self.add
+        return [add(token) for token in tokens]
+
+    def decode(self, token_ids):
+        """Return the strings for ``token_ids``."""
+        tokens = self.tokens
+        return [tokens[token_id] for token_id in token_ids]
+
+    def to_array(self):
+        """Return the strings as a fixed-width ``numpy`` unicode array,
+        which can be saved without pickling.
+        """
+        import numpy
+        return numpy.array(self.tokens, dtype=str)
+
+    @classmethod
+    def from_array(cls, array):
+        """Rebuild a vocabulary from ``to_array()`` output."""
+        vocab = cls()
+        vocab.tokens = array.tolist()
+        vocab.ids = {token: token_id for token_id, token in
+                     enumerate(vocab.tokens)}
+        return vocab
+
+
+def type_ids(tokens, vocab=None):
+    """Return the type id of each of ``tokens`` as a ``numpy`` array,
+    adding new types to ``vocab`` (a new ``Vocabulary`` by default), and
+    the vocabulary. A ``numpy`` array of strings is reduced with
+    ``numpy.unique`` first; other iterables go through the dict.
+    """
+    import numpy
+    if vocab is None:
+        vocab = Vocabulary()
+    if isinstance(tokens, numpy.ndarray):
+        uniques, inverse = numpy.unique(tokens, return_inverse=True)
+        ids = numpy.array(vocab.encode(uniques.tolist()), dtype=numpy.int64)
+        return ids[inverse.reshape(-1)], vocab
+    return numpy.array(vocab.encode(tokens), dtype=numpy.int64), vocab
+
+
+class TypeMap(object):
+    """Apply ``func`` to tokens once per distinct type, remembering the
+    result of every type seen.
+    """
+
+    def __init__(self, func, dtype=object):
+        self.func = func
+        self.dtype = dtype
+        self.vocab = Vocabulary()
+        self._results = []
+        self._array = None
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def _update(self):
+        """Run ``func`` on the types added since the last call."""
+        results = self._results
+        if len(results) < len(self.vocab):
+            func = self.func
+            results.extend([func(token) for token in
+                            self.vocab.tokens[len(results):]])
+
+    def values(self):
+        """Return ``func`` of every type seen, indexed by type id."""
+        import numpy
+        self._update()
+        if self._array is None or len(self._array) < len(self._results):
+            self._array = numpy.fromiter(self._results, dtype=self.dtype,
+                                         count=len(self._results))
+        return self._array
+
+    def __call__(self, tokens):
+        """Return ``func`` of each of ``tokens`` as a ``numpy`` array."""
+        ids, _ = type_ids(tokens, self.vocab)
+        return self.values()[ids]
+
+    def get(self, token):
+        """Return ``func`` of one token."""
+        token_id = self.vocab.add(token)
+        self._update()
+        return self._results[token_id]
+
+
+def map_types(func, tokens, dtype=object):
+    """Return ``func`` of each of ``tokens``, calling it once per type."""
+    return TypeMap(func, dtype)(tokens)